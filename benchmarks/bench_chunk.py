@@ -0,0 +1,89 @@
+# benchmarks/bench_chunk.py
+"""
+Benchmark the word-count chunker against the model-token chunker.
+
+Usage:
+    python -m benchmarks.bench_chunk [--paragraphs 2000] [--docs DIR]
+
+Without --docs, synthetic documents with a mix of short and very long
+paragraphs are generated. For each chunker it reports wall time, number of
+chunks and how many chunks exceed the embedding model's input limit (and
+would therefore be silently truncated at encode time).
+"""
+
+import argparse
+import glob
+import os
+import random
+import time
+
+from config.settings import settings
+from models.embedder import get_embedder
+from scraper.chunk import chunk_text_by_model_tokens, chunk_text_by_tokens
+
+WORDS = ("delivery order customer service store opening hours payment refund product "
+         "shipping account support website team return policy price quality").split()
+
+
+def synthetic_document(paragraphs, seed=0):
+    rng = random.Random(seed)
+    paras = []
+    for _ in range(paragraphs):
+        # Mostly normal paragraphs, with the occasional wall of text
+        sentences = rng.choice([2, 3, 5, 8, 40])
+        paras.append(" ".join(
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 25))).capitalize() + "."
+            for _ in range(sentences)
+        ))
+    return "\n\n".join(paras)
+
+
+def load_documents(directory):
+    docs = []
+    for path in sorted(glob.glob(os.path.join(directory, "**", "*.txt"), recursive=True)):
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            docs.append(f.read())
+    return docs
+
+
+def over_limit(tokenizer, chunks, limit):
+    if not chunks:
+        return 0, 0
+    counts = [len(ids) for ids in tokenizer(chunks, add_special_tokens=False)["input_ids"]]
+    return sum(1 for n in counts if n > limit), max(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", type=int, default=2000, help="Paragraphs per synthetic document")
+    parser.add_argument("--documents", type=int, default=3, help="Number of synthetic documents")
+    parser.add_argument("--docs", help="Directory of .txt documents to use instead")
+    args = parser.parse_args()
+
+    embedder = get_embedder()
+    tokenizer = embedder.tokenizer
+    limit = min(settings.MAX_CHUNK_TOKENS, embedder.max_tokens)
+
+    docs = load_documents(args.docs) if args.docs else [
+        synthetic_document(args.paragraphs, seed=i) for i in range(args.documents)
+    ]
+    total_words = sum(len(d.split()) for d in docs)
+    print(f"{len(docs)} documents, {total_words} words; model limit {limit} tokens\n")
+
+    runs = {
+        "words (MAX_CHUNK_TOKENS)": lambda d: chunk_text_by_tokens(d, max_tokens=settings.MAX_CHUNK_TOKENS),
+        "model tokens": lambda d: chunk_text_by_model_tokens(d, tokenizer, max_tokens=limit),
+        f"model tokens + {settings.CHUNK_OVERLAP_TOKENS} overlap": lambda d: chunk_text_by_model_tokens(
+            d, tokenizer, max_tokens=limit, overlap_tokens=settings.CHUNK_OVERLAP_TOKENS),
+    }
+    for name, fn in runs.items():
+        start = time.perf_counter()
+        chunks = [c for d in docs for c in fn(d)]
+        elapsed = time.perf_counter() - start
+        n_over, longest = over_limit(tokenizer, chunks, limit)
+        print(f"{name:<32} {elapsed:7.3f}s  {len(chunks):6d} chunks  "
+              f"{n_over:5d} over limit (longest {longest} tokens)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/bench_clean.py
+"""
+Micro-benchmark of the HTML cleaning engines on a corpus of saved pages.
+
+Usage:
+    python -m benchmarks.bench_clean ./saved_pages [--repeat 3]
+
+The directory should contain raw .html files (e.g. saved from a crawl).
+Reports pages/second for each engine and how many pages produce identical
+output.
+"""
+
+import argparse
+import difflib
+import glob
+import os
+import time
+
+from scraper.clean import clean_html_bs4, clean_html_lxml
+
+ENGINES = {"bs4": clean_html_bs4, "lxml": clean_html_lxml}
+
+
+def load_corpus(directory):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, "**", "*.htm*"), recursive=True)):
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            pages.append((path, f.read()))
+    return pages
+
+
+def time_engine(fn, pages, repeat):
+    best = float("inf")
+    outputs = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        outputs = [fn(html) for _, html in pages]
+        best = min(best, time.perf_counter() - start)
+    return best, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="Directory of saved .html pages")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per engine (best is reported)")
+    parser.add_argument("--show-diffs", type=int, default=3, help="Print up to N differing pages")
+    args = parser.parse_args()
+
+    pages = load_corpus(args.directory)
+    if not pages:
+        print(f"No .html files found in {args.directory}")
+        return
+    total_mb = sum(len(html) for _, html in pages) / 1e6
+    print(f"Corpus: {len(pages)} pages, {total_mb:.1f} MB\n")
+
+    results = {}
+    for name, fn in ENGINES.items():
+        elapsed, outputs = time_engine(fn, pages, args.repeat)
+        results[name] = outputs
+        print(f"{name:>5}: {elapsed:.3f}s  {len(pages) / elapsed:8.1f} pages/s  {total_mb / elapsed:6.1f} MB/s")
+
+    base = results["bs4"]
+    fast = results["lxml"]
+    identical = sum(1 for a, b in zip(base, fast) if a == b)
+    print(f"\nIdentical output: {identical}/{len(pages)} pages")
+
+    shown = 0
+    for (path, _), a, b in zip(pages, base, fast):
+        if a == b or shown >= args.show_diffs:
+            continue
+        ratio = difflib.SequenceMatcher(None, a, b).ratio()
+        print(f"\n--- {path} (similarity {ratio:.3f})")
+        for line in list(difflib.unified_diff(a.splitlines(), b.splitlines(), "bs4", "lxml", lineterm=""))[:20]:
+            print(line)
+        shown += 1
+
+
+if __name__ == "__main__":
+    main()
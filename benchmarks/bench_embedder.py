@@ -0,0 +1,98 @@
+# benchmarks/bench_embedder.py
+"""
+Throughput and parity benchmark of the embedding backends.
+
+Usage:
+    python -m benchmarks.bench_embedder [--backends torch onnx onnx-int8]
+        [--texts 512] [--queries 200]
+
+Texts come from the indexed chunks when an index exists, else synthetic
+sentences. For each backend it reports model load time, embed_texts
+throughput (index build path), sequential embed_query latency (serving
+path, one query per forward pass) and cosine similarity of its vectors to
+the torch backend's (parity: mean and worst case).
+"""
+
+import argparse
+import os
+import random
+import time
+
+import numpy as np
+
+from embeddings.build_vectors import published_paths
+from embeddings.metadata_store import MetadataStore
+from models.embedder import EMBED_BACKENDS, Embedder
+
+WORDS = ("delivery order customer service store opening hours payment refund product "
+         "shipping account support website team return policy price quality").split()
+
+
+def load_texts(count, seed=0):
+    paths = published_paths()
+    if paths is not None and os.path.exists(paths[1]):
+        store = MetadataStore.open(paths[1])
+        texts = [entry["text"] for _, entry in store.items()]
+        if texts:
+            random.Random(seed).shuffle(texts)
+            return texts[:count]
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 200))) for _ in range(count)]
+
+
+def make_queries(count, seed=1):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 12))) + "?" for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=list(EMBED_BACKENDS), choices=EMBED_BACKENDS)
+    parser.add_argument("--texts", type=int, default=512, help="Chunks embedded with embed_texts")
+    parser.add_argument("--queries", type=int, default=200, help="Queries embedded one at a time")
+    args = parser.parse_args()
+
+    texts = load_texts(args.texts)
+    queries = make_queries(args.queries)
+    print(f"{len(texts)} texts, {len(queries)} queries\n")
+
+    reference = None
+    rows = []
+    for backend in ["torch"] + [b for b in args.backends if b != "torch"]:
+        start = time.perf_counter()
+        embedder = Embedder(backend=backend)
+        load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        vectors = np.array(embedder.embed_texts(texts), dtype='float32')
+        texts_per_s = len(texts) / (time.perf_counter() - start)
+
+        # Bypass the micro-batcher: this measures one forward pass per query
+        embedder.embed_queries(queries[:5])  # warm-up
+        latencies = []
+        query_vectors = []
+        for q in queries:
+            start = time.perf_counter()
+            query_vectors.append(embedder.embed_queries([q])[0])
+            latencies.append(time.perf_counter() - start)
+        latencies = np.array(latencies) * 1000
+        query_vectors = np.array(query_vectors, dtype='float32')
+
+        if reference is None:
+            reference = (vectors, query_vectors)
+        # Vectors are normalized, so the row-wise dot product is the cosine
+        cosines = np.concatenate([(vectors * reference[0]).sum(axis=1),
+                                  (query_vectors * reference[1]).sum(axis=1)])
+        if backend in args.backends:
+            rows.append((backend, load_time, texts_per_s, np.percentile(latencies, 50),
+                         np.percentile(latencies, 99), cosines.mean(), cosines.min()))
+
+    print(f"\n{'backend':<10} {'load s':>7} {'texts/s':>9} {'query p50 ms':>13} {'p99 ms':>8} "
+          f"{'cos mean':>9} {'cos min':>8}")
+    for backend, load_time, texts_per_s, p50, p99, cos_mean, cos_min in rows:
+        print(f"{backend:<10} {load_time:7.2f} {texts_per_s:9.1f} {p50:13.2f} {p99:8.2f} "
+              f"{cos_mean:9.4f} {cos_min:8.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# benchmarks/bench_index.py
+"""
+Recall/latency benchmark of the serving index types on the real index.
+
+Usage:
+    python -m benchmarks.bench_index [--types flat hnsw ivf_flat ivf_pq]
+        [--queries 1000] [--ef-search 32 64 128] [--nprobe 8 16 32]
+        [--query-file questions.txt]
+
+Each index type is built from the exact store (as save_index would) and
+searched with the same queries. Recall@k is measured against exact flat
+search. Queries are sampled chunk vectors with a little noise added, or
+the embedded lines of --query-file for realistic user questions.
+"""
+
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from config.settings import settings
+from embeddings.ann_index import INDEX_TYPES, build_search_index, configure_search, store_vectors
+from embeddings.build_vectors import read_store_index
+
+# Search-time knob swept for each index type
+SWEEPS = {"hnsw": "HNSW_EF_SEARCH", "ivf_flat": "IVF_NPROBE", "ivf_pq": "IVF_NPROBE"}
+
+
+def make_queries(store, count, noise, query_file, seed=0):
+    if query_file:
+        from models.embedder import get_embedder
+        with open(query_file, "r", encoding="utf-8") as f:
+            lines = [ln.strip() for ln in f if ln.strip()]
+        return np.array(get_embedder().embed_texts(lines), dtype='float32')
+
+    vectors, _ = store_vectors(store)
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(vectors), size=min(count, len(vectors)), replace=False)
+    queries = vectors[rows] + rng.normal(0, noise, size=(len(rows), vectors.shape[1])).astype('float32')
+    faiss.normalize_L2(queries)
+    return queries
+
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(f[f >= 0]) & set(t[t >= 0])) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def time_queries(index, queries, k):
+    latencies = []
+    results = []
+    for q in queries:
+        start = time.perf_counter()
+        _, ids = index.search(q[None, :], k)
+        latencies.append(time.perf_counter() - start)
+        results.append(ids[0])
+    latencies = np.array(latencies) * 1000
+    return np.array(results), np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument("--queries", type=int, default=1000, help="Sampled queries (ignored with --query-file)")
+    parser.add_argument("--noise", type=float, default=0.05, help="Gaussian noise added to sampled queries")
+    parser.add_argument("--query-file", help="Text file with one question per line")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--ef-search", type=int, nargs="+", help="HNSW efSearch values to sweep")
+    parser.add_argument("--nprobe", type=int, nargs="+", help="IVF nprobe values to sweep")
+    args = parser.parse_args()
+
+    store = read_store_index()
+    queries = make_queries(store, args.queries, args.noise, args.query_file)
+    _, truth = store.search(queries, args.k)
+    print(f"{store.ntotal} vectors (d={store.d}), {len(queries)} queries, k={args.k}\n")
+    print(f"{'index':<10} {'param':<20} {'build s':>8} {'size MB':>8} {'recall':>7} {'p50 ms':>8} {'p99 ms':>8}")
+
+    sweeps = {"HNSW_EF_SEARCH": args.ef_search, "IVF_NPROBE": args.nprobe}
+    for index_type in args.types:
+        start = time.perf_counter()
+        index = build_search_index(store, index_type)
+        build_time = time.perf_counter() - start
+        size_mb = faiss.serialize_index(index).nbytes / 2**20
+        if index is store and index_type != "flat":
+            index_type += "*"  # fell back to flat
+
+        knob = SWEEPS.get(index_type)
+        values = (sweeps.get(knob) or [getattr(settings, knob)]) if knob else [None]
+        for value in values:
+            label = "-"
+            if knob:
+                setattr(settings, knob, value)
+                configure_search(index)
+                label = f"{knob}={value}"
+            found, p50, p99 = time_queries(index, queries, args.k)
+            print(f"{index_type:<10} {label:<20} {build_time:8.2f} {size_mb:8.1f} "
+                  f"{recall_at_k(found, truth):7.3f} {p50:8.3f} {p99:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
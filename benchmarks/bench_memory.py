@@ -0,0 +1,98 @@
+# benchmarks/bench_memory.py
+"""
+Memory and throughput of the conversation stores.
+
+Usage:
+    python -m benchmarks.bench_memory [--users 100000] [--messages 4]
+
+Simulates `--users` active conversations with `--messages` messages each and
+reports, for the previous dict-of-lists layout and both stores: memory per
+user (Python heap via tracemalloc, or file size for SQLite), add_message
+throughput and get_history throughput on warm conversations.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from bot.memory import InMemoryConversationStore, SQLiteConversationStore, _format
+
+SAMPLE_MESSAGES = [
+    "Hi, what are your opening hours on Saturday?",
+    "We are open from 9am to 6pm on Saturdays. 😊",
+    "How much is delivery to the city centre?",
+    "Delivery within the city is free for orders over 50.",
+]
+
+
+class DictOfListsStore:
+    """The original layout: unbounded dict, list slicing, re-formatted on every read."""
+
+    def __init__(self, max_messages=10):
+        self.max_messages = max_messages
+        self.history = {}
+
+    def add_message(self, phone, role, message):
+        self.history.setdefault(phone, []).append({"role": role, "content": message})
+        if len(self.history[phone]) > self.max_messages:
+            self.history[phone] = self.history[phone][-self.max_messages:]
+
+    def get_history(self, phone):
+        return _format((msg["role"], msg["content"]) for msg in self.history.get(phone, []))
+
+
+def fill(store, users, messages):
+    start = time.perf_counter()
+    for u in range(users):
+        phone = f"+4477{u:08d}"
+        for m in range(messages):
+            store.add_message(phone, "user" if m % 2 == 0 else "assistant",
+                              SAMPLE_MESSAGES[m % len(SAMPLE_MESSAGES)])
+    return users * messages / (time.perf_counter() - start)
+
+
+def read(store, users, reads, seed=0):
+    rng = random.Random(seed)
+    phones = [f"+4477{rng.randrange(users):08d}" for _ in range(reads)]
+    start = time.perf_counter()
+    for phone in phones:
+        store.get_history(phone)
+    return reads / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--messages", type=int, default=4, help="Messages per conversation")
+    parser.add_argument("--reads", type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"{args.users} users x {args.messages} messages\n")
+    print(f"{'store':<12} {'bytes/user':>11} {'total MB':>9} {'adds/s':>10} {'reads/s':>10}")
+
+    for name, factory in (("dict-lists", DictOfListsStore),
+                          ("memory", lambda: InMemoryConversationStore(max_users=args.users))):
+        tracemalloc.start()
+        store = factory()
+        adds = fill(store, args.users, args.messages)
+        used, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        reads = read(store, args.users, args.reads)
+        print(f"{name:<12} {used / args.users:11.0f} {used / 2**20:9.1f} {adds:10.0f} {reads:10.0f}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "conversations.sqlite")
+        store = SQLiteConversationStore(path, max_users=args.users)
+        adds = fill(store, args.users, args.messages)
+        reads = read(store, args.users, args.reads)
+        store.close()
+        size = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp))
+        print(f"{'sqlite':<12} {size / args.users:11.0f} {size / 2**20:9.1f} {adds:10.0f} {reads:10.0f}"
+              f"  (on disk)")
+
+
+if __name__ == "__main__":
+    main()
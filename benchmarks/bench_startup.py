@@ -0,0 +1,85 @@
+# benchmarks/bench_startup.py
+"""
+Measure server cold-start: import time of the app and warmup time.
+
+Usage:
+    python -m benchmarks.bench_startup [--runs 3] [--importtime]
+
+Each run is a fresh interpreter (cold imports). Reports how long
+`import bot.webhook` takes, which heavy modules that import pulled in, how
+long warmup (model load, first embed, index load, first search) takes, and
+the latency of a second query once warm. --importtime prints the slowest
+imports from `python -X importtime`.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+HEAVY_MODULES = ("torch", "sentence_transformers", "transformers", "onnxruntime", "faiss")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import bot.webhook
+import_s = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+
+from bot.responder import retrieve_relevant, warmup
+start = time.perf_counter()
+timings = warmup()
+warmup_s = time.perf_counter() - start
+
+start = time.perf_counter()
+retrieve_relevant("How much is delivery?")
+warm_query_s = time.perf_counter() - start
+print(json.dumps({{"import": import_s, "heavy": heavy, "warmup": warmup_s,
+                  "steps": timings, "warm_query": warm_query_s}}))
+"""
+
+
+def run_probe():
+    out = subprocess.run([sys.executable, "-c", PROBE.format(heavy=HEAVY_MODULES)],
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def import_profile(top=15):
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import bot.webhook"],
+                         capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:  self_us | cumulative_us | module"
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), name.rstrip()))
+    rows.sort(reverse=True)
+    print("\nSlowest imports (cumulative) under `import bot.webhook`:")
+    for cumulative_us, name in rows[:top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--importtime", action="store_true", help="Show the slowest imports")
+    args = parser.parse_args()
+
+    results = [run_probe() for _ in range(args.runs)]
+    best = min(results, key=lambda r: r["import"] + r["warmup"])
+    print(f"import bot.webhook: {min(r['import'] for r in results) * 1000:8.1f} ms  "
+          f"(heavy modules loaded: {', '.join(best['heavy']) or 'none'})")
+    print(f"warmup:             {min(r['warmup'] for r in results) * 1000:8.1f} ms")
+    for step, value in best["steps"].items():
+        if isinstance(value, float):
+            print(f"  {step:<16} {value * 1000:8.1f} ms")
+    print(f"query once warm:    {min(r['warm_query'] for r in results) * 1000:8.1f} ms")
+
+    if args.importtime:
+        import_profile()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# bot/answer_cache.py
+"""
+Semantic cache of LLM replies keyed by the question's embedding.
+
+Customers ask the same few questions in slightly different words. A new
+question whose embedding is within `threshold` cosine similarity of a
+cached one gets the cached reply without retrieval or an LLM call.
+
+Entries expire after `ttl` seconds, the least recently used entry is evicted
+beyond `max_entries`, and the whole cache is dropped when the index version
+changes (a rebuilt knowledge base may change the right answer).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class AnswerCache:
+    """
+    Thread-safe, size-bounded semantic answer cache.
+
+    Args:
+        threshold: Minimum cosine similarity (normalized embeddings) for a hit
+        ttl: Seconds an entry stays valid
+        max_entries: Entries kept before evicting the least recently used
+    """
+
+    def __init__(self, threshold=0.92, ttl=3600.0, max_entries=1000):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (slot, reply, expires_at)
+        self._next_key = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._entries.clear()
+        # One row per slot, grown by doubling up to max_entries; freed rows are zeroed
+        self._matrix = None
+        self._slot_keys = []  # slot -> entry key, None when free
+        self._free = []
+
+    def _check_version(self, version):
+        if version != self._version:
+            self._reset()
+            self._version = version
+
+    def _allocate(self, vector):
+        """Store `vector` in a free row (growing the matrix if needed) and return its slot."""
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = len(self._slot_keys)
+            if self._matrix is None or slot == len(self._matrix):
+                capacity = min(max(16, 2 * slot), max(self.max_entries, 1))
+                grown = np.zeros((capacity, len(vector)), dtype='float32')
+                if self._matrix is not None:
+                    grown[:slot] = self._matrix
+                self._matrix = grown
+            self._slot_keys.append(None)
+        self._matrix[slot] = vector
+        return slot
+
+    def _release(self, key):
+        slot = self._entries.pop(key)[0]
+        self._matrix[slot] = 0.0
+        self._slot_keys[slot] = None
+        self._free.append(slot)
+
+    def get(self, vector, version):
+        """
+        Return the cached reply for the most similar question, or None.
+
+        Args:
+            vector: Normalized query embedding
+            version: Index version the reply would be answered from
+        """
+        with self._lock:
+            self._check_version(version)
+            now = time.monotonic()
+            if self._entries:
+                scores = self._matrix[:len(self._slot_keys)] @ np.asarray(vector, dtype='float32')
+                # Best match first; skip free rows and drop expired entries
+                for row in np.argsort(-scores):
+                    if scores[row] < self.threshold:
+                        break
+                    key = self._slot_keys[row]
+                    if key is None:
+                        continue
+                    entry = self._entries[key]
+                    if entry[2] <= now:
+                        self._release(key)
+                        continue
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, vector, version, reply):
+        """Cache `reply` for a question embedding answered from index `version`."""
+        with self._lock:
+            self._check_version(version)
+            while self._entries and len(self._entries) >= self.max_entries:
+                self._release(next(iter(self._entries)))
+            key = self._next_key
+            self._next_key += 1
+            slot = self._allocate(np.asarray(vector, dtype='float32'))
+            self._slot_keys[slot] = key
+            self._entries[key] = (slot, reply, time.monotonic() + self.ttl)
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "index_version": self._version,
+            }
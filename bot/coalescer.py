@@ -0,0 +1,147 @@
+# bot/coalescer.py
+"""
+Per-user serialization and debouncing of incoming messages.
+
+WhatsApp users often send several short messages in a row ("hi" / "I
+ordered yesterday" / "where is it?"). Instead of one retrieval + LLM round
+trip per message, racing on the same conversation history, messages from
+one phone number are handled one reply at a time:
+
+- the first message arms a timer that fires once the user has been quiet
+  for `window_ms` (at most `max_wait_ms` after it arrived); only then is a
+  job handed to the worker pool, which passes everything received so far
+  to the handler as one message. Waiting costs a timer, not a worker;
+- messages arriving while a reply is queued or being generated are merged
+  into the next call for that user, never run concurrently with it.
+
+A merged call carries the earliest deadline of its messages: the reply is
+owed to the customer's first message.
+
+All state lives on the event loop, so no locks are needed.
+"""
+
+import asyncio
+import time
+import traceback
+
+# Seconds before retrying to dispatch a burst when the worker queue is full
+DISPATCH_RETRY_DELAY = 0.5
+
+
+class _PhoneState:
+    __slots__ = ("pending", "deadline", "first_arrival", "last_arrival", "timer", "busy")
+
+    def __init__(self):
+        self.pending = []
+        self.deadline = None
+        self.first_arrival = None
+        self.last_arrival = None
+        self.timer = None  # armed debounce timer
+        self.busy = False  # a job for this phone is queued or running
+
+
+class MessageCoalescer:
+    """
+    Wraps an async handler(phone, text, deadline) with per-phone coalescing.
+
+    Sits in front of a WorkerPool whose handler is flush(); assign the pool
+    to `pool` before the first submit().
+
+    Args:
+        handler: Coroutine function called with (phone, merged_text, deadline)
+        window_ms: Quiet period that ends a burst of messages (0 disables debouncing)
+        max_wait_ms: Longest delay added to the first message of a burst
+    """
+
+    def __init__(self, handler, window_ms=1500, max_wait_ms=5000):
+        self.handler = handler
+        self.window = window_ms / 1000.0
+        self.max_wait = max_wait_ms / 1000.0
+        self.pool = None
+        self.messages = 0
+        self.calls = 0
+        self.rejected = 0
+        self._states = {}
+
+    def submit(self, phone, text, deadline=None):
+        """
+        Accept one incoming message (called on the event loop).
+
+        Args:
+            phone: Sender
+            text: Message body
+            deadline: Optional Deadline created when the message arrived
+
+        Returns:
+            True if accepted, False if it starts a new burst while the
+            worker queue is full (the caller should ask for a retry)
+        """
+        state = self._states.get(phone)
+        if state is None:
+            if self.pool.full():
+                self.rejected += 1
+                return False
+            state = self._states[phone] = _PhoneState()
+        now = time.monotonic()
+        state.pending.append(text)
+        if deadline is not None and (state.deadline is None
+                                     or deadline.expires_at < state.deadline.expires_at):
+            state.deadline = deadline
+        if state.first_arrival is None:
+            state.first_arrival = now
+        state.last_arrival = now
+        self.messages += 1
+        if not state.busy and state.timer is None:
+            self._arm(phone, state)
+        return True
+
+    def _arm(self, phone, state):
+        """Dispatch the burst if its window has closed, else wait for it to close."""
+        wake = min(state.last_arrival + self.window, state.first_arrival + self.max_wait)
+        delay = wake - time.monotonic()
+        if delay > 0:
+            state.timer = asyncio.get_running_loop().call_later(delay, self._on_timer, phone)
+        elif self.pool.submit(phone):
+            state.busy = True
+        else:
+            # Already acknowledged to WhatsApp: keep the messages and try again
+            print(f"⚠️  Job queue full, delaying reply to {phone}")
+            state.timer = asyncio.get_running_loop().call_later(
+                DISPATCH_RETRY_DELAY, self._on_timer, phone)
+
+    def _on_timer(self, phone):
+        state = self._states[phone]
+        state.timer = None
+        # Messages that arrived meanwhile may have extended the window
+        self._arm(phone, state)
+
+    async def flush(self, phone):
+        """Answer everything pending for `phone` (run on a pool worker)."""
+        state = self._states[phone]
+        texts, state.pending = state.pending, []
+        batch_deadline, state.deadline = state.deadline, None
+        state.first_arrival = None
+        self.calls += 1
+        if len(texts) > 1:
+            print(f"🧩 Merged {len(texts)} messages from {phone}")
+        try:
+            await self.handler(phone, "\n".join(texts), batch_deadline)
+        except Exception as e:
+            # Keep serving this phone's later messages
+            print(f"❌ Reply to {phone} failed: {e}")
+            traceback.print_exc()
+        finally:
+            state.busy = False
+            if state.pending:
+                self._arm(phone, state)  # arrived during this reply
+            else:
+                self._states.pop(phone, None)
+
+    def stats(self):
+        return {
+            "messages": self.messages,
+            "llm_calls": self.calls,
+            "merged": self.messages - self.calls - sum(len(s.pending) for s in self._states.values()),
+            "rejected": self.rejected,
+            "active_users": len(self._states),
+        }
@@ -0,0 +1,175 @@
+# bot/dedup.py
+"""
+Idempotency store for webhook message IDs.
+
+Meta retries a webhook delivery until it gets a 2xx, so the same message ID
+can arrive several times (and, behind several uvicorn workers, at different
+processes). A message is handled only by the caller that successfully
+claims its ID.
+
+- InMemoryDedupStore: insertion-ordered dict of ID -> expiry. Check and
+  insert are O(1); the oldest IDs are evicted first (never a random one).
+- SQLiteDedupStore: the same semantics in a WAL-mode SQLite file shared by
+  every worker process; the claim is a single atomic upsert.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config.settings import settings
+
+DEDUP_DB_PATH = os.path.join(settings.CHROMA_DIR, "processed_ids.sqlite")
+
+
+class InMemoryDedupStore:
+    """
+    Per-process set of recently processed message IDs.
+
+    Args:
+        ttl: Seconds an ID is remembered
+        max_entries: IDs kept; the oldest are dropped beyond this
+    """
+
+    def __init__(self, ttl=604800.0, max_entries=100000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.duplicates = 0
+        self._expires = OrderedDict()  # insertion order == expiry order
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        expires = self._expires
+        while expires:
+            msg_id, expiry = next(iter(expires.items()))
+            if expiry > now and len(expires) <= self.max_entries:
+                break
+            del expires[msg_id]
+
+    def claim(self, msg_id):
+        """
+        Atomically mark msg_id as processed.
+
+        Returns:
+            True if the caller should process the message, False if it is
+            a duplicate seen within the TTL
+        """
+        now = time.monotonic()
+        with self._lock:
+            expiry = self._expires.get(msg_id)
+            if expiry is not None and expiry > now:
+                self.duplicates += 1
+                return False
+            self._expires.pop(msg_id, None)
+            self._expires[msg_id] = now + self.ttl
+            self._evict(now)
+            return True
+
+    def release(self, msg_id):
+        """Forget a claim (e.g. the job could not be queued) so a retry is processed."""
+        with self._lock:
+            self._expires.pop(msg_id, None)
+
+    def __contains__(self, msg_id):
+        with self._lock:
+            expiry = self._expires.get(msg_id)
+            return expiry is not None and expiry > time.monotonic()
+
+    def __len__(self):
+        return len(self._expires)
+
+    def stats(self):
+        return {"backend": "memory", "ids": len(self), "duplicates": self.duplicates}
+
+
+class SQLiteDedupStore:
+    """
+    Message-ID store in a SQLite file shared by all worker processes.
+
+    Args:
+        path: SQLite file path
+        ttl: Seconds an ID is remembered
+        purge_every: Claims between deletions of expired IDs
+    """
+
+    def __init__(self, path=DEDUP_DB_PATH, ttl=604800.0, purge_every=1000):
+        self.path = path
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self.duplicates = 0
+        self._claims = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10,
+                                     isolation_level=None)  # autocommit: each claim is one statement
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS processed (id TEXT PRIMARY KEY, expires REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS processed_expires ON processed (expires)"
+            )
+
+    def claim(self, msg_id):
+        """
+        Atomically mark msg_id as processed (across all processes).
+
+        Returns:
+            True if the caller should process the message, False if it is
+            a duplicate seen within the TTL
+        """
+        now = time.time()
+        with self._lock:
+            # Inserts a new ID or takes over an expired one; a live ID is left alone
+            cur = self._conn.execute(
+                "INSERT INTO processed (id, expires) VALUES (?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET expires = excluded.expires "
+                "WHERE processed.expires <= ?",
+                (msg_id, now + self.ttl, now),
+            )
+            claimed = cur.rowcount == 1
+            self._claims += 1
+            if self._claims % self.purge_every == 0:
+                self._conn.execute("DELETE FROM processed WHERE expires <= ?", (now,))
+            if not claimed:
+                self.duplicates += 1
+            return claimed
+
+    def release(self, msg_id):
+        """Forget a claim (e.g. the job could not be queued) so a retry is processed."""
+        with self._lock:
+            self._conn.execute("DELETE FROM processed WHERE id = ?", (msg_id,))
+
+    def __contains__(self, msg_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM processed WHERE id = ? AND expires > ?", (msg_id, time.time())
+            ).fetchone()
+        return row is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM processed").fetchone()[0]
+
+    def stats(self):
+        return {"backend": "sqlite", "ids": len(self), "duplicates": self.duplicates}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_dedup_store(backend=None):
+    """
+    Build the store selected by DEDUP_BACKEND ("memory" or "sqlite").
+    """
+    backend = backend or settings.DEDUP_BACKEND
+    if backend == "memory":
+        return InMemoryDedupStore(ttl=settings.DEDUP_TTL, max_entries=settings.DEDUP_MAX_IDS)
+    if backend == "sqlite":
+        return SQLiteDedupStore(ttl=settings.DEDUP_TTL)
+    raise ValueError(f"Unknown DEDUP_BACKEND: {backend!r} (expected 'memory' or 'sqlite')")
@@ -1,48 +1,377 @@
 # bot/memory.py
-from typing import List, Dict
+"""
+Conversation memory: the last few messages per phone number.
 
-# Global dictionary to store conversation history
-# Structure: { "phone_number": [ {"role": "user/assistant", "content": "..."} ] }
-HISTORY: Dict[str, List[Dict[str, str]]] = {}
+Two backends share one interface (add_message / get_history / messages /
+clear):
+
+- InMemoryConversationStore: per-process, LRU-bounded by number of users,
+  idle conversations expire after a TTL, O(1) append/trim via deque and the
+  formatted history is cached until the next message.
+- SQLiteConversationStore: a WAL-mode SQLite file, so every uvicorn worker
+  sees the same conversations and they survive restarts.
+
+Messages that fall out of a conversation's window are folded into a short
+running summary (see fold_summary), so the prompt builder can still refer
+to earlier turns without resending them.
+
+MEMORY_BACKEND picks the backend for the module-level add_message /
+get_history used by the responder.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List
+
+from config.settings import settings
 
 MAX_HISTORY_LEN = 10  # Store last 10 messages (5 user + 5 assistant)
 
+MEMORY_DB_PATH = os.path.join(settings.CHROMA_DIR, "conversations.sqlite")
+
+
+def _first_sentence(text, limit):
+    text = " ".join(text.split())
+    for end in (". ", "? ", "! ", "\n"):
+        cut = text.find(end)
+        if 0 < cut < limit:
+            return text[:cut + 1]
+    return text if len(text) <= limit else text[:limit].rsplit(" ", 1)[0] + "…"
+
+def fold_summary(summary: str, role: str, content: str, max_chars: int = None) -> str:
+    """
+    Add one message that is leaving the history window to the running summary.
+
+    Extractive on purpose: no extra LLM call on the reply path. Each message
+    contributes one short line; the oldest lines go first when the summary
+    exceeds max_chars (default MEMORY_SUMMARY_CHARS).
+    """
+    max_chars = max_chars or settings.MEMORY_SUMMARY_CHARS
+    label = "Customer asked" if role == "user" else "We replied"
+    lines = summary.split("\n") if summary else []
+    lines.append(f"{label}: {_first_sentence(content, 160)}")
+    while len(lines) > 1 and sum(len(ln) + 1 for ln in lines) > max_chars:
+        lines.pop(0)
+    return "\n".join(lines)
+
+def _format(messages) -> str:
+    """
+    Format (role, content) pairs for the prompt:
+        User: ...
+        Assistant: ...
+    """
+    return "\n".join(
+        f"{'User' if role == 'user' else 'Assistant'}: {content}"
+        for role, content in messages
+    )
+
+
+class _Conversation:
+    __slots__ = ("messages", "last_seen", "formatted", "summary")
+
+    def __init__(self, max_messages, now):
+        # (role, content) tuples: a fraction of the size of per-message dicts
+        self.messages = deque(maxlen=max_messages)
+        self.last_seen = now
+        self.formatted = None
+        self.summary = ""
+
+
+class InMemoryConversationStore:
+    """
+    Process-local conversation store.
+
+    Args:
+        max_users: Conversations kept; the least recently active is evicted beyond this
+        ttl: Seconds of inactivity after which a conversation is forgotten
+        max_messages: Messages kept per conversation
+    """
+
+    def __init__(self, max_users=10000, ttl=86400.0, max_messages=MAX_HISTORY_LEN):
+        self.max_users = max_users
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.evicted = 0
+        self.expired = 0
+        # Ordered by last activity: the front is always the stalest conversation
+        self._conversations = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        conversations = self._conversations
+        while conversations:
+            phone, conv = next(iter(conversations.items()))
+            if now - conv.last_seen > self.ttl:
+                self.expired += 1
+            elif len(conversations) > self.max_users:
+                self.evicted += 1
+            else:
+                break
+            del conversations[phone]
+
+    def _touch(self, phone, now):
+        conv = self._conversations.get(phone)
+        if conv is not None and now - conv.last_seen > self.ttl:
+            del self._conversations[phone]
+            self.expired += 1
+            conv = None
+        if conv is not None:
+            conv.last_seen = now
+            self._conversations.move_to_end(phone)
+        return conv
+
+    def add_message(self, phone: str, role: str, message: str):
+        """
+        Add a message to the user's history.
+
+        Args:
+            phone: User's phone number
+            role: "user" or "assistant"
+            message: Content of the message
+        """
+        now = time.monotonic()
+        with self._lock:
+            conv = self._touch(phone, now)
+            if conv is None:
+                conv = _Conversation(self.max_messages, now)
+                self._conversations[phone] = conv
+            if len(conv.messages) == conv.messages.maxlen:
+                conv.summary = fold_summary(conv.summary, *conv.messages[0])
+            conv.messages.append((role, message))
+            conv.formatted = None
+            self._evict(now)
+
+    def get_history(self, phone: str) -> str:
+        """Formatted history for the prompt ("" for unknown or expired users)."""
+        with self._lock:
+            conv = self._touch(phone, time.monotonic())
+            if conv is None:
+                return ""
+            if conv.formatted is None:
+                conv.formatted = _format(conv.messages)
+            return conv.formatted
+
+    def get_summary(self, phone: str) -> str:
+        """Running summary of the messages that left the window ("" if none)."""
+        with self._lock:
+            conv = self._touch(phone, time.monotonic())
+            return conv.summary if conv is not None else ""
+
+    def messages(self, phone: str) -> List[Dict[str, str]]:
+        with self._lock:
+            conv = self._touch(phone, time.monotonic())
+            pairs = list(conv.messages) if conv is not None else []
+        return [{"role": role, "content": content} for role, content in pairs]
+
+    def clear(self, phone: str):
+        with self._lock:
+            self._conversations.pop(phone, None)
+
+    def __len__(self):
+        return len(self._conversations)
+
+    def stats(self):
+        return {"backend": "memory", "users": len(self), "evicted": self.evicted,
+                "expired": self.expired}
+
+
+class SQLiteConversationStore:
+    """
+    Conversation store in a SQLite file shared by all worker processes.
+
+    Args:
+        path: SQLite file path
+        max_users: Conversations kept; the least recently active are deleted beyond this
+        ttl: Seconds of inactivity after which a conversation is forgotten
+        max_messages: Messages kept per conversation
+        purge_every: Writes between sweeps of expired/excess conversations
+    """
+
+    def __init__(self, path=MEMORY_DB_PATH, max_users=10000, ttl=86400.0,
+                 max_messages=MAX_HISTORY_LEN, purge_every=500):
+        self.path = path
+        self.max_users = max_users
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.purge_every = purge_every
+        self._writes = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # One connection shared by the responder's threads, serialized by the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS conversations (
+                    phone TEXT PRIMARY KEY, last_seen REAL NOT NULL);
+                CREATE INDEX IF NOT EXISTS conversations_last_seen ON conversations (last_seen);
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, phone TEXT NOT NULL,
+                    role TEXT NOT NULL, content TEXT NOT NULL);
+                CREATE INDEX IF NOT EXISTS messages_phone ON messages (phone, id);
+            """)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(conversations)")}
+            if "summary" not in columns:
+                self._conn.execute("ALTER TABLE conversations ADD COLUMN summary TEXT NOT NULL DEFAULT ''")
+                self._conn.commit()
+
+    def _last_seen(self, phone):
+        row = self._conn.execute(
+            "SELECT last_seen FROM conversations WHERE phone = ?", (phone,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _trim(self, phone):
+        """Fold messages beyond the newest max_messages into the summary and delete them."""
+        dropped = self._conn.execute(
+            "SELECT id, role, content FROM messages WHERE phone = ? ORDER BY id DESC "
+            "LIMIT -1 OFFSET ?", (phone, self.max_messages),
+        ).fetchall()
+        if not dropped:
+            return
+        summary = self._conn.execute(
+            "SELECT summary FROM conversations WHERE phone = ?", (phone,)
+        ).fetchone()[0]
+        for _, role, content in reversed(dropped):
+            summary = fold_summary(summary, role, content)
+        self._conn.execute("UPDATE conversations SET summary = ? WHERE phone = ?", (summary, phone))
+        self._conn.execute("DELETE FROM messages WHERE phone = ? AND id <= ?", (phone, dropped[0][0]))
+
+    def add_message(self, phone: str, role: str, message: str):
+        """
+        Add a message to the user's history.
+
+        Args:
+            phone: User's phone number
+            role: "user" or "assistant"
+            message: Content of the message
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            last_seen = self._last_seen(phone)
+            if last_seen is not None and now - last_seen > self.ttl:
+                self._conn.execute("DELETE FROM messages WHERE phone = ?", (phone,))
+                self._conn.execute("UPDATE conversations SET summary = '' WHERE phone = ?", (phone,))
+            self._conn.execute(
+                "INSERT INTO conversations (phone, last_seen) VALUES (?, ?) "
+                "ON CONFLICT(phone) DO UPDATE SET last_seen = excluded.last_seen",
+                (phone, now),
+            )
+            self._conn.execute(
+                "INSERT INTO messages (phone, role, content) VALUES (?, ?, ?)",
+                (phone, role, message),
+            )
+            # Keep only the newest max_messages
+            self._trim(phone)
+            self._writes += 1
+            if self._writes % self.purge_every == 0:
+                self._purge(now)
+
+    def _purge(self, now):
+        """Delete expired conversations and the stalest ones beyond max_users."""
+        self._conn.execute(
+            "DELETE FROM conversations WHERE last_seen < ? OR phone IN ("
+            "SELECT phone FROM conversations ORDER BY last_seen DESC LIMIT -1 OFFSET ?)",
+            (now - self.ttl, self.max_users),
+        )
+        self._conn.execute(
+            "DELETE FROM messages WHERE phone NOT IN (SELECT phone FROM conversations)"
+        )
+
+    def messages(self, phone: str) -> List[Dict[str, str]]:
+        with self._lock:
+            last_seen = self._last_seen(phone)
+            if last_seen is None or time.time() - last_seen > self.ttl:
+                return []
+            rows = self._conn.execute(
+                "SELECT role, content FROM messages WHERE phone = ? ORDER BY id", (phone,)
+            ).fetchall()
+        return [{"role": role, "content": content} for role, content in rows]
+
+    def get_history(self, phone: str) -> str:
+        """Formatted history for the prompt ("" for unknown or expired users)."""
+        return _format((msg["role"], msg["content"]) for msg in self.messages(phone))
+
+    def get_summary(self, phone: str) -> str:
+        """Running summary of the messages that left the window ("" if none)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_seen, summary FROM conversations WHERE phone = ?", (phone,)
+            ).fetchone()
+        if row is None or time.time() - row[0] > self.ttl:
+            return ""
+        return row[1]
+
+    def clear(self, phone: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM conversations WHERE phone = ?", (phone,))
+            self._conn.execute("DELETE FROM messages WHERE phone = ?", (phone,))
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+
+    def stats(self):
+        return {"backend": "sqlite", "users": len(self), "path": self.path}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_store(backend=None):
+    """
+    Build the conversation store selected by MEMORY_BACKEND ("memory" or "sqlite").
+    """
+    backend = backend or settings.MEMORY_BACKEND
+    options = {
+        "max_users": settings.MEMORY_MAX_USERS,
+        "ttl": settings.MEMORY_TTL,
+        "max_messages": MAX_HISTORY_LEN,
+    }
+    if backend == "memory":
+        return InMemoryConversationStore(**options)
+    if backend == "sqlite":
+        return SQLiteConversationStore(**options)
+    raise ValueError(f"Unknown MEMORY_BACKEND: {backend!r} (expected 'memory' or 'sqlite')")
+
+
+# Shared store used by the responder
+store = create_store()
+
 def add_message(phone: str, role: str, message: str):
     """
     Add a message to the user's history.
-    
+
     Args:
         phone: User's phone number
         role: "user" or "assistant"
         message: Content of the message
     """
-    if phone not in HISTORY:
-        HISTORY[phone] = []
-    
-    HISTORY[phone].append({"role": role, "content": message})
-    
-    # Trim history if it exceeds limit
-    if len(HISTORY[phone]) > MAX_HISTORY_LEN:
-        HISTORY[phone] = HISTORY[phone][-MAX_HISTORY_LEN:]
+    store.add_message(phone, role, message)
 
 def get_history(phone: str) -> str:
     """
     Retrieve formatted history for the prompt context.
-    
+
     Args:
         phone: User's phone number
-        
+
     Returns:
         String formatted as:
         User: ...
         Assistant: ...
     """
-    if phone not in HISTORY or not HISTORY[phone]:
-        return ""
-    
-    formatted_history = []
-    for msg in HISTORY[phone]:
-        role_label = "User" if msg["role"] == "user" else "Assistant"
-        formatted_history.append(f"{role_label}: {msg['content']}")
-        
-    return "\n".join(formatted_history)
+    return store.get_history(phone)
+
+def get_messages(phone: str) -> List[Dict[str, str]]:
+    """The user's recent messages as [{"role": ..., "content": ...}], oldest first."""
+    return store.messages(phone)
+
+def get_summary(phone: str) -> str:
+    """Running summary of older messages no longer in the recent history."""
+    return store.get_summary(phone)
@@ -0,0 +1,230 @@
+# bot/prompt_builder.py
+"""
+Token-budgeted prompt assembly.
+
+The prompt sent to Groq is the system prompt, the fixed question/instruction
+template, retrieved knowledge-base chunks and conversation history. Left
+unchecked, k chunks of up to MAX_CHUNK_TOKENS each plus the full history
+make prompts of thousands of tokens, and time-to-first-token and cost grow
+with them. PromptBuilder fits everything into PROMPT_MAX_TOKENS:
+
+1. The system prompt and template are fixed overhead.
+2. History gets at most PROMPT_HISTORY_TOKENS. The newest turns are kept
+   verbatim; turns that don't fit, and those that already left the memory
+   window, are represented by the conversation's running summary.
+3. Context gets the rest. Chunks are added best-first; the first one that
+   doesn't fit is trimmed (if at least PROMPT_MIN_CHUNK_TOKENS remain) and
+   the lower-relevance ones after it are dropped.
+
+Token counts use tiktoken's cl100k_base encoding when installed (close to
+Llama 3's tokenizer, which extends it) and ~4 characters per token otherwise.
+"""
+
+import threading
+
+from bot.memory import fold_summary
+from config.settings import settings
+
+SUMMARY_HEADER = "Summary of earlier conversation:\n"
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception:
+                    _encoding = False  # not installed (or no cached vocab): estimate
+    return _encoding
+
+
+def count_tokens(text):
+    """Number of LLM tokens in text (estimated when tiktoken is unavailable)."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text to at most max_tokens, preferring a word boundary."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        cut = encoding.decode(tokens[:max_tokens])
+    else:
+        if len(text) <= max_tokens * 4:
+            return text
+        cut = text[:max_tokens * 4]
+    return cut.rsplit(" ", 1)[0] + " …" if " " in cut else cut
+
+
+def format_hit(hit):
+    return f"Source (url={hit['url'] or 'unknown'}, relevance={hit['score']:.2f}):\n{hit['text']}"
+
+
+def format_history(messages):
+    return "\n".join(
+        f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}"
+        for msg in messages
+    )
+
+
+class BuiltPrompt:
+    """The assembled prompt plus its token accounting."""
+
+    __slots__ = ("prompt", "tokens", "chunks_used", "chunks_dropped", "chunk_trimmed",
+                 "turns_used", "turns_summarized")
+
+    def __init__(self, prompt, tokens, chunks_used, chunks_dropped, chunk_trimmed,
+                 turns_used, turns_summarized):
+        self.prompt = prompt
+        self.tokens = tokens
+        self.chunks_used = chunks_used
+        self.chunks_dropped = chunks_dropped
+        self.chunk_trimmed = chunk_trimmed
+        self.turns_used = turns_used
+        self.turns_summarized = turns_summarized
+
+    def report(self):
+        t = self.tokens
+        return (f"🧮 Prompt tokens: {t['total']} (system {t['system']}, template {t['template']}, "
+                f"context {t['context']} from {self.chunks_used} chunks"
+                f"{' [last trimmed]' if self.chunk_trimmed else ''}, {self.chunks_dropped} dropped, "
+                f"history {t['history']} from {self.turns_used} turns"
+                f"{f' + summary of {self.turns_summarized}' if self.turns_summarized else ''})")
+
+
+class PromptBuilder:
+    """
+    Builds prompts within a token budget.
+
+    Args:
+        system_prompt: System message sent with every request (counted, not embedded)
+        template: Callable (user_message, retrieved_text, history_text) -> prompt
+        max_tokens: Budget for system prompt + user prompt (default PROMPT_MAX_TOKENS)
+        history_tokens: Cap on history + summary (default PROMPT_HISTORY_TOKENS)
+        min_chunk_tokens: Smallest trimmed chunk worth including (default PROMPT_MIN_CHUNK_TOKENS)
+    """
+
+    def __init__(self, system_prompt, template, max_tokens=None, history_tokens=None,
+                 min_chunk_tokens=None):
+        self.system_prompt = system_prompt
+        self.template = template
+        self.max_tokens = max_tokens or settings.PROMPT_MAX_TOKENS
+        self.history_tokens = settings.PROMPT_HISTORY_TOKENS if history_tokens is None else history_tokens
+        self.min_chunk_tokens = min_chunk_tokens or settings.PROMPT_MIN_CHUNK_TOKENS
+        self.system_tokens = count_tokens(system_prompt)
+        self.built = 0
+        self._total_tokens = 0
+        self._max_seen = 0
+        self._lock = threading.Lock()
+
+    def _history(self, messages, summary, budget):
+        """Newest turns verbatim, older ones via the running summary."""
+        kept = []
+        used = 0
+        for i in range(len(messages) - 1, -1, -1):
+            line = format_history([messages[i]])
+            cost = count_tokens(line) + 1
+            if used + cost > budget:
+                break
+            kept.append(messages[i])
+            used += cost
+        kept.reverse()
+        overflow = messages[:len(messages) - len(kept)]
+        for msg in overflow:
+            summary = fold_summary(summary, msg["role"], msg["content"])
+
+        parts = []
+        if summary:
+            # Drop the oldest summary lines until it fits what the turns left
+            remaining = budget - used - count_tokens(SUMMARY_HEADER) - 2
+            lines = summary.split("\n")
+            while lines and count_tokens("\n".join(lines)) > remaining:
+                lines.pop(0)
+            if lines:
+                parts.append(SUMMARY_HEADER + "\n".join(lines))
+        if kept:
+            parts.append(format_history(kept))
+        return "\n\n".join(parts), len(kept), len(overflow)
+
+    def _context(self, hits, budget):
+        blocks = []
+        used = 0
+        trimmed = False
+        ranked = sorted(hits, key=lambda h: h["score"], reverse=True)
+        for hit in ranked:
+            block = format_hit(hit)
+            cost = count_tokens(block) + 1
+            if used + cost <= budget:
+                blocks.append(block)
+                used += cost
+                continue
+            remaining = budget - used - count_tokens(format_hit({**hit, "text": ""})) - 1
+            if remaining >= self.min_chunk_tokens:
+                blocks.append(format_hit({**hit, "text": truncate_to_tokens(hit["text"], remaining)}))
+                trimmed = True
+            break
+        return "\n\n".join(blocks), len(blocks), len(ranked) - len(blocks), trimmed
+
+    def build(self, user_message, hits, messages=(), summary=""):
+        """
+        Assemble the user prompt.
+
+        Args:
+            user_message: The customer's (possibly merged) message
+            hits: Retrieved chunks as dicts with "text", "url" and "score"
+            messages: Earlier turns [{"role", "content"}], oldest first,
+                excluding the current message
+            summary: Running summary of turns older than `messages`
+
+        Returns:
+            BuiltPrompt
+        """
+        template_tokens = count_tokens(self.template(user_message, "", ""))
+        available = max(self.max_tokens - self.system_tokens - template_tokens, 0)
+
+        history_text, turns_used, turns_summarized = self._history(
+            list(messages), summary, min(self.history_tokens, available)
+        )
+        history_tokens = count_tokens(history_text)
+        context_text, chunks_used, chunks_dropped, trimmed = self._context(
+            hits, available - history_tokens
+        )
+
+        prompt = self.template(user_message, context_text, history_text)
+        tokens = {
+            "system": self.system_tokens,
+            "template": template_tokens,
+            "context": count_tokens(context_text),
+            "history": history_tokens,
+        }
+        tokens["total"] = self.system_tokens + count_tokens(prompt)
+        with self._lock:
+            self.built += 1
+            self._total_tokens += tokens["total"]
+            self._max_seen = max(self._max_seen, tokens["total"])
+        return BuiltPrompt(prompt, tokens, chunks_used, chunks_dropped, trimmed,
+                           turns_used, turns_summarized)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "prompts": self.built,
+                "budget_tokens": self.max_tokens,
+                "avg_tokens": round(self._total_tokens / self.built, 1) if self.built else 0.0,
+                "max_tokens": self._max_seen,
+            }
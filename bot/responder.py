@@ -1,33 +1,73 @@
 # bot/responder.py
-from models.embedder import Embedder
-import faiss
+from models.embedder import get_embedder
+import asyncio
+import time
+from contextlib import nullcontext
 import numpy as np
-import pickle
-import os
 from config.settings import settings
-from models.ai_client import call_openai
+from models.ai_client import call_openai, acall_openai
+from models.resilience import DeadlineExceeded
+from embeddings.index_holder import index_holder
+from bot.answer_cache import AnswerCache
+from bot.prompt_builder import PromptBuilder, format_hit
+from bot.retrieval import RetrievalStats, postprocess
+from bot.router import create_router
 
-# FAISS paths
-INDEX_PATH = os.path.join(settings.CHROMA_DIR, "faiss.index")
-METADATA_PATH = os.path.join(settings.CHROMA_DIR, "metadata.pkl")
+# Replies to first-turn questions, reused for near-identical questions
+answer_cache = AnswerCache(
+    threshold=settings.ANSWER_CACHE_THRESHOLD,
+    ttl=settings.ANSWER_CACHE_TTL,
+    max_entries=settings.ANSWER_CACHE_SIZE,
+) if settings.ANSWER_CACHE_ENABLED else None
 
-# Load embedder
-embedder = Embedder()
+# Templated replies for small talk and configured FAQs
+router = create_router() if settings.ROUTER_ENABLED else None
+
+# Candidates seen vs. chunks kept by retrieval post-processing
+retrieval_stats = RetrievalStats()
 
 # Load FAISS index and metadata
 def load_index():
-    """Load FAISS index and metadata."""
-    if not os.path.exists(INDEX_PATH) or not os.path.exists(METADATA_PATH):
-        raise FileNotFoundError(
-            f"Index not found at {INDEX_PATH}. "
-            "Please run the scraper first: python -c \"from scraper.scrape import crawl_and_build; crawl_and_build()\""
-        )
-    
-    index = faiss.read_index(INDEX_PATH)
-    with open(METADATA_PATH, 'rb') as f:
-        metadata = pickle.load(f)
-    
-    return index, metadata
+    """
+    Return the resident FAISS index and its memory-mapped MetadataStore.
+
+    Loaded once per process and hot-swapped when the files on disk change.
+    """
+    snapshot = index_holder.get()
+    return snapshot.index, snapshot.metadata
+
+def warmup():
+    """
+    Load the embedding model and index and run one query through embedding
+    and search, so the first customer message doesn't pay for model loading,
+    lazy allocations or cold caches.
+
+    Returns:
+        Dict with per-step timings (seconds) and whether an index was found
+    """
+    timings = {}
+    start = time.perf_counter()
+    embedder = get_embedder()
+    timings["model_load"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    q_emb = embedder.embed_query("What are your opening hours?")
+    timings["first_embed"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    try:
+        index, metadata = load_index()
+    except FileNotFoundError as e:
+        print(f"⚠️  Warmup without a knowledge base: {e}")
+        return {"index_loaded": False, **timings}
+    timings["index_load"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, indices = index.search(np.array([q_emb], dtype='float32'), 4)
+    for idx in indices[0]:
+        metadata.get(int(idx))
+    timings["first_search"] = time.perf_counter() - start
+    return {"index_loaded": True, **timings}
 
 SYSTEM_PROMPT = """
 You are a helpful customer service assistant for this business, communicating via WhatsApp.
@@ -51,42 +91,72 @@ Important rules:
 - When uncertain, it's better to defer to the team than give incorrect information
 """
 
-def retrieve_relevant(user_message, k=4):
+def search(user_message, k=4, q_emb=None):
+    """
+    Retrieve relevant document chunks from FAISS.
+
+    Fetches RETRIEVAL_OVERFETCH * k candidates, then drops those below
+    RETRIEVAL_MIN_SCORE, collapses duplicates and picks a diverse k by MMR
+    over the stored chunk vectors.
+
+    Args:
+        user_message: User query
+        k: Number of results to retrieve
+        q_emb: Precomputed query embedding (embedded here if None)
+
+    Returns:
+        Up to k {"id", "faiss_id", "text", "url", "score"} dicts, best first
+
+    Raises:
+        FileNotFoundError: No index has been built yet
+    """
+    index, metadata = load_index()
+
+    # Generate query embedding
+    if q_emb is None:
+        q_emb = get_embedder().embed_query(user_message)
+    q_emb_array = np.array([q_emb], dtype='float32')
+
+    # Search FAISS index
+    distances, indices = index.search(q_emb_array, k * max(settings.RETRIEVAL_OVERFETCH, 1))
+
+    hits = []
+    for dist, idx in zip(distances[0], indices[0]):
+        # idx is the chunk's FAISS id; -1 means fewer than k results
+        # Only these k entries are decoded from the memory-mapped store
+        entry = metadata.get(int(idx))
+        if entry is not None:
+            # FAISS returns inner product (already similarity for normalized vectors)
+            hits.append({**entry, "faiss_id": int(idx), "score": float(dist)})
+
+    return postprocess(
+        hits, index.reconstruct, k,
+        min_score=settings.RETRIEVAL_MIN_SCORE,
+        lambda_mult=settings.RETRIEVAL_MMR_LAMBDA,
+        duplicate_threshold=settings.RETRIEVAL_DUPLICATE_THRESHOLD,
+        stats=retrieval_stats,
+    )
+
+def retrieve_relevant(user_message, k=4, q_emb=None):
     """
     Retrieve relevant document chunks from FAISS.
     
     Args:
         user_message: User query
         k: Number of results to retrieve
+        q_emb: Precomputed query embedding (embedded here if None)
     
     Returns:
         Formatted string with relevant sources and minimum distance
     """
     try:
-        index, metadata = load_index()
+        hits = search(user_message, k=k, q_emb=q_emb)
     except FileNotFoundError as e:
         print(f"Error: {e}")
         return "No knowledge base found.", 1.0
     
-    # Generate query embedding
-    q_emb = embedder.embed_query(user_message)
-    q_emb_array = np.array([q_emb], dtype='float32')
-    
-    # Search FAISS index
-    distances, indices = index.search(q_emb_array, k)
-    
-    # Format results
-    pairs = []
-    for dist, idx in zip(distances[0], indices[0]):
-        if idx < len(metadata["documents"]):
-            doc = metadata["documents"][idx]
-            meta = metadata["metadatas"][idx]
-            # Convert distance to similarity score (higher is better)
-            similarity = float(dist)  # FAISS returns inner product (already similarity for normalized vectors)
-            pairs.append(f"Source (url={meta.get('url', 'unknown')}, relevance={similarity:.2f}):\n{doc}")
-    
-    retrieved_text = "\n\n".join(pairs)
-    min_similarity = float(distances[0][0]) if len(distances[0]) > 0 else 0.0
+    retrieved_text = "\n\n".join(format_hit(hit) for hit in hits)
+    min_similarity = hits[0]["score"] if hits else 0.0
     
     return retrieved_text, min_similarity
 
@@ -114,12 +184,151 @@ Instructions:
 """
     return prompt
 
+# Fits context and history into PROMPT_MAX_TOKENS
+prompt_builder = PromptBuilder(SYSTEM_PROMPT, make_prompt)
+
+FALLBACK_REPLY = ("I apologize, but I'm having trouble processing your request right now. "
+                  "Please try again, or I can connect you with our team for immediate assistance.")
+
+def build_prompt(user_message, phone_number, deadline=None):
+    """
+    Steps 1-2 of the RAG pipeline: retrieve context and construct the
+    prompt with history. CPU-bound (embedding + search).
+
+    The message is not recorded here: the caller records it together with
+    its reply (record_exchange), so a question that ends in the fallback
+    reply leaves no unanswered turn in the history.
+
+    With less than DEADLINE_DEGRADE_BELOW seconds left for the LLM the
+    history is left out: a shorter prompt is processed faster.
+
+    Raises:
+        DeadlineExceeded: Too little time is left for the LLM (checked
+            after the router and answer cache, before the search)
+
+    Returns:
+        (prompt, cached_reply, cache_key). On a router or answer-cache hit
+        prompt is None and cached_reply is the reply to send. cache_key is set when
+        the LLM's reply should be stored via remember_reply.
+    """
+    # Only first questions are cacheable: later turns depend on history
+    messages = memory.get_messages(phone_number)
+    summary = memory.get_summary(phone_number)
+    cacheable = answer_cache is not None and not summary and _routed_only(messages)
+
+    if router is not None:
+        route = router.match(user_message)
+        if route is not None:
+            print(f"🧭 Routed to '{route.name}'")
+            return None, route.reply, None
+
+    q_emb = get_embedder().embed_query(user_message)
+    if router is not None:
+        route = router.match_vector(q_emb, get_embedder().embed_queries)
+        if route is not None:
+            print(f"🧭 Routed to '{route.name}' (nearest neighbour)")
+            return None, route.reply, None
+
+    cache_key = None
+    if cacheable:
+        try:
+            version = index_holder.get().version
+        except FileNotFoundError:
+            version = None
+        if version is not None:
+            cached = answer_cache.get(q_emb, version)
+            if cached is not None:
+                print("⚡ Answer cache hit")
+                return None, cached, None
+            cache_key = (q_emb, version)
+
+    if deadline is not None:
+        if _llm_time(deadline) < settings.DEADLINE_MIN_LLM:
+            # Searching is pointless without time for the LLM
+            deadline.exhaust()
+            raise DeadlineExceeded(f"No time left for the LLM ({deadline.report()})")
+        if _llm_time(deadline) < settings.DEADLINE_DEGRADE_BELOW:
+            print(f"⏱️  {_llm_time(deadline):.1f}s left for the LLM, leaving out history")
+            messages, summary = [], ""
+
+    try:
+        hits = search(user_message, k=4, q_emb=q_emb)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        hits = []
+    
+    # If similarity is too low, we still pass it to the LLM but with a warning (or just rely on the prompt)
+    # We REMOVE the strict early return so that conversational context (Greeting, "My name is...") works.
+
+    built = prompt_builder.build(user_message, hits, messages, summary)
+    print(built.report())
+    return built.prompt, None, cache_key
+
+def _routed_only(messages):
+    """
+    True if the history holds nothing but routed exchanges (e.g. "hi" answered
+    with the greeting template), which a cached answer can't depend on.
+    """
+    if router is None:
+        return not messages
+    for i, msg in enumerate(messages):
+        if msg["role"] == "user":
+            reply = messages[i + 1] if i + 1 < len(messages) else None
+            if reply is None or reply["role"] != "assistant":
+                return False
+        elif not router.is_reply(msg["content"]):
+            return False
+    return True
+
+def _llm_time(deadline):
+    """Seconds the LLM may use, after keeping DEADLINE_SEND_RESERVE back for sending."""
+    return deadline.remaining() - settings.DEADLINE_SEND_RESERVE
+
+def _stage(deadline, name):
+    return deadline.stage(name) if deadline is not None else nullcontext()
+
+async def _acall_llm(prompt, deadline):
+    """
+    Call the LLM within the deadline's budget, asking for a shorter reply
+    when time is short.
+
+    Returns:
+        (reply, shortened): shortened replies were capped at
+        DEADLINE_SHORT_MAX_TOKENS and must not be cached
+
+    Raises:
+        DeadlineExceeded: Less than DEADLINE_MIN_LLM seconds left, or the
+            budget ran out during the call
+    """
+    if deadline is None:
+        return await acall_openai(SYSTEM_PROMPT, prompt), False
+    llm_deadline = deadline.reserve(settings.DEADLINE_SEND_RESERVE)
+    if llm_deadline.remaining() < settings.DEADLINE_MIN_LLM:
+        deadline.exhaust()
+        raise DeadlineExceeded(f"No time left for the LLM ({deadline.report()})")
+    shortened = llm_deadline.remaining() < settings.DEADLINE_DEGRADE_BELOW
+    max_tokens = settings.DEADLINE_SHORT_MAX_TOKENS if shortened else 512
+    with llm_deadline.stage("llm"):
+        reply = await acall_openai(SYSTEM_PROMPT, prompt, max_tokens=max_tokens,
+                                   deadline=llm_deadline)
+    return reply, shortened
+
+def record_exchange(phone_number, user_message, reply):
+    """Add a user message and the reply it got to the user's history."""
+    memory.add_message(phone_number, "user", user_message)
+    memory.add_message(phone_number, "assistant", reply)
+
+def remember_reply(cache_key, reply):
+    """Store an LLM reply in the answer cache (no-op when cache_key is None)."""
+    if cache_key is not None:
+        answer_cache.put(*cache_key, reply)
+
 def generate_reply(user_message, phone_number="unknown"):
     """
     Generate reply using RAG pipeline:
     1. Retrieve relevant documents
     2. Construct prompt with context AND history
-    3. Call OpenAI
+    3. Call OpenAI (skipped when the answer cache has a reply)
     4. Return response
     
     Args:
@@ -130,27 +339,51 @@ def generate_reply(user_message, phone_number="unknown"):
         Generated response text
     """
     try:
-        # Add User message to memory
-        memory.add_message(phone_number, "user", user_message)
-        
-        # Get history
-        history = memory.get_history(phone_number)
-
-        retrieved, min_similarity = retrieve_relevant(user_message, k=4)
+        prompt, resp, cache_key = build_prompt(user_message, phone_number)
+        if resp is None:
+            resp = call_openai(SYSTEM_PROMPT, prompt)
+            remember_reply(cache_key, resp)
         
-        # If similarity is too low, we still pass it to the LLM but with a warning (or just rely on the prompt)
-        # We REMOVE the strict early return so that conversational context (Greeting, "My name is...") works.
+        # Add the exchange to memory
+        record_exchange(phone_number, user_message, resp)
         
-        prompt = make_prompt(user_message, retrieved, history)
-        resp = call_openai(SYSTEM_PROMPT, prompt)
+        return resp
+    except Exception as e:
+        print(f"Error generating reply: {e}")
+        import traceback
+        traceback.print_exc()
+        return FALLBACK_REPLY
+
+async def agenerate_reply(user_message, phone_number="unknown", deadline=None):
+    """
+    Async variant of generate_reply used by the webhook workers.
+
+    Retrieval runs in a thread; the LLM call uses the pooled async client.
+    With a Deadline, each stage works within what is left of it and the
+    fallback reply is returned once it runs out. Only answered questions
+    are added to the history.
+    """
+    try:
+        with _stage(deadline, "retrieval"):
+            prompt, resp, cache_key = await asyncio.to_thread(
+                build_prompt, user_message, phone_number, deadline
+            )
+        if resp is None:
+            resp, shortened = await _acall_llm(prompt, deadline)
+            if not shortened:
+                # A truncated answer would outlive the rush that produced it
+                remember_reply(cache_key, resp)
         
-        # Add Assistant response to memory
-        memory.add_message(phone_number, "assistant", resp)
+        # Add the exchange to memory; the SQLite backend writes to disk, so
+        # keep it off the event loop like the reads in build_prompt
+        await asyncio.to_thread(record_exchange, phone_number, user_message, resp)
         
         return resp
+    except DeadlineExceeded as e:
+        print(f"⏱️  {e}")
+        return FALLBACK_REPLY
     except Exception as e:
         print(f"Error generating reply: {e}")
         import traceback
         traceback.print_exc()
-        return ("I apologize, but I'm having trouble processing your request right now. "
-                "Please try again, or I can connect you with our team for immediate assistance.")
+        return FALLBACK_REPLY
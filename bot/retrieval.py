@@ -0,0 +1,165 @@
+# bot/retrieval.py
+"""
+Post-processing of raw FAISS hits before they reach the prompt.
+
+The raw top-k often contains the same text more than once (boilerplate
+repeated on every page, a chunk indexed under two URLs) and several chunks
+saying nearly the same thing. The responder over-fetches candidates and
+this module turns them into fewer, denser sources:
+
+1. drop candidates below RETRIEVAL_MIN_SCORE;
+2. collapse duplicates by chunk id and by normalized-text hash;
+3. select the final k by maximal marginal relevance (MMR) over the stored
+   (already normalized) chunk vectors, skipping near-duplicates outright.
+"""
+
+import hashlib
+import threading
+
+import numpy as np
+
+
+def text_key(text):
+    """Hash of the text with case and whitespace normalized."""
+    return hashlib.blake2b(" ".join(text.lower().split()).encode("utf-8"), digest_size=16).digest()
+
+
+def dedupe_hits(hits):
+    """
+    Keep the best-scoring hit per chunk id and per normalized text.
+
+    Args:
+        hits: Dicts with "id", "text" and "score", best first
+
+    Returns:
+        (unique_hits, duplicates_removed)
+    """
+    seen_ids = set()
+    seen_texts = set()
+    unique = []
+    for hit in hits:
+        key = text_key(hit["text"])
+        if hit["id"] in seen_ids or key in seen_texts:
+            continue
+        seen_ids.add(hit["id"])
+        seen_texts.add(key)
+        unique.append(hit)
+    return unique, len(hits) - len(unique)
+
+
+def mmr_select(vectors, scores, k, lambda_mult=0.7, duplicate_threshold=0.97):
+    """
+    Maximal marginal relevance selection.
+
+    Each step picks the candidate maximizing
+    lambda * relevance - (1 - lambda) * max similarity to those already picked.
+
+    Args:
+        vectors: (n, d) normalized candidate vectors
+        scores: Relevance of each candidate (query inner product)
+        k: Number of candidates to select
+        lambda_mult: 1.0 is pure relevance, 0.0 pure diversity
+        duplicate_threshold: Candidates at least this similar to a picked
+            one are never selected
+
+    Returns:
+        Indices into vectors, in selection order
+    """
+    vectors = np.asarray(vectors, dtype='float32')
+    n = len(vectors)
+    if n == 0 or k <= 0:
+        return []
+    relevance = np.asarray(scores, dtype='float32')
+    sims = vectors @ vectors.T
+    max_sim = np.full(n, -np.inf, dtype='float32')
+    available = np.ones(n, dtype=bool)
+    selected = []
+    while len(selected) < k and available.any():
+        redundancy = np.where(np.isfinite(max_sim), max_sim, 0.0)
+        mmr = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        mmr[~available] = -np.inf
+        best = int(np.argmax(mmr))
+        selected.append(best)
+        available[best] = False
+        max_sim = np.maximum(max_sim, sims[best])
+        available &= max_sim < duplicate_threshold
+    return selected
+
+
+class RetrievalStats:
+    """Counters for /health/retrieval."""
+
+    def __init__(self):
+        self.queries = 0
+        self.candidates = 0
+        self.returned = 0
+        self.below_floor = 0
+        self.duplicates = 0
+        self.redundant = 0
+        self._lock = threading.Lock()
+
+    def record(self, candidates, returned, below_floor, duplicates, redundant):
+        with self._lock:
+            self.queries += 1
+            self.candidates += candidates
+            self.returned += returned
+            self.below_floor += below_floor
+            self.duplicates += duplicates
+            self.redundant += redundant
+
+    def to_dict(self):
+        with self._lock:
+            return self._to_dict()
+
+    def _to_dict(self):
+        q = self.queries or 1
+        return {
+            "queries": self.queries,
+            "avg_candidates": round(self.candidates / q, 2),
+            "avg_returned": round(self.returned / q, 2),
+            "below_floor": self.below_floor,
+            "duplicates_removed": self.duplicates,
+            "redundant_removed": self.redundant,
+        }
+
+
+def postprocess(hits, get_vector, k, min_score=0.0, lambda_mult=0.7,
+                duplicate_threshold=0.97, stats=None):
+    """
+    Turn over-fetched hits into at most k deduplicated, diverse sources.
+
+    Args:
+        hits: Dicts with "id", "faiss_id", "text", "url" and "score", best first
+        get_vector: Callable faiss_id -> stored vector, or None to skip MMR
+        k: Number of hits to return
+        min_score: Similarity floor
+        lambda_mult: MMR relevance/diversity trade-off
+        duplicate_threshold: Vector similarity treated as a duplicate
+        stats: Optional RetrievalStats to update
+
+    Returns:
+        List of hit dicts, best first
+    """
+    candidates = [hit for hit in hits if hit["score"] >= min_score]
+    below_floor = len(hits) - len(candidates)
+    candidates, duplicates = dedupe_hits(candidates)
+
+    redundant = 0
+    if len(candidates) > 1 and get_vector is not None:
+        try:
+            vectors = np.stack([get_vector(hit["faiss_id"]) for hit in candidates])
+        except RuntimeError as e:
+            # Index without reconstruct support: relevance order only
+            print(f"⚠️  MMR skipped, vectors unavailable: {e}")
+            vectors = None
+        if vectors is not None:
+            order = mmr_select(vectors, [hit["score"] for hit in candidates], k,
+                               lambda_mult=lambda_mult, duplicate_threshold=duplicate_threshold)
+            # Slots left empty because the rest were near-duplicates
+            redundant = min(k, len(candidates)) - len(order)
+            candidates = [candidates[i] for i in order]
+    selected = sorted(candidates[:k], key=lambda hit: hit["score"], reverse=True)
+
+    if stats is not None:
+        stats.record(len(hits), len(selected), below_floor, duplicates, redundant)
+    return selected
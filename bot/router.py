@@ -0,0 +1,192 @@
+# bot/router.py
+"""
+Pre-retrieval router for messages that don't need the knowledge base.
+
+"hi", "thanks!" and "ok 👍" used to cost a query embedding, a FAISS search
+and a full Groq call. The router answers them from templates instead:
+
+- Regex routes: built-in small talk (greeting, thanks, acknowledgement,
+  goodbye) plus FAQ entries from ROUTER_FAQ_PATH. Patterns must match the
+  whole (normalized) message, so "hi, where is my order?" still goes to the
+  RAG pipeline. Runs before embedding, in microseconds.
+- Nearest-neighbour routes (ROUTER_NN_ENABLED): the FAQ entries' example
+  questions are embedded once; a query embedding at least
+  ROUTER_NN_THRESHOLD similar to one of them gets that FAQ's reply. This
+  reuses the embedding the responder computes anyway and only skips the
+  search and the LLM.
+
+FAQ file format (JSON list):
+
+    [{"name": "opening_hours",
+      "patterns": ["(what are )?(your )?(opening|business) hours\\\\??"],
+      "examples": ["When are you open?", "What time do you close?"],
+      "reply": "We're open Monday to Friday, 9am to 6pm."}]
+"""
+
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+from config.settings import settings
+
+# Trailing punctuation, emoji and whitespace are ignored when matching
+_TRAILING = re.compile(r"[\s!.,?🙂😊🙏👍👋❤️]+$")
+
+SMALL_TALK = [
+    {
+        "name": "greeting",
+        "patterns": [r"(hi+|hey+|hello+|hiya|howdy|yo|good (morning|afternoon|evening)|greetings)( there| team| everyone)?"],
+        "reply": "Hello! 👋 How can I help you today?",
+    },
+    {
+        "name": "thanks",
+        "patterns": [r"(thanks?( you)?( so much| a lot| very much)?|thank u|thx|ty|cheers|much appreciated)"],
+        "reply": "You're welcome! Let me know if there's anything else I can help with.",
+    },
+    {
+        "name": "acknowledgement",
+        "patterns": [r"(ok(ay)?|k|kk|cool|great|perfect|got it|alright|sure|noted|nice|awesome)"],
+        "reply": "Great! Feel free to message me if you have any other questions.",
+    },
+    {
+        "name": "goodbye",
+        "patterns": [r"(bye+|goodbye|see (you|ya)|take care|good night|have a (good|nice|great) day)"],
+        "reply": "Thanks for reaching out! Have a great day. 😊",
+    },
+]
+
+
+def normalize(text):
+    """Lowercase, collapse whitespace and strip trailing punctuation/emoji."""
+    return _TRAILING.sub("", " ".join(text.lower().split()))
+
+
+def load_faq(path):
+    """
+    Read FAQ routes from a JSON file ([] if path is empty or missing).
+    """
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    for entry in entries:
+        if "name" not in entry or "reply" not in entry:
+            raise ValueError(f"FAQ entry in {path} needs 'name' and 'reply': {entry!r}")
+    return entries
+
+
+class Route:
+    """A named intent answered with a fixed reply."""
+
+    __slots__ = ("name", "reply", "patterns", "examples")
+
+    def __init__(self, name, reply, patterns=(), examples=()):
+        self.name = name
+        self.reply = reply
+        self.patterns = [re.compile(p, re.IGNORECASE) for p in patterns]
+        self.examples = list(examples)
+
+
+class Router:
+    """
+    Answers trivial intents and configured FAQs without retrieval or the LLM.
+
+    Args:
+        routes: Dicts with "name", "reply" and optional "patterns" / "examples"
+        nn_threshold: Cosine similarity for nearest-neighbour matches (None disables them)
+    """
+
+    def __init__(self, routes, nn_threshold=None):
+        self.routes = [Route(r["name"], r["reply"], r.get("patterns", ()), r.get("examples", ()))
+                       for r in routes]
+        self.nn_threshold = nn_threshold
+        self._replies = {route.reply for route in self.routes}
+        self.messages = 0
+        self.hits = {route.name: 0 for route in self.routes}
+        self._example_vectors = None
+        self._example_routes = []
+        self._lock = threading.Lock()
+        self._examples_lock = threading.Lock()
+
+    def _record(self, route):
+        with self._lock:
+            if route is not None:
+                self.hits[route.name] += 1
+            return route
+
+    def match(self, text):
+        """
+        Regex lookup; call once per incoming message (it counts messages).
+
+        Returns:
+            The matching Route, or None
+        """
+        with self._lock:
+            self.messages += 1
+        normalized = normalize(text)
+        for route in self.routes:
+            if any(p.fullmatch(normalized) for p in route.patterns):
+                return self._record(route)
+        return None
+
+    def is_reply(self, text):
+        """Whether `text` is one of the routes' template replies."""
+        return text in self._replies
+
+    def _examples(self, embed):
+        """Embed the example questions once (first nearest-neighbour lookup)."""
+        with self._examples_lock:
+            if self._example_vectors is None:
+                examples = [(route, ex) for route in self.routes for ex in route.examples]
+                self._example_routes = [route for route, _ in examples]
+                if examples:
+                    vectors = embed([ex for _, ex in examples])
+                    self._example_vectors = np.asarray(vectors, dtype='float32')
+                else:
+                    self._example_vectors = np.empty((0, 0), dtype='float32')
+        return self._example_vectors
+
+    def match_vector(self, q_emb, embed):
+        """
+        Nearest-neighbour lookup against the routes' example questions.
+
+        Args:
+            q_emb: Normalized query embedding
+            embed: Callable list[str] -> normalized vectors (used once, lazily)
+
+        Returns:
+            The matching Route, or None (also when disabled)
+        """
+        if self.nn_threshold is None:
+            return None
+        vectors = self._examples(embed)
+        if not len(vectors):
+            return None
+        sims = vectors @ np.asarray(q_emb, dtype='float32')
+        best = int(np.argmax(sims))
+        if sims[best] < self.nn_threshold:
+            return None
+        return self._record(self._example_routes[best])
+
+    def stats(self):
+        with self._lock:
+            routed = sum(self.hits.values())
+            return {
+                "messages": self.messages,
+                "routed": routed,
+                "llm_calls_saved_pct": round(100.0 * routed / self.messages, 1) if self.messages else 0.0,
+                "hits": dict(self.hits),
+            }
+
+
+def create_router():
+    """
+    Build the router from the built-in small talk and ROUTER_FAQ_PATH.
+    """
+    faq = load_faq(settings.ROUTER_FAQ_PATH)
+    nn_threshold = settings.ROUTER_NN_THRESHOLD if settings.ROUTER_NN_ENABLED else None
+    # FAQs first: a configured answer beats generic small talk
+    return Router(faq + SMALL_TALK, nn_threshold=nn_threshold)
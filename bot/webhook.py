@@ -1,13 +1,105 @@
 # bot/webhook.py
+import asyncio
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException
 from config.settings import settings
-from bot.responder import generate_reply
-import requests
-import os
-
-app = FastAPI()
+from bot.responder import agenerate_reply, answer_cache, prompt_builder, retrieval_stats, router, warmup
+from bot.worker import WorkerPool
+from bot.coalescer import MessageCoalescer
+from bot.dedup import create_dedup_store
+from models.ai_client import llm_client
+from models.resilience import Deadline
+from models.embedder import get_embedder
+from models.http_client import aclose_clients, get_async_client, get_sync_client
 
 from fastapi import Response
+from fastapi.responses import JSONResponse
+
+
+# Replies per stage that used up the REPLY_DEADLINE budget, for /health/deadline
+deadline_stats = {"replies": 0, "over_budget": 0, "exhausted_by": {}}
+
+
+async def process_message(phone, text, deadline=None):
+    """
+    Run the full reply pipeline for one message (executed on a worker).
+
+    Args:
+        deadline: Deadline started when the webhook received the message;
+            time spent queued and coalescing counts against it
+    """
+    if deadline is None:
+        deadline = Deadline(settings.REPLY_DEADLINE)
+    deadline.record("queue", deadline.elapsed())
+
+    print(f"\n🔍 Processing message: '{text}'")
+    print(f"🤖 Generating AI reply for {phone}...")
+
+    reply = await agenerate_reply(text, phone, deadline)
+
+    print(f"\n✅ Generated reply:")
+    print(f"   {reply[:200]}..." if len(reply) > 200 else f"   {reply}")
+
+    print(f"\n📤 Sending to {phone}...")
+    with deadline.stage("send"):
+        await asend_whatsapp_text(phone, reply, deadline)
+
+    print(f"⏱️  Reply timing: {deadline.report()}")
+    deadline_stats["replies"] += 1
+    if deadline.exhausted_by:
+        deadline_stats["over_budget"] += 1
+        by_stage = deadline_stats["exhausted_by"]
+        by_stage[deadline.exhausted_by] = by_stage.get(deadline.exhausted_by, 0) + 1
+
+
+# One reply at a time per user; bursts of messages are merged into one
+coalescer = MessageCoalescer(
+    process_message,
+    window_ms=settings.COALESCE_WINDOW_MS,
+    max_wait_ms=settings.COALESCE_MAX_WAIT_MS,
+)
+
+# Background workers that run retrieval, LLM and send off the request path;
+# the coalescer hands them one job per burst once its debounce window closes
+worker_pool = WorkerPool(
+    coalescer.flush,
+    workers=settings.WORKER_COUNT,
+    maxsize=settings.JOB_QUEUE_SIZE,
+)
+coalescer.pool = worker_pool
+
+
+# Startup state reported by /ready
+readiness = {"ready": False, "error": None, "warmup": None, "started_at": time.monotonic()}
+
+
+async def run_warmup():
+    """Load the model and index off the event loop and mark the app ready."""
+    try:
+        timings = await asyncio.to_thread(warmup)
+        timings["total"] = time.monotonic() - readiness["started_at"]
+        readiness["warmup"] = {k: round(v, 3) if isinstance(v, float) else v
+                               for k, v in timings.items()}
+        readiness["ready"] = True
+        print(f"✅ Warmup complete: {readiness['warmup']}")
+    except Exception as e:
+        readiness["error"] = str(e)
+        print(f"❌ Warmup failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await worker_pool.start()
+    # Serve (and answer liveness probes) while the model loads in the background
+    warmup_task = asyncio.create_task(run_warmup())
+    yield
+    warmup_task.cancel()
+    await worker_pool.stop()
+    await aclose_clients()
+
+
+app = FastAPI(lifespan=lifespan)
 
 @app.get("/")
 async def root_verify(request: Request):
@@ -58,23 +150,21 @@ async def verify_signature(request: Request):
     if not hmac.compare_digest(signature, expected_signature):
         raise HTTPException(status_code=403, detail="Invalid signature")
 
-# Idempotency
-PROCESSED_IDS = set()
-MAX_PROCESSED_IDS = 1000
+# Idempotency: message IDs already accepted (shared across workers with DEDUP_BACKEND=sqlite)
+processed_ids = create_dedup_store()
 
 @app.post("/webhook")
 async def webhook(request: Request):
     """
     Main webhook endpoint for receiving WhatsApp messages.
-    Processes incoming messages and sends AI-generated replies.
+    Verifies and enqueues incoming messages, then returns immediately;
+    replies are generated and sent by the background workers.
     """
     # 1. Verify Signature
     await verify_signature(request)
 
     data = await request.json()
     
-    # ... (logging skipped for brevity, keeping core logic clean) ...
-    # Log incoming webhook data
     print("\n" + "="*60)
     print("📨 WEBHOOK RECEIVED")
     print("="*60)
@@ -93,17 +183,11 @@ async def webhook(request: Request):
                     continue
                 
                 for msg in messages:
-                    # 2. Idempotency Check
+                    # 2. Idempotency Check (atomic claim, so concurrent retries can't both pass)
                     msg_id = msg.get("id")
-                    if msg_id in PROCESSED_IDS:
+                    if msg_id and not processed_ids.claim(msg_id):
                         print(f"⚠️  Skipping duplicate message ID: {msg_id}")
                         continue
-                    
-                    if msg_id:
-                        PROCESSED_IDS.add(msg_id)
-                        # Rotate if too large
-                        if len(PROCESSED_IDS) > MAX_PROCESSED_IDS:
-                            PROCESSED_IDS.pop()
 
                     phone = msg.get("from")
                     text = msg.get("text", {}).get("body")
@@ -112,22 +196,16 @@ async def webhook(request: Request):
                         print("   ⚠️  Skipping (no text body)")
                         continue
                     
-                    print(f"\n🔍 Processing message: '{text}'")
-                    print(f"🤖 Generating AI reply for {phone}...")
-                    
-                    # Generate AI reply
-                    reply = generate_reply(text, phone)
-                    
-                    print(f"\n✅ Generated reply:")
-                    print(f"   {reply[:200]}..." if len(reply) > 200 else f"   {reply}")
-                    
-                    # Send reply via WhatsApp
-                    print(f"\n📤 Sending to {phone}...")
-                    send_whatsapp_text(phone, reply)
-                    
-        print("\n" + "="*60)
-        print("✅ WEBHOOK PROCESSING COMPLETE")
-        print("="*60 + "\n")
+                    # 3. Hand to the coalescer, which queues it for the workers
+                    # (backpressure if full); the reply's time budget starts now
+                    if not coalescer.submit(phone, text, Deadline(settings.REPLY_DEADLINE)):
+                        print(f"⚠️  Job queue full ({worker_pool.maxsize}), asking WhatsApp to retry")
+                        # Release the claim so Meta's retry will enqueue it
+                        if msg_id:
+                            processed_ids.release(msg_id)
+                        return Response(content="Busy", status_code=503)
+
+                    print(f"📥 Queued message from {phone} (queue depth {worker_pool.stats()['queue_depth']})")
                     
     except Exception as e:
         print(f"\n❌ WEBHOOK ERROR: {e}")
@@ -138,17 +216,69 @@ async def webhook(request: Request):
     
     return {"status": "ok"}
 
-def send_whatsapp_text(to_number, message):
-    """
-    Send text message via WhatsApp Cloud API.
-    
-    Args:
-        to_number: Recipient's phone number
-        message: Message text to send
-    
-    Returns:
-        API response JSON
-    """
+
+@app.get("/health/queue")
+async def queue_health():
+    """Report worker queue depth, backpressure and coalescing counters."""
+    return {**worker_pool.stats(), "coalescing": coalescer.stats()}
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once the model and index are warm, else 503."""
+    if not readiness["ready"]:
+        return JSONResponse({"ready": False, "error": readiness["error"]}, status_code=503)
+    return {"ready": True, "warmup": readiness["warmup"]}
+
+@app.get("/health/embedder")
+async def embedder_health():
+    """Report achieved query-embedding batch sizes."""
+    embedder = get_embedder(load=False)
+    if embedder is None:
+        return {"loaded": False}
+    if embedder.batcher is None:
+        return {"loaded": True, "batching": False}
+    return {"loaded": True, "batching": True, **embedder.batcher.stats()}
+
+@app.get("/health/dedup")
+async def dedup_health():
+    """Report remembered message IDs and duplicates skipped."""
+    return processed_ids.stats()
+
+@app.get("/health/cache")
+async def cache_health():
+    """Report semantic answer cache size and hit rate."""
+    if answer_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **answer_cache.stats()}
+
+@app.get("/health/prompt")
+async def prompt_health():
+    """Report prompt sizes against the token budget."""
+    return prompt_builder.stats()
+
+@app.get("/health/retrieval")
+async def retrieval_health():
+    """Report retrieval candidates vs. chunks kept after dedup, MMR and the floor."""
+    return retrieval_stats.to_dict()
+
+@app.get("/health/deadline")
+async def deadline_health():
+    """Report replies that ran out of REPLY_DEADLINE, by the stage that used it up."""
+    return {"budget_seconds": settings.REPLY_DEADLINE, **deadline_stats}
+
+@app.get("/health/llm")
+async def llm_health():
+    """Report LLM retries, hedges, fallbacks and circuit breaker states."""
+    return llm_client.stats()
+
+@app.get("/health/router")
+async def router_health():
+    """Report messages answered by the small-talk/FAQ router, per route."""
+    if router is None:
+        return {"enabled": False}
+    return {"enabled": True, **router.stats()}
+
+def _whatsapp_request(to_number, message):
     url = f"{settings.WHATSAPP_API_URL}/{settings.WHATSAPP_PHONE_ID}/messages"
     headers = {
         "Authorization": f"Bearer {settings.WHATSAPP_TOKEN}",
@@ -160,16 +290,58 @@ def send_whatsapp_text(to_number, message):
         "type": "text",
         "text": {"body": message}
     }
+    return url, headers, payload
+
+def _log_send_error(e):
+    print(f"✗ WhatsApp send failed: {e}")
+    if getattr(e, 'response', None) is not None:
+        print(f"Response: {e.response.text}")
+
+async def asend_whatsapp_text(to_number, message, deadline=None):
+    """
+    Send text message via WhatsApp Cloud API over the pooled async client.
+    
+    Args:
+        to_number: Recipient's phone number
+        message: Message text to send
+        deadline: Optional reply Deadline; the send uses what is left of
+            it, but at least DEADLINE_SEND_RESERVE so a late reply still goes out
+    
+    Returns:
+        API response JSON
+    """
+    url, headers, payload = _whatsapp_request(to_number, message)
+    options = {}
+    if deadline is not None:
+        options["timeout"] = max(deadline.remaining(), settings.DEADLINE_SEND_RESERVE)
     
     try:
-        resp = requests.post(url, headers=headers, json=payload, timeout=30)
+        resp = await get_async_client(url).post(url, headers=headers, json=payload, **options)
         resp.raise_for_status()
         print(f"✓ Message sent to {to_number}")
         return resp.json()
     except Exception as e:
-        print(f"✗ WhatsApp send failed: {e}")
-        if hasattr(e, 'response') and e.response:
-            print(f"Response: {e.response.text}")
+        _log_send_error(e)
         return {"error": str(e)}
 
-
+def send_whatsapp_text(to_number, message):
+    """
+    Blocking variant of asend_whatsapp_text for scripts.
+    
+    Args:
+        to_number: Recipient's phone number
+        message: Message text to send
+    
+    Returns:
+        API response JSON
+    """
+    url, headers, payload = _whatsapp_request(to_number, message)
+    
+    try:
+        resp = get_sync_client(url).post(url, headers=headers, json=payload)
+        resp.raise_for_status()
+        print(f"✓ Message sent to {to_number}")
+        return resp.json()
+    except Exception as e:
+        _log_send_error(e)
+        return {"error": str(e)}
@@ -0,0 +1,128 @@
+# bot/worker.py
+"""
+Bounded in-process job queue with a pool of async workers.
+
+The webhook enqueues jobs and returns immediately; workers pick them up and
+run the (blocking) handler in a thread so the event loop stays responsive.
+"""
+
+import asyncio
+import time
+import traceback
+
+
+class WorkerPool:
+    """
+    Fixed-size pool of workers draining a bounded asyncio queue.
+
+    Args:
+        handler: Callable invoked with each job's positional arguments.
+            Plain functions run in a thread; coroutine functions are awaited.
+        workers: Number of concurrent workers
+        maxsize: Maximum number of jobs waiting in the queue
+    """
+
+    def __init__(self, handler, workers=4, maxsize=100):
+        self.handler = handler
+        self.workers = workers
+        self.maxsize = maxsize
+        self._queue = None
+        self._tasks = []
+        self._busy = 0
+        self.enqueued = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._total_wait = 0.0
+        self._total_run = 0.0
+
+    async def start(self):
+        """Create the queue and spawn the worker tasks."""
+        self._start()
+
+    def _start(self):
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [
+            asyncio.create_task(self._run(i), name=f"worker-{i}")
+            for i in range(self.workers)
+        ]
+        print(f"Started {self.workers} workers (queue size {self.maxsize})")
+
+    async def stop(self, drain_timeout=10.0):
+        """
+        Stop the workers, giving queued jobs up to drain_timeout seconds to finish.
+        """
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️  Stopping with {self._queue.qsize()} jobs still queued")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def submit(self, *args):
+        """
+        Enqueue a job without waiting.
+
+        Returns:
+            True if the job was accepted, False if the queue is full
+        """
+        if self._queue is None:
+            # Started lazily when the app runs without its lifespan (e.g. bare TestClient)
+            self._start()
+        try:
+            self._queue.put_nowait((time.monotonic(), args))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    def full(self):
+        """True when submit() would reject a job."""
+        return self._queue is not None and self._queue.full()
+
+    async def _run(self, worker_id):
+        while True:
+            enqueued_at, args = await self._queue.get()
+            started = time.monotonic()
+            self._total_wait += started - enqueued_at
+            self._busy += 1
+            try:
+                if asyncio.iscoroutinefunction(self.handler):
+                    await self.handler(*args)
+                else:
+                    await asyncio.to_thread(self.handler, *args)
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ Worker {worker_id} job failed: {e}")
+                traceback.print_exc()
+            finally:
+                self._busy -= 1
+                self._total_run += time.monotonic() - started
+                self._queue.task_done()
+
+    def stats(self):
+        """Queue depth and throughput counters for monitoring."""
+        depth = self._queue.qsize() if self._queue is not None else 0
+        finished = self.completed + self.failed
+        return {
+            "workers": self.workers,
+            "busy_workers": self._busy,
+            "queue_depth": depth,
+            "queue_capacity": self.maxsize,
+            "queue_utilization": round(depth / self.maxsize, 3) if self.maxsize else 0.0,
+            "enqueued": self.enqueued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(1000 * self._total_wait / finished, 1) if finished else 0.0,
+            "avg_run_ms": round(1000 * self._total_run / finished, 1) if finished else 0.0,
+        }
@@ -1,4 +1,6 @@
 # config/settings.py
+from typing import List
+
 from pydantic_settings import BaseSettings
 import os
 
@@ -12,11 +14,126 @@ class Settings(BaseSettings):
     WHATSAPP_API_URL: str = "https://graph.facebook.com/v16.0"
     CHROMA_DIR: str = "./chroma_db"
     EMBED_MODEL: str = "all-MiniLM-L6-v2"
+    # "torch", "onnx" or "onnx-int8" (ONNX needs `pip install "sentence-transformers[onnx]"`)
+    EMBED_BACKEND: str = "torch"
+    # Target CPU for int8 quantization: "avx2", "avx512", "avx512_vnni" or "arm64"
+    EMBED_ONNX_QUANTIZATION: str = "avx2"
     SITEMAP_URL: str
     SCRAPE_USER_AGENT: str = "MyBot/1.0"
     HOST_URL: str
     PORT: int = 8000
     MAX_CHUNK_TOKENS: int = 450
+    # "model": count embedding-model tokens (capped at the model's max input); "words": word heuristic
+    CHUNKER: str = "model"
+    CHUNK_OVERLAP_TOKENS: int = 32
+    # HTML cleaning backend: "lxml" (fast, single pass) or "bs4" (reference)
+    CLEAN_ENGINE: str = "lxml"
+    # Page cap for the full-browser scrape (scraper/scrape.py)
+    SCRAPE_MAX_PAGES: int = 500
+
+    # Async crawler
+    CRAWL_CONCURRENCY: int = 8
+    CRAWL_RATE_PER_HOST: float = 4.0  # requests per second
+    CRAWL_BURST_PER_HOST: int = 4
+
+    # Playwright rendering
+    RENDER_CONCURRENCY: int = 4
+    RENDER_BLOCK_RESOURCES: bool = True
+    RENDER_READY_SELECTOR: str = "body"
+    RENDER_IDLE_MS: int = 500
+    RENDER_TIMEOUT_MS: int = 30000
+
+    # Serving index: "flat" (exact), "hnsw", "ivf_flat" or "ivf_pq" (approximate)
+    INDEX_TYPE: str = "flat"
+    HNSW_M: int = 32
+    HNSW_EF_CONSTRUCTION: int = 200
+    HNSW_EF_SEARCH: int = 64
+    IVF_NLIST: int = 1024  # capped so every list gets enough training vectors
+    IVF_NPROBE: int = 16
+    PQ_M: int = 48  # sub-quantizers; must divide the embedding dimension
+    PQ_NBITS: int = 8
+
+    # Seconds between checks for a rebuilt index on disk
+    INDEX_RELOAD_INTERVAL: float = 5.0
+    # Reuse embeddings of unchanged chunks across index builds
+    EMBED_CACHE_ENABLED: bool = True
+    # Streaming index build: chunks per embed/upsert batch, batches per saved checkpoint
+    PIPELINE_BATCH_SIZE: int = 64
+    PIPELINE_CHECKPOINT_BATCHES: int = 10
+
+    # Micro-batching of concurrent query embeddings
+    EMBED_BATCHING_ENABLED: bool = True
+    EMBED_BATCH_MAX_SIZE: int = 32
+    EMBED_BATCH_MAX_WAIT_MS: float = 2.0
+
+    # Semantic answer cache for repeated first-turn questions
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_THRESHOLD: float = 0.92  # cosine similarity
+    ANSWER_CACHE_TTL: float = 3600.0  # seconds
+    ANSWER_CACHE_SIZE: int = 1000
+
+    # Small-talk / FAQ router answered from templates, skipping retrieval and the LLM
+    ROUTER_ENABLED: bool = True
+    ROUTER_FAQ_PATH: str = ""  # JSON list of {"name", "patterns", "examples", "reply"}
+    ROUTER_NN_ENABLED: bool = False  # also match FAQ examples by embedding similarity
+    ROUTER_NN_THRESHOLD: float = 0.85
+
+    # Retrieval post-processing: over-fetch, dedupe, MMR diversity, similarity floor
+    RETRIEVAL_OVERFETCH: int = 3  # candidates fetched per returned chunk
+    RETRIEVAL_MIN_SCORE: float = 0.2  # cosine similarity
+    RETRIEVAL_MMR_LAMBDA: float = 0.7  # 1.0 = pure relevance, 0.0 = pure diversity
+    RETRIEVAL_DUPLICATE_THRESHOLD: float = 0.97  # near-identical chunk vectors
+
+    # Prompt token budget (system prompt + template + context + history)
+    PROMPT_MAX_TOKENS: int = 2000
+    PROMPT_HISTORY_TOKENS: int = 500
+    PROMPT_MIN_CHUNK_TOKENS: int = 40  # smaller trimmed chunks are dropped instead
+
+    # Conversation memory: "memory" (per process) or "sqlite" (shared by all workers)
+    MEMORY_BACKEND: str = "memory"
+    MEMORY_MAX_USERS: int = 10000
+    MEMORY_TTL: float = 86400.0  # seconds of inactivity before a conversation is forgotten
+    MEMORY_SUMMARY_CHARS: int = 600  # running summary of turns that left the history window
+
+    # Webhook idempotency: "memory" (per process) or "sqlite" (shared by all workers)
+    DEDUP_BACKEND: str = "memory"
+    DEDUP_TTL: float = 604800.0  # Meta retries failed deliveries for up to 7 days
+    DEDUP_MAX_IDS: int = 100000
+
+    # Background reply workers
+    WORKER_COUNT: int = 4
+    JOB_QUEUE_SIZE: int = 100
+    # Merge a user's messages sent within this quiet window into one reply (0 = no debounce)
+    COALESCE_WINDOW_MS: int = 1500
+    COALESCE_MAX_WAIT_MS: int = 5000
+
+    # End-to-end budget per reply, from webhook receipt to the WhatsApp send
+    REPLY_DEADLINE: float = 20.0
+    DEADLINE_SEND_RESERVE: float = 3.0  # kept back from the LLM for sending the reply
+    DEADLINE_MIN_LLM: float = 1.5  # less LLM time than this: send the fallback reply instead
+    DEADLINE_DEGRADE_BELOW: float = 8.0  # less LLM time than this: skip history, shorter reply
+    DEADLINE_SHORT_MAX_TOKENS: int = 200
+
+    # Pooled outbound HTTP (Groq, WhatsApp Graph API); limits are per host
+    HTTP2_ENABLED: bool = True
+    HTTP_MAX_CONNECTIONS_PER_HOST: int = 20
+    HTTP_MAX_KEEPALIVE_PER_HOST: int = 10
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP_TIMEOUT: float = 30.0
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+    LLM_TIMEOUT: float = 30.0
+
+    # LLM resilience: retries per model, then LLM_FALLBACK_MODELS in order
+    # (env value is a JSON list, e.g. '["llama-3.1-8b-instant"]')
+    LLM_FALLBACK_MODELS: List[str] = []
+    LLM_MAX_RETRIES: int = 2
+    LLM_RETRY_BASE_DELAY: float = 0.5  # doubled per retry, full jitter
+    LLM_RETRY_MAX_DELAY: float = 8.0  # longer Retry-After waits skip to the next model
+    # Duplicate a request still running after the recent p95 latency
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_INITIAL_DELAY: float = 3.0  # used until enough latencies are recorded
+    LLM_BREAKER_FAILURES: int = 5
+    LLM_BREAKER_RESET: float = 30.0
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,112 @@
+# embeddings/ann_index.py
+"""
+Serving index construction for the selectable INDEX_TYPE.
+
+The vector store itself is always an exact IndexIDMap2(IndexFlatIP): it
+supports removal and reconstruction, which page-level upserts need. At save
+time the serving index is derived from it:
+
+    flat      the store itself (exact brute-force scan)
+    hnsw      graph index, no training; efSearch trades recall for latency
+    ivf_flat  inverted lists over k-means centroids; nprobe lists are scanned
+    ivf_pq    inverted lists with product-quantized vectors (smallest, lossy)
+
+Trained types are trained on the full build corpus each time they are built.
+"""
+
+import time
+
+import faiss
+import numpy as np
+
+from config.settings import settings
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+# k-means wants roughly this many training points per centroid
+MIN_POINTS_PER_CENTROID = 39
+
+
+def store_vectors(index):
+    """
+    Return (vectors, ids) of every entry in an IndexIDMap2(IndexFlat*) store.
+    """
+    flat = faiss.downcast_index(index.index)
+    ids = faiss.vector_to_array(index.id_map).astype('int64')
+    vectors = flat.reconstruct_n(0, flat.ntotal) if flat.ntotal else np.empty((0, index.d), dtype='float32')
+    return np.ascontiguousarray(vectors, dtype='float32'), ids
+
+
+def _ivf_nlist(n):
+    return max(1, min(settings.IVF_NLIST, n // MIN_POINTS_PER_CENTROID))
+
+
+def build_search_index(store_index, index_type=None):
+    """
+    Build the serving index for `index_type` from the exact store index.
+
+    Args:
+        store_index: IndexIDMap2 over IndexFlatIP holding every chunk vector
+        index_type: One of INDEX_TYPES (default INDEX_TYPE)
+
+    Returns:
+        A FAISS index searchable by the same chunk ids. Falls back to the
+        flat store when the corpus is too small to train the requested type.
+    """
+    index_type = index_type or settings.INDEX_TYPE
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown INDEX_TYPE: {index_type!r} (expected one of {', '.join(INDEX_TYPES)})")
+    if index_type == "flat":
+        return store_index
+
+    vectors, ids = store_vectors(store_index)
+    n, d = vectors.shape
+    if n == 0:
+        return store_index
+
+    start = time.perf_counter()
+    if index_type == "hnsw":
+        hnsw = faiss.IndexHNSWFlat(d, settings.HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        hnsw.hnsw.efConstruction = settings.HNSW_EF_CONSTRUCTION
+        # HNSW has no native ids; the map also keeps reconstruct(id) working
+        index = faiss.IndexIDMap2(hnsw)
+    else:
+        nlist = _ivf_nlist(n)
+        quantizer = faiss.IndexFlatIP(d)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, d, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            if d % settings.PQ_M:
+                raise ValueError(f"PQ_M={settings.PQ_M} must divide the embedding dimension {d}")
+            needed = MIN_POINTS_PER_CENTROID * 2 ** settings.PQ_NBITS
+            if n < needed:
+                print(f"⚠️  {n} vectors are too few to train IVF-PQ codebooks "
+                      f"(need {needed}); serving the flat index")
+                return store_index
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, settings.PQ_M, settings.PQ_NBITS,
+                                     faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        # Hashtable direct map so reconstruct(id) works on the serving index
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+    index.add_with_ids(vectors, ids)
+    configure_search(index)
+    print(f"Built {index_type} index over {n} vectors in {time.perf_counter() - start:.1f}s")
+    return index
+
+
+def configure_search(index):
+    """
+    Apply search-time parameters (HNSW_EF_SEARCH, IVF_NPROBE) to a loaded
+    index. Flat indexes are left unchanged.
+
+    Returns:
+        The same index
+    """
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = settings.HNSW_EF_SEARCH
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = settings.IVF_NPROBE
+    return index
@@ -1,85 +1,734 @@
 # embeddings/build_vectors.py
-from models.embedder import Embedder
+from models.embedder import get_embedder
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import faiss
+import hashlib
 import numpy as np
 import pickle
 import os
+import shutil
+import threading
+import time
 from config.settings import settings
+from embeddings.ann_index import build_search_index
+from embeddings.embedding_cache import EmbeddingCache
+from embeddings.metadata_store import MetadataStore, write_metadata_store
 
-# FAISS index and metadata storage
+# Served index: every publish writes a new generation directory under
+# CHROMA_DIR, then switches CURRENT_PATH (which names it) with one rename
+CURRENT_PATH = os.path.join(settings.CHROMA_DIR, "CURRENT")
+GENERATION_PREFIX = "index-"
+# File names inside a generation. Before generations existed these were
+# served straight from CHROMA_DIR, which is still read until the next publish.
 INDEX_PATH = os.path.join(settings.CHROMA_DIR, "faiss.index")
-METADATA_PATH = os.path.join(settings.CHROMA_DIR, "metadata.pkl")
+# Exact store behind an approximate serving index (only written when INDEX_TYPE != "flat")
+STORE_INDEX_PATH = os.path.join(settings.CHROMA_DIR, "faiss.flat.index")
+METADATA_PATH = os.path.join(settings.CHROMA_DIR, "metadata.bin")
+# Crawl checkpoints: the changes made since the served index, appended at
+# every checkpoint and replayed when an interrupted crawl resumes
+JOURNAL_PATH = os.path.join(settings.CHROMA_DIR, "index.journal")
+# Pickled metadata written by older versions; migrated on first load
+LEGACY_METADATA_PATH = os.path.join(settings.CHROMA_DIR, "metadata.pkl")
+
+def chunk_faiss_id(chunk_id):
+    """
+    Map a string chunk id (e.g. "https://site/page#chunk3") to a stable
+    non-negative int64 FAISS id.
+    """
+    digest = hashlib.blake2b(chunk_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") & 0x7FFFFFFFFFFFFFFF
+
+def new_metadata():
+    """
+    Empty metadata mapping. All three dicts are keyed by FAISS id:
+    ids -> chunk id, documents -> chunk text, metadatas -> {"url": ...}
+    """
+    return {"ids": {}, "documents": {}, "metadatas": {}}
+
+def normalize_legacy_metadata(metadata):
+    """
+    Convert the old list-based metadata (row position == FAISS label) to the
+    FAISS-id-keyed dict layout. Returns dict-based metadata unchanged.
+    """
+    if not isinstance(metadata.get("ids"), list):
+        return metadata
+    return {key: dict(enumerate(metadata[key])) for key in ("ids", "documents", "metadatas")}
+
+def migrate_legacy_metadata():
+    """
+    Convert metadata.pkl from older versions into the memory-mapped
+    metadata store. No-op when the store already exists.
+
+    Returns:
+        True if a legacy file was migrated
+    """
+    if os.path.exists(METADATA_PATH) or not os.path.exists(LEGACY_METADATA_PATH):
+        return False
+    print(f"Migrating {LEGACY_METADATA_PATH} to {METADATA_PATH}...")
+    with open(LEGACY_METADATA_PATH, 'rb') as f:
+        metadata = normalize_legacy_metadata(pickle.load(f))
+    write_metadata_store(metadata, METADATA_PATH)
+    os.remove(LEGACY_METADATA_PATH)
+    return True
+
+def current_generation():
+    """
+    Name of the served generation: "" for files served straight from
+    CHROMA_DIR (pre-generation layout), None if nothing was published yet.
+    """
+    try:
+        with open(CURRENT_PATH) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return "" if os.path.exists(INDEX_PATH) else None
+
+def generation_paths(name):
+    """(index, store index, metadata) paths of one generation."""
+    if not name:
+        return INDEX_PATH, STORE_INDEX_PATH, METADATA_PATH
+    directory = os.path.join(os.path.dirname(CURRENT_PATH), name)
+    return tuple(os.path.join(directory, os.path.basename(path))
+                 for path in (INDEX_PATH, STORE_INDEX_PATH, METADATA_PATH))
+
+def published_paths():
+    """(index, metadata) paths of the served generation, or None before the first publish."""
+    name = current_generation()
+    if name is None:
+        return None
+    index_path, _, metadata_path = generation_paths(name)
+    return index_path, metadata_path
+
+class _TextColumn:
+    """
+    Chunk texts by FAISS id, used as metadata["documents"] of a loaded store.
+
+    Texts of the published store stay in its memory-mapped file; only texts
+    written since are held in memory.
+    """
+
+    def __init__(self, base):
+        self._base = base
+        self._new = {}
+        self._gone = set()
+
+    def get(self, fid, default=None):
+        if fid in self._new:
+            return self._new[fid]
+        if fid in self._gone:
+            return default
+        text = self._base.text(fid)
+        return default if text is None else text
+
+    def __getitem__(self, fid):
+        text = self.get(fid)
+        if text is None:
+            raise KeyError(fid)
+        return text
+
+    def __setitem__(self, fid, text):
+        self._new[fid] = text
+
+    def pop(self, fid, default=None):
+        self._gone.add(fid)
+        return self._new.pop(fid, default)
+
+    def values(self):
+        for fid, entry in self._base.items():
+            if fid not in self._gone and fid not in self._new:
+                yield entry["text"]
+        yield from self._new.values()
+
+class VectorStore:
+    """
+    FAISS index with stable ids and page-level upsert/delete.
+
+    Vectors live in an IndexIDMap2 keyed by chunk_faiss_id(chunk id), so
+    re-indexing a chunk replaces it instead of appending a duplicate.
+    Changes since the last checkpoint are kept as a list of operations so
+    save_checkpoint only has to append those to the journal.
+    """
+
+    def __init__(self, index, metadata, base=None):
+        self.index = index
+        self.metadata = metadata
+        # Published generation the store was loaded from (None: started empty)
+        self.base = base
+        self._ops = []
+        self._url_ids = {}
+        for fid, meta in metadata["metadatas"].items():
+            self._url_ids.setdefault(meta.get("url"), set()).add(fid)
+
+    @classmethod
+    def load(cls, dimension=384, overwrite=False):
+        """Load the store from disk (migrating old indexes, replaying a checkpoint) or create an empty one."""
+        index, metadata, base, journal = load_or_create_index(dimension, overwrite=overwrite)
+        if not isinstance(index, faiss.IndexIDMap2):
+            index, metadata = _migrate_legacy_index(index, metadata)
+        store = cls(index, metadata, base)
+        for op in journal:
+            if op[0] == "del":
+                store._remove(op[1])
+            else:
+                store._add(*op[1:])
+        # Already in the journal
+        store._ops = []
+        return store
+
+    @property
+    def size(self):
+        return self.index.ntotal
+
+    def _remove(self, fids):
+        fids = [fid for fid in fids if fid in self.metadata["ids"]]
+        if not fids:
+            return 0
+        self.index.remove_ids(np.array(fids, dtype='int64'))
+        for fid in fids:
+            self.metadata["ids"].pop(fid, None)
+            self.metadata["documents"].pop(fid, None)
+            meta = self.metadata["metadatas"].pop(fid, None)
+            if meta is not None:
+                url_ids = self._url_ids.get(meta.get("url"))
+                if url_ids is not None:
+                    url_ids.discard(fid)
+                    if not url_ids:
+                        del self._url_ids[meta.get("url")]
+        self._ops.append(("del", fids))
+        return len(fids)
+
+    def _add(self, fids, vectors, ids, texts, urls):
+        self.index.add_with_ids(vectors, fids)
+        for fid, chunk_id, text, url in zip(fids.tolist(), ids, texts, urls):
+            self.metadata["ids"][fid] = chunk_id
+            self.metadata["documents"][fid] = text
+            self.metadata["metadatas"][fid] = {"url": url}
+            self._url_ids.setdefault(url, set()).add(fid)
+        self._ops.append(("add", fids, vectors, ids, texts, urls))
+
+    def upsert(self, docs, embeddings):
+        """
+        Insert or replace chunks.
+
+        Every page (url) present in `docs` is treated as re-crawled: its old
+        chunks are removed first, so a page that shrank from 5 to 3 chunks
+        keeps exactly 3.
+
+        Args:
+            docs: list of {"id": id, "text": text, "url": url}
+            embeddings: float32 array of shape (len(docs), dim)
+
+        Returns:
+            (added, removed) counts
+        """
+        # Last occurrence of a chunk id wins
+        latest = {}
+        for row, d in enumerate(docs):
+            latest[chunk_faiss_id(d["id"])] = row
+
+        urls = {d["url"] for d in docs}
+        stale = set()
+        for url in urls:
+            stale.update(self._url_ids.get(url, ()))
+        stale.update(fid for fid in latest if fid in self.metadata["ids"])
+        removed = self._remove(stale)
+
+        fids = np.fromiter(latest.keys(), dtype='int64', count=len(latest))
+        rows = np.fromiter(latest.values(), dtype='int64', count=len(latest))
+        kept = [docs[row] for row in latest.values()]
+        self._add(fids, np.ascontiguousarray(embeddings[rows]),
+                  [d["id"] for d in kept], [d["text"] for d in kept], [d["url"] for d in kept])
+
+        return len(latest), removed
+
+    def delete(self, ids=None, urls=None):
+        """
+        Delete chunks by chunk id and/or every chunk of the given page urls.
+
+        Returns:
+            Number of chunks removed
+        """
+        fids = {chunk_faiss_id(i) for i in (ids or ())}
+        for url in urls or ():
+            fids.update(self._url_ids.get(url, ()))
+        return self._remove(fids)
+
+    def prune(self, keep_urls):
+        """Delete chunks of every page not in keep_urls (after a full crawl)."""
+        keep_urls = set(keep_urls)
+        return self.delete(urls=[url for url in self._url_ids if url not in keep_urls])
+
+    def save(self):
+        """Publish the store as the served index (and drop any checkpoint)."""
+        self.base = save_index(self.index, self.metadata)
+        discard_checkpoint()
+        self._ops = []
+
+    def save_checkpoint(self):
+        """
+        Append the changes since the last checkpoint to the journal, without
+        touching the served index. Each checkpoint writes only what changed.
+        """
+        new = not os.path.exists(JOURNAL_PATH)
+        with open(JOURNAL_PATH, "ab") as f:
+            if new:
+                pickle.dump({"base": self.base, "dimension": self.index.d}, f)
+            for op in self._ops:
+                pickle.dump(op, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        print(f"Saved checkpoint: {len(self._ops)} changes appended to {JOURNAL_PATH}")
+        self._ops = []
+
+def _migrate_legacy_index(index, metadata):
+    """
+    Convert an old append-only IndexFlatIP (positional metadata) into an
+    IndexIDMap2, collapsing duplicated chunk ids to their latest copy.
+    """
+    print("Migrating legacy FAISS index to ID-mapped index...")
+    fresh = faiss.IndexIDMap2(faiss.IndexFlatIP(index.d))
+    migrated = new_metadata()
+    if index.ntotal:
+        metadata = normalize_legacy_metadata(metadata)
+        vectors = index.reconstruct_n(0, index.ntotal)
+        latest = {}
+        for pos, chunk_id in metadata["ids"].items():
+            latest[chunk_faiss_id(chunk_id)] = pos
+        fids = np.fromiter(latest.keys(), dtype='int64', count=len(latest))
+        rows = np.fromiter(latest.values(), dtype='int64', count=len(latest))
+        fresh.add_with_ids(np.ascontiguousarray(vectors[rows]), fids)
+        for fid, pos in latest.items():
+            migrated["ids"][fid] = metadata["ids"][pos]
+            migrated["documents"][fid] = metadata["documents"][pos]
+            migrated["metadatas"][fid] = metadata["metadatas"][pos]
+        print(f"Migrated {index.ntotal} vectors -> {fresh.ntotal} unique chunks")
+    return fresh, migrated
+
+def _load_metadata(path):
+    """Metadata over the store at `path`: ids and urls in memory, texts left in the mapped file."""
+    store = MetadataStore.open(path)
+    metadata = {"ids": {}, "documents": _TextColumn(store), "metadatas": {}}
+    for fid, chunk_id, url in store.refs():
+        metadata["ids"][fid] = chunk_id
+        metadata["metadatas"][fid] = {"url": url}
+    return metadata
+
+def _read_journal():
+    """
+    Read the checkpoint journal.
+
+    A record torn by a crash mid-checkpoint is cut off, so the next
+    checkpoint appends after the last complete one.
+
+    Returns:
+        (header, ops), or (None, []) without a journal
+    """
+    if not os.path.exists(JOURNAL_PATH):
+        return None, []
+    records, good = [], 0
+    with open(JOURNAL_PATH, "rb") as f:
+        while True:
+            try:
+                records.append(pickle.load(f))
+            except Exception:
+                break  # End of the journal, or a record torn by a crash
+            good = f.tell()
+        size = f.seek(0, os.SEEK_END)
+    if good < size:
+        print(f"Dropping {size - good} bytes of an incomplete checkpoint from {JOURNAL_PATH}")
+        with open(JOURNAL_PATH, "r+b") as f:
+            f.truncate(good)
+    if not records:
+        discard_checkpoint()
+        return None, []
+    return records[0], records[1:]
+
+def _empty_index(dimension):
+    print(f"Creating new FAISS index (dimension={dimension})")
+    # Inner product = cosine similarity with normalized vectors; ID map gives stable chunk ids
+    return faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
 
 def load_or_create_index(dimension=384, overwrite=False):
-    """Load existing FAISS index or create new one."""
+    """
+    Load the index to build on, or create a new one.
+
+    The checkpoint journal of an interrupted crawl is returned for replay on
+    top of the index it started from. With overwrite the new index starts
+    empty; the served files stay in place until it is published.
+
+    Returns:
+        (index, metadata, base, journal): base names the published generation
+        the index was loaded from (None when starting empty), journal is the
+        list of checkpointed changes to replay
+    """
     os.makedirs(settings.CHROMA_DIR, exist_ok=True)
-    
+
     if overwrite:
-        print("Overwrite mode enabled: Deleting existing index...")
-        if os.path.exists(INDEX_PATH):
-            os.remove(INDEX_PATH)
-        if os.path.exists(METADATA_PATH):
-            os.remove(METADATA_PATH)
-    
-    if os.path.exists(INDEX_PATH) and os.path.exists(METADATA_PATH) and not overwrite:
-        print(f"Loading existing index from {INDEX_PATH}")
-        index = faiss.read_index(INDEX_PATH)
-        with open(METADATA_PATH, 'rb') as f:
-            metadata = pickle.load(f)
-        return index, metadata
-    else:
-        print(f"Creating new FAISS index (dimension={dimension})")
-        index = faiss.IndexFlatIP(dimension)  # Inner product = cosine similarity with normalized vectors
-        metadata = {"ids": [], "documents": [], "metadatas": []}
-        return index, metadata
+        print("Overwrite mode enabled: Starting from an empty index...")
+        discard_checkpoint()
+        return _empty_index(dimension), new_metadata(), None, []
+
+    migrate_legacy_metadata()
+    base = current_generation()
+    header, journal = _read_journal()
+    if header is not None:
+        if header["base"] is None:
+            print(f"Resuming from checkpoint {JOURNAL_PATH} ({len(journal)} changes)")
+            return _empty_index(header["dimension"]), new_metadata(), None, journal
+        if header["base"] != base:
+            print(f"⚠️  Discarding checkpoint {JOURNAL_PATH}: the index it was based on has been replaced")
+            discard_checkpoint()
+            journal = []
+        else:
+            print(f"Resuming from checkpoint {JOURNAL_PATH} ({len(journal)} changes)")
+
+    if base is not None:
+        index_path, _, metadata_path = generation_paths(base)
+        if os.path.exists(metadata_path):
+            print(f"Loading existing index from {index_path}")
+            return read_store_index(base), _load_metadata(metadata_path), base, journal
+
+    return _empty_index(dimension), new_metadata(), None, []
+
+def _is_store_index(index):
+    """True for indexes that can back a VectorStore (exact, or legacy flat)."""
+    if isinstance(index, faiss.IndexIDMap2):
+        return isinstance(faiss.downcast_index(index.index), faiss.IndexFlat)
+    return isinstance(index, faiss.IndexFlat)
+
+def _checkpoint_exists():
+    return os.path.exists(JOURNAL_PATH)
+
+def discard_checkpoint():
+    """Remove the crawl checkpoint journal, if any."""
+    if os.path.exists(JOURNAL_PATH):
+        os.remove(JOURNAL_PATH)
+
+def index_exists():
+    """True once an index has been saved (including crawl checkpoints)."""
+    return current_generation() is not None or _checkpoint_exists()
+
+def read_store_index(generation=None):
+    """
+    Read the exact index that upserts operate on: the store file behind an
+    approximate serving index, else the serving index itself (flat builds).
+
+    Args:
+        generation: Generation to read (default: the served one)
+    """
+    name = current_generation() if generation is None else generation
+    if name is None:
+        raise FileNotFoundError(f"No index has been published in {settings.CHROMA_DIR}")
+    index_path, store_path, _ = generation_paths(name)
+    # A generation only has a store file when its serving index is approximate
+    if os.path.exists(store_path):
+        return faiss.read_index(store_path)
+    index = faiss.read_index(index_path)
+    if not _is_store_index(index):
+        raise FileNotFoundError(
+            f"{store_path} is missing behind the approximate index at {index_path}; "
+            "rebuild the index with overwrite=True"
+        )
+    return index
 
 def save_index(index, metadata):
-    """Save FAISS index and metadata to disk."""
-    faiss.write_index(index, INDEX_PATH)
-    with open(METADATA_PATH, 'wb') as f:
-        pickle.dump(metadata, f)
-    print(f"Saved index to {INDEX_PATH}")
+    """
+    Publish FAISS index and metadata as a new generation.
+
+    Every file is written to a fresh generation directory, then CURRENT_PATH
+    is switched to it with a single rename: a reader resolves one generation
+    and only ever sees a complete index together with the metadata written
+    with it. With INDEX_TYPE other than "flat", `index` (the exact store) is
+    saved beside the approximate serving index built from it. The previous
+    generation is kept for readers that resolved CURRENT_PATH just before
+    the switch; older ones are removed.
+
+    Returns:
+        Name of the new generation
+    """
+    previous = current_generation()
+    name = f"{GENERATION_PREFIX}{time.time_ns()}"
+    index_path, store_path, metadata_path = generation_paths(name)
+    os.makedirs(os.path.dirname(index_path))
+
+    serving = build_search_index(index) if settings.INDEX_TYPE != "flat" else index
+    if serving is not index:
+        faiss.write_index(index, store_path)
+    write_metadata_store(metadata, metadata_path)
+    faiss.write_index(serving, index_path)
+
+    tmp_path = CURRENT_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(name)
+    os.replace(tmp_path, CURRENT_PATH)
+
+    _remove_old_generations(keep={name, previous})
+    print(f"Saved index to {index_path}")
+    return name
+
+def _remove_old_generations(keep):
+    root = os.path.dirname(CURRENT_PATH)
+    for entry in os.listdir(root):
+        if entry.startswith(GENERATION_PREFIX) and entry not in keep:
+            shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+    if "" not in keep:
+        # Files of the pre-generation layout
+        for path in (INDEX_PATH, STORE_INDEX_PATH, METADATA_PATH, LEGACY_METADATA_PATH):
+            if os.path.exists(path):
+                os.remove(path)
+
+def embed_documents(docs, cache=None):
+    """
+    Embed chunk texts, reusing cached vectors for text seen before.
+
+    Only cache misses are sent through the model (which is not even loaded
+    when everything is cached).
 
-def upsert_documents(docs, overwrite=False):
+    Args:
+        docs: list of {"id": id, "text": text, "url": url}
+        cache: Optional EmbeddingCache
+
+    Returns:
+        float32 array of shape (len(docs), dim)
+    """
+    texts = [d["text"] for d in docs]
+    if cache is None:
+        print(f"Generating embeddings for {len(docs)} documents...")
+        return np.array(get_embedder().embed_texts(texts), dtype='float32')
+
+    keys = [cache.key(t) for t in texts]
+    vectors = cache.get_many(keys)
+
+    # Encode each distinct missing text once
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in vectors:
+            missing.setdefault(key, text)
+    print(f"Embedding cache: {len(docs) - len(missing)}/{len(docs)} chunks cached, "
+          f"generating {len(missing)} new embeddings...")
+
+    if missing:
+        fresh = get_embedder().embed_texts(list(missing.values()))
+        new_vectors = {key: np.asarray(vec, dtype='float32') for key, vec in zip(missing, fresh)}
+        cache.put_many(new_vectors)
+        vectors.update(new_vectors)
+
+    return np.vstack([vectors[k] for k in keys]).astype('float32')
+
+class IndexWriter:
+    """
+    Streams page chunks into the vector store in fixed-size batches.
+
+    Pages are buffered until `batch_size` chunks are pending, then embedded
+    and upserted together, so pending chunk text and embedding work stay
+    bounded. The vectors and chunk ids are held in memory; chunk texts of the
+    index the crawl started from stay in its memory-mapped metadata file.
+    Every `checkpoint_every` batches the changes since the previous
+    checkpoint are appended to the checkpoint journal and `on_checkpoint` is
+    called (e.g. to persist crawl progress), so an interrupted crawl can
+    resume from the last checkpoint. Only close() publishes the result to the
+    served index, so a running server never sees a half-built knowledge base.
+
+    Thread-safe: render workers may call add_page concurrently. Async
+    crawlers use aadd_page / adelete_pages, which run on the writer's own
+    thread so embedding never stalls the event loop; on_checkpoint is then
+    still called on the loop, where the crawler keeps its state.
+
+    Args:
+        batch_size: Chunks per embedding/upsert batch (default PIPELINE_BATCH_SIZE)
+        checkpoint_every: Batches between index saves (default PIPELINE_CHECKPOINT_BATCHES)
+        overwrite: Start from an empty index
+        on_checkpoint: Optional callable run after each checkpoint and after publishing
+    """
+
+    def __init__(self, batch_size=None, checkpoint_every=None, overwrite=False, on_checkpoint=None):
+        self.batch_size = batch_size or settings.PIPELINE_BATCH_SIZE
+        self.checkpoint_every = checkpoint_every or settings.PIPELINE_CHECKPOINT_BATCHES
+        self.on_checkpoint = on_checkpoint
+        self.pages = set()
+        self.chunks = 0
+        self.added = 0
+        self.removed = 0
+        self.batches = 0
+        self._overwrite = overwrite
+        self._pending = []
+        self._pending_deletes = set()
+        self._since_checkpoint = 0
+        self._store = None
+        self._cache = EmbeddingCache() if settings.EMBED_CACHE_ENABLED else None
+        self._lock = threading.RLock()
+        self._executor = None
+        self._loop = None
+        self._thread_id = None
+
+    def _get_store(self, dimension=384):
+        if self._store is None:
+            self._store = VectorStore.load(dimension, overwrite=self._overwrite)
+        return self._store
+
+    def add_page(self, url, docs):
+        """
+        Queue the complete chunk list of one page. A page with no chunks
+        has its previously indexed chunks removed.
+        """
+        with self._lock:
+            self.pages.add(url)
+            if not docs:
+                self._pending_deletes.add(url)
+                return
+            self._pending_deletes.discard(url)
+            self._pending.extend(docs)
+            self.chunks += len(docs)
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+
+    def add_documents(self, docs):
+        """Queue a flat list of chunk dicts, grouped into pages by url."""
+        by_url = {}
+        for d in docs:
+            by_url.setdefault(d["url"], []).append(d)
+        for url, page_docs in by_url.items():
+            self.add_page(url, page_docs)
+
+    def delete_pages(self, urls):
+        """Remove every chunk of pages that no longer exist."""
+        with self._lock:
+            self._pending_deletes.update(urls)
+
+    async def aadd_page(self, url, docs):
+        """add_page on the writer thread (may embed a batch and checkpoint)."""
+        await self._run_on_writer(self.add_page, url, docs)
+
+    async def adelete_pages(self, urls):
+        """delete_pages on the writer thread."""
+        await self._run_on_writer(self.delete_pages, urls)
+
+    async def _run_on_writer(self, fn, *args):
+        self._loop = asyncio.get_running_loop()
+        if self._executor is None:
+            # One thread: batches are embedded and saved in submission order
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="index-writer", initializer=self._mark_thread)
+        await self._loop.run_in_executor(self._executor, fn, *args)
+
+    def _mark_thread(self):
+        self._thread_id = threading.get_ident()
+
+    def _run_hook(self):
+        loop = self._loop
+        if threading.get_ident() == self._thread_id and loop is not None and loop.is_running():
+            # The crawler's state belongs to the event loop: save it there
+            async def hook():
+                self.on_checkpoint()
+            asyncio.run_coroutine_threadsafe(hook(), loop).result()
+        else:
+            self.on_checkpoint()
+
+    def flush(self):
+        """Embed and upsert everything pending, checkpointing when due."""
+        with self._lock:
+            if self._write_batch():
+                self._since_checkpoint += 1
+                if self._since_checkpoint >= self.checkpoint_every:
+                    self.checkpoint()
+
+    def _write_batch(self):
+        if not self._pending and not self._pending_deletes:
+            return False
+        added = removed = 0
+        if self._pending:
+            embeddings_array = embed_documents(self._pending, self._cache)
+            store = self._get_store(embeddings_array.shape[1])
+            added, removed = store.upsert(self._pending, embeddings_array)
+        else:
+            store = self._get_store()
+        if self._pending_deletes:
+            removed += store.delete(urls=self._pending_deletes)
+        self._pending = []
+        self._pending_deletes = set()
+
+        self.added += added
+        self.removed += removed
+        self.batches += 1
+        print(f"Batch {self.batches}: upserted {added} chunks, removed {removed} "
+              f"(index now {store.size})")
+        return True
+
+    def checkpoint(self, publish=False):
+        """
+        Flush, save the store and run the on_checkpoint hook.
+
+        Args:
+            publish: Replace the served index instead of writing a checkpoint
+        """
+        with self._lock:
+            self._write_batch()
+            if self._store is not None:
+                if publish:
+                    self._store.save()
+                else:
+                    self._store.save_checkpoint()
+            self._since_checkpoint = 0
+            if self.on_checkpoint is not None:
+                self._run_hook()
+
+    def close(self, prune=False, keep_urls=None):
+        """
+        Final flush and save.
+
+        Args:
+            prune: Remove every page not written during this run
+                (only safe after a complete crawl)
+            keep_urls: Pages to keep when pruning, if not just this run's
+                (e.g. including pages written before a resumed interruption)
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        with self._lock:
+            self._write_batch()
+            keep = keep_urls if keep_urls is not None else self.pages
+            if prune and keep:
+                self.removed += self._get_store().prune(keep)
+            if self._store is None and _checkpoint_exists():
+                # Resumed crawl with nothing left to write: still publish the journal
+                self._get_store()
+            self.checkpoint(publish=True)
+
+            print(f"Upserted {self.added} chunks, removed {self.removed} stale chunks")
+            if self._store is not None:
+                print(f"Total documents in index: {self._store.size}")
+
+            if self._cache is not None:
+                if self._store is not None:
+                    # Drop cached vectors for text no longer present anywhere in the index
+                    evicted = self._cache.evict_unreferenced(
+                        self._cache.key(t) for t in self._store.metadata["documents"].values()
+                    )
+                else:
+                    evicted = 0
+                stats = self._cache.stats()
+                print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses, "
+                      f"{evicted} evicted, {stats['entries']} entries")
+                self._cache.close()
+
+def upsert_documents(docs, overwrite=False, delete_urls=None, prune=False):
     """
     Upsert documents into FAISS index with embeddings.
-    
+
     Args:
         docs: list of {"id": id, "text": text, "url": url}
         overwrite: If True, delete existing index and create new one
+        delete_urls: Pages that no longer exist; their chunks are removed
+        prune: If True, also remove every page not present in docs
+            (only safe after a complete crawl)
     """
-    if not docs:
+    if not docs and not delete_urls:
         print("No documents to upsert")
         return
-    
-    print(f"Generating embeddings for {len(docs)} documents...")
-    embedder = Embedder()
-    
-    texts = [d["text"] for d in docs]
-    ids = [d["id"] for d in docs]
-    metadatas = [{"url": d["url"]} for d in docs]
-    
-    embeddings = embedder.embed_texts(texts)
-    embeddings_array = np.array(embeddings, dtype='float32')
-    
-    # Get dimension from first embedding
-    dimension = embeddings_array.shape[1]
-    
-    # Load or create index
-    index, metadata = load_or_create_index(dimension, overwrite=overwrite)
-    
-    # For simplicity, rebuild index from scratch (FAISS doesn't support easy updates)
-    # In production, implement proper ID-based updates
-    print("Adding to FAISS index...")
-    index.add(embeddings_array)
-    
-    # Store metadata
-    metadata["ids"].extend(ids)
-    metadata["documents"].extend(texts)
-    metadata["metadatas"].extend(metadatas)
-    
-    # Save to disk
-    save_index(index, metadata)
-    
-    print(f"Successfully stored {len(docs)} documents in FAISS index")
-    print(f"Total documents in index: {index.ntotal}")
+
+    writer = IndexWriter(overwrite=overwrite)
+    writer.add_documents(docs)
+    if delete_urls:
+        writer.delete_pages(delete_urls)
+    writer.close(prune=prune)
@@ -0,0 +1,130 @@
+# embeddings/embedding_cache.py
+"""
+Persistent embedding cache so unchanged chunks are never re-encoded.
+
+Entries are keyed by sha256(model name + normalized chunk text) and stored as
+raw float32 blobs in a SQLite file next to the FAISS index.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+from config.settings import settings
+
+CACHE_PATH = os.path.join(settings.CHROMA_DIR, "embedding_cache.sqlite")
+
+# SQLite's default limit on host parameters per statement is 999
+_BATCH = 500
+
+
+def normalize_text(text):
+    """Collapse whitespace so cosmetic changes don't invalidate the cache."""
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """
+    On-disk map from (model, chunk text) to its embedding vector.
+
+    Thread-safe: the IndexWriter that owns it embeds on worker threads.
+
+    Args:
+        path: SQLite file path
+        model_name: Embedding model name, part of every key
+    """
+
+    def __init__(self, path=CACHE_PATH, model_name=None):
+        self.path = path
+        self.model_name = model_name or settings.EMBED_MODEL
+        if model_name is None and settings.EMBED_BACKEND == "onnx-int8":
+            # Quantized vectors differ slightly from fp32 ones; keep them apart
+            self.model_name += ":int8"
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # One connection shared by the writer's threads, serialized by the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+
+    def key(self, text):
+        """Cache key for a chunk of text under this cache's model."""
+        h = hashlib.sha256(self.model_name.encode("utf-8"))
+        h.update(b"\0")
+        h.update(normalize_text(text).encode("utf-8"))
+        return h.digest()
+
+    def get_many(self, keys):
+        """
+        Look up vectors for the given keys.
+
+        Returns:
+            Dict of key -> float32 vector for the keys that were cached
+        """
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(unique), _BATCH):
+                batch = unique[start:start + _BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype='float32')
+            hits = sum(1 for k in keys if k in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, items):
+        """Store key -> vector pairs."""
+        rows = [(key, np.asarray(vec, dtype='float32').tobytes()) for key, vec in items.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows
+            )
+            self._conn.commit()
+
+    def evict_unreferenced(self, keep_keys):
+        """
+        Delete every entry whose key is not in keep_keys.
+
+        Returns:
+            Number of entries evicted
+        """
+        with self._lock:
+            self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep (key BLOB PRIMARY KEY)")
+            self._conn.execute("DELETE FROM keep")
+            self._conn.executemany("INSERT OR IGNORE INTO keep (key) VALUES (?)", ((k,) for k in keep_keys))
+            cur = self._conn.execute("DELETE FROM embeddings WHERE key NOT IN (SELECT key FROM keep)")
+            self._conn.execute("DELETE FROM keep")
+            self._conn.commit()
+            return cur.rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def stats(self):
+        """Hit/miss counters for this session plus the number of stored entries."""
+        entries = len(self)
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": entries,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
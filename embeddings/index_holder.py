@@ -0,0 +1,162 @@
+# embeddings/index_holder.py
+"""
+Process-wide holder for the FAISS index and its metadata.
+
+The index is loaded once and served from memory. When a new generation is
+published (e.g. after a crawl rebuilt the index) a fresh index/metadata pair
+is loaded from that generation's directory in the background of the calling
+thread and swapped in with a single reference assignment, so in-flight
+searches keep using the snapshot they already hold.
+"""
+
+import os
+import threading
+import time
+
+import faiss
+
+from config.settings import settings
+from embeddings.ann_index import configure_search
+from embeddings.build_vectors import migrate_legacy_metadata, published_paths
+from embeddings.metadata_store import MetadataStore
+
+
+class IndexSnapshot:
+    """Immutable pairing of a loaded index, its MetadataStore and a version number."""
+
+    __slots__ = ("index", "metadata", "version", "signature")
+
+    def __init__(self, index, metadata, version, signature):
+        self.index = index
+        self.metadata = metadata
+        self.version = version
+        self.signature = signature
+
+
+class IndexHolder:
+    """
+    Keeps the current IndexSnapshot resident and hot-swaps it on change.
+
+    Args:
+        index_path: Fixed FAISS index file to serve (default: follow the
+            published generation)
+        metadata_path: Fixed memory-mapped metadata store to serve with it
+        check_interval: Minimum seconds between mtime checks on disk
+    """
+
+    def __init__(self, index_path=None, metadata_path=None,
+                 check_interval=None):
+        self.index_path = index_path
+        self.metadata_path = metadata_path
+        self.check_interval = (settings.INDEX_RELOAD_INTERVAL
+                               if check_interval is None else check_interval)
+        self._snapshot = None
+        self._version = 0
+        self._last_check = 0.0
+        self._reload_lock = threading.Lock()
+
+    def _paths(self):
+        if self.index_path is not None:
+            return self.index_path, self.metadata_path
+        return published_paths()
+
+    def _signature(self):
+        """
+        Return the (index, metadata) paths plus (mtime_ns, size) for both
+        files, or None if either is missing.
+        """
+        paths = self._paths()
+        if paths is None:
+            return None
+        try:
+            idx_stat = os.stat(paths[0])
+            meta_stat = os.stat(paths[1])
+        except FileNotFoundError:
+            return None
+        return (paths, idx_stat.st_mtime_ns, idx_stat.st_size,
+                meta_stat.st_mtime_ns, meta_stat.st_size)
+
+    def _load(self, signature):
+        # Both files come from the same generation, which is never modified
+        # once published, so they always belong together
+        index_path, metadata_path = signature[0]
+        index = configure_search(faiss.read_index(index_path))
+        # Mapped, not read: constant-time regardless of corpus size. The old
+        # snapshot's mapping stays valid (same inode) until it is collected.
+        metadata = MetadataStore.open(metadata_path)
+        self._version += 1
+        return IndexSnapshot(index, metadata, self._version, signature)
+
+    def reload(self, force=True):
+        """
+        Load the files from disk and swap them in.
+
+        Args:
+            force: Reload even if the on-disk signature is unchanged
+
+        Returns:
+            The current IndexSnapshot
+        """
+        with self._reload_lock:
+            self._last_check = time.monotonic()
+            signature = self._signature()
+            if signature is None and self.index_path is None and migrate_legacy_metadata():
+                signature = self._signature()
+            if signature is None:
+                if self._snapshot is None:
+                    raise FileNotFoundError(
+                        f"Index not found in {self.index_path or settings.CHROMA_DIR}. "
+                        "Please run the scraper first: python -c \"from scraper.scrape import crawl_and_build; crawl_and_build()\""
+                    )
+                # Files vanished mid-rebuild: keep serving the old snapshot
+                return self._snapshot
+
+            current = self._snapshot
+            if current is not None and not force and current.signature == signature:
+                return current
+
+            snapshot = self._load(signature)
+            self._snapshot = snapshot  # atomic swap; readers keep their old reference
+            print(f"Loaded FAISS index v{snapshot.version} ({snapshot.index.ntotal} vectors)")
+            return snapshot
+
+    def get(self):
+        """
+        Return the current snapshot, reloading first if the files changed.
+
+        The mtime check runs at most once per check_interval. While another
+        thread is reloading, callers get the previous snapshot immediately.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self.reload(force=False)
+
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return snapshot
+
+        if not self._reload_lock.acquire(blocking=False):
+            return snapshot
+        try:
+            self._last_check = now
+            signature = self._signature()
+            changed = signature is not None and signature != snapshot.signature
+        finally:
+            self._reload_lock.release()
+
+        if changed:
+            try:
+                return self.reload(force=False)
+            except Exception as e:
+                print(f"Index reload failed, keeping v{snapshot.version}: {e}")
+        return snapshot
+
+    @property
+    def version(self):
+        """Version of the snapshot currently being served (0 if none loaded)."""
+        snapshot = self._snapshot
+        return snapshot.version if snapshot is not None else 0
+
+
+# Shared instance used by the responder
+index_holder = IndexHolder()
@@ -0,0 +1,192 @@
+# embeddings/metadata_store.py
+"""
+Columnar, memory-mapped chunk metadata.
+
+Replaces the pickled {"ids", "documents", "metadatas"} dicts. One file holds:
+
+    header      magic, format version, chunk count, url count
+    fids        int64[n]     FAISS ids, sorted (binary-searched at query time)
+    text_offs   uint64[n+1]  offsets into the text blob
+    id_offs     uint64[n+1]  offsets into the chunk-id blob
+    url_index   uint32[n]    index into the url dictionary
+    url_offs    uint64[u+1]  offsets into the url blob
+    blobs       concatenated UTF-8 chunk texts, chunk ids, urls
+
+Opening the file maps it and wraps the arrays as zero-copy numpy views, so
+load time does not depend on corpus size and the pages are shared by every
+process serving the same file. Text is decoded only for the handful of ids
+returned by a search.
+"""
+
+import mmap
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"WAMETA\x00\x01"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8sIQQ")
+_HEADER_SIZE = 32  # struct size padded to 8-byte alignment
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _layout(n, n_urls):
+    """Byte offsets of each fixed-width section, plus the start of the blobs."""
+    fids = _HEADER_SIZE
+    text_offs = fids + 8 * n
+    id_offs = text_offs + 8 * (n + 1)
+    url_index = id_offs + 8 * (n + 1)
+    url_offs = _align(url_index + 4 * n)
+    blobs = url_offs + 8 * (n_urls + 1)
+    return fids, text_offs, id_offs, url_index, url_offs, blobs
+
+
+def _encode_column(values):
+    """UTF-8 encode strings into (offsets, blob)."""
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    if encoded:
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, b"".join(encoded)
+
+
+def write_metadata_store(metadata, path):
+    """
+    Write FAISS-id-keyed metadata (see build_vectors.new_metadata) to `path`.
+
+    The file is written to a temporary path and renamed into place, so
+    readers never map a half-written file.
+    """
+    fids = sorted(metadata["ids"])
+    urls = {}
+    url_index = np.empty(len(fids), dtype="<u4")
+    for row, fid in enumerate(fids):
+        url = metadata["metadatas"].get(fid, {}).get("url") or ""
+        url_index[row] = urls.setdefault(url, len(urls))
+
+    text_offs, text_blob = _encode_column(metadata["documents"].get(fid, "") for fid in fids)
+    id_offs, id_blob = _encode_column(metadata["ids"][fid] for fid in fids)
+    url_offs, url_blob = _encode_column(urls)
+
+    n, n_urls = len(fids), len(urls)
+    layout = _layout(n, n_urls)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, n, n_urls).ljust(_HEADER_SIZE, b"\x00"))
+        f.write(np.asarray(fids, dtype="<i8").tobytes())
+        f.write(text_offs.tobytes())
+        f.write(id_offs.tobytes())
+        f.write(url_index.tobytes())
+        f.write(b"\x00" * (layout[4] - f.tell()))
+        f.write(url_offs.tobytes())
+        f.write(text_blob)
+        f.write(id_blob)
+        f.write(url_blob)
+    os.replace(tmp_path, path)
+
+
+class MetadataStore:
+    """
+    Read-only view over a metadata file written by write_metadata_store.
+
+    Use MetadataStore.open(path). Lookups are by FAISS id:
+
+        meta = store.get(fid)   # {"id": ..., "text": ..., "url": ...} or None
+    """
+
+    def __init__(self, path, buffer):
+        self.path = path
+        self._buffer = buffer
+        magic, version, n, n_urls = _HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a metadata store (format {version})")
+        fids, text_offs, id_offs, url_index, url_offs, blobs = _layout(n, n_urls)
+        self._fids = np.frombuffer(buffer, dtype="<i8", count=n, offset=fids)
+        self._text_offs = np.frombuffer(buffer, dtype="<u8", count=n + 1, offset=text_offs)
+        self._id_offs = np.frombuffer(buffer, dtype="<u8", count=n + 1, offset=id_offs)
+        self._url_index = np.frombuffer(buffer, dtype="<u4", count=n, offset=url_index)
+        self._url_offs = np.frombuffer(buffer, dtype="<u8", count=n_urls + 1, offset=url_offs)
+        self._text_base = blobs
+        self._id_base = blobs + int(self._text_offs[-1])
+        self._url_base = self._id_base + int(self._id_offs[-1])
+        self._urls = {}
+
+    @classmethod
+    def open(cls, path):
+        """Memory-map the file at `path`."""
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(path, buffer)
+
+    def __len__(self):
+        return len(self._fids)
+
+    def _row(self, fid):
+        row = int(np.searchsorted(self._fids, fid))
+        if row < len(self._fids) and self._fids[row] == fid:
+            return row
+        return None
+
+    def __contains__(self, fid):
+        return self._row(fid) is not None
+
+    def _string(self, base, offsets, row):
+        start = base + int(offsets[row])
+        end = base + int(offsets[row + 1])
+        return self._buffer[start:end].decode("utf-8")
+
+    def _url(self, url_row):
+        url = self._urls.get(url_row)
+        if url is None:
+            url = self._string(self._url_base, self._url_offs, url_row)
+            self._urls[url_row] = url
+        return url
+
+    def _entry(self, row):
+        return {
+            "id": self._string(self._id_base, self._id_offs, row),
+            "text": self._string(self._text_base, self._text_offs, row),
+            "url": self._url(int(self._url_index[row])),
+        }
+
+    def get(self, fid):
+        """
+        Return {"id", "text", "url"} for one FAISS id, or None if unknown
+        (including the -1 FAISS pads short result lists with).
+        """
+        row = self._row(fid)
+        return self._entry(row) if row is not None else None
+
+    def text(self, fid):
+        """Chunk text for one FAISS id, or None."""
+        row = self._row(fid)
+        return self._string(self._text_base, self._text_offs, row) if row is not None else None
+
+    def items(self):
+        """Iterate (fid, entry) over every chunk in id order."""
+        for row in range(len(self._fids)):
+            yield int(self._fids[row]), self._entry(row)
+
+    def refs(self):
+        """Iterate (fid, chunk id, url) over every chunk without decoding texts."""
+        for row in range(len(self._fids)):
+            yield (int(self._fids[row]), self._string(self._id_base, self._id_offs, row),
+                   self._url(int(self._url_index[row])))
+
+    def to_dict(self):
+        """Materialize as FAISS-id-keyed metadata dicts (for rebuilding the index)."""
+        metadata = {"ids": {}, "documents": {}, "metadatas": {}}
+        for fid, entry in self.items():
+            metadata["ids"][fid] = entry["id"]
+            metadata["documents"][fid] = entry["text"]
+            metadata["metadatas"][fid] = {"url": entry["url"]}
+        return metadata
+
+    def close(self):
+        """Release the mapping. Only safe once no caller holds a lookup in flight."""
+        self._fids = self._text_offs = self._id_offs = self._url_index = self._url_offs = None
+        self._buffer.close()
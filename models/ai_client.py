@@ -1,17 +1,59 @@
-import requests
+"""
+Groq chat completions with retries, hedging, a circuit breaker and model fallback.
+
+Each call tries LLM_MODEL, then LLM_FALLBACK_MODELS in order:
+
+- 408, 409, 425, 429, 500, 502, 503 and 504 responses (RETRYABLE_STATUS)
+  and transport errors (timeouts, resets) are retried up to LLM_MAX_RETRIES
+  times per model with capped exponential backoff and full jitter. A
+  Retry-After header sets the delay instead; if it is longer than
+  LLM_RETRY_MAX_DELAY the next model is tried at once.
+- 404 (unknown or decommissioned model) moves on to the next model.
+- Other 4xx errors (bad key, oversized prompt) are raised immediately:
+  another attempt would fail the same way.
+- Each model has a circuit breaker: after LLM_BREAKER_FAILURES consecutive
+  failures it is skipped for LLM_BREAKER_RESET seconds, so an outage fails
+  fast instead of every message waiting out its retries.
+- With LLM_HEDGE_ENABLED (async only), a request still running after the
+  p95 of recent latencies (LLM_HEDGE_INITIAL_DELAY until there are enough
+  samples) gets an identical second request; the first good response wins
+  and the other is cancelled.
+- Given a Deadline, no request outlives its remaining budget and a retry
+  whose backoff would overrun it moves on instead of sleeping.
+"""
+
+import asyncio
+import random
+import threading
+import time
+
+import httpx
+
 from config.settings import settings
+from models.http_client import get_async_client, get_sync_client
+from models.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceeded,
+    LatencyTracker,
+    backoff_delay,
+    parse_retry_after,
+)
 
 GROQ_API = "https://api.groq.com/openai/v1/chat/completions"
 
+# Transient: worth another attempt
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
 
-def call_groq(system_prompt, user_prompt, temperature=0.2, max_tokens=512):
+
+def _groq_request(model, system_prompt, user_prompt, temperature, max_tokens):
     headers = {
         "Authorization": f"Bearer {settings.GROQ_API_KEY}",
         "Content-Type": "application/json"
     }
 
     data = {
-        "model": settings.LLM_MODEL,   # MUST be a valid Groq model
+        "model": model,   # MUST be a valid Groq model
         "messages": [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt},
@@ -20,20 +62,318 @@ def call_groq(system_prompt, user_prompt, temperature=0.2, max_tokens=512):
         "top_p": 1,
         "max_completion_tokens": max_tokens
     }
+    return headers, data
 
-    resp = requests.post(GROQ_API, headers=headers, json=data, timeout=30)
 
+def _log_error(resp):
     # DEBUG LOGGING – PRINT THE FULL ERROR BODY
-    if resp.status_code != 200:
-        print("\n==================== GROQ ERROR ====================")
-        print("Status:", resp.status_code)
-        print("Response:\n", resp.text)
-        print("====================================================\n")
+    print("\n==================== GROQ ERROR ====================")
+    print("Status:", resp.status_code)
+    print("Response:\n", resp.text)
+    print("====================================================\n")
 
-    resp.raise_for_status()  # This will now show full details
 
+def _groq_content(resp):
     j = resp.json()
     return j["choices"][0]["message"]["content"].strip()
 
 
+class LLMClient:
+    """
+    Resilient chat-completions client. Unset arguments come from Settings.
+
+    Args:
+        url: Chat completions endpoint
+        models: Models to try in order (default LLM_MODEL + LLM_FALLBACK_MODELS)
+        timeout: Per-request timeout in seconds
+        max_retries: Retries per model after the first attempt
+        retry_base_delay: Backoff before the first retry (doubles each retry)
+        retry_max_delay: Cap on a single backoff or Retry-After wait
+        hedge: Send a hedged second request for slow calls (async only)
+        hedge_initial_delay: Hedge delay until enough latencies are recorded
+        breaker_failures: Consecutive failures that open a model's circuit
+        breaker_reset: Seconds a circuit stays open before a trial call
+        rng: random.Random for the jitter (tests)
+    """
+
+    def __init__(self, url=GROQ_API, models=None, timeout=None, max_retries=None,
+                 retry_base_delay=None, retry_max_delay=None, hedge=None,
+                 hedge_initial_delay=None, breaker_failures=None, breaker_reset=None, rng=None):
+        self.url = url
+        self.models = list(models or [settings.LLM_MODEL, *settings.LLM_FALLBACK_MODELS])
+        self.timeout = settings.LLM_TIMEOUT if timeout is None else timeout
+        self.max_retries = settings.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.retry_base_delay = settings.LLM_RETRY_BASE_DELAY if retry_base_delay is None else retry_base_delay
+        self.retry_max_delay = settings.LLM_RETRY_MAX_DELAY if retry_max_delay is None else retry_max_delay
+        self.hedge = settings.LLM_HEDGE_ENABLED if hedge is None else hedge
+        self.hedge_initial_delay = (settings.LLM_HEDGE_INITIAL_DELAY
+                                    if hedge_initial_delay is None else hedge_initial_delay)
+        breaker_failures = settings.LLM_BREAKER_FAILURES if breaker_failures is None else breaker_failures
+        breaker_reset = settings.LLM_BREAKER_RESET if breaker_reset is None else breaker_reset
+        self.breakers = {model: CircuitBreaker(breaker_failures, breaker_reset) for model in self.models}
+        self.latency = LatencyTracker()
+        self.rng = rng or random.Random()
+        self.counters = {"calls": 0, "requests": 0, "retries": 0, "hedges": 0, "hedge_wins": 0,
+                         "fallback_replies": 0, "failures": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def _outcome(self, model, attempt, resp, error):
+        """
+        Classify one attempt.
+
+        Returns:
+            ("ok" | "raise" | "next" | "retry", seconds to wait before the retry)
+        """
+        breaker = self.breakers[model]
+        if isinstance(error, DeadlineExceeded):
+            breaker.cancel()  # our budget ran out; no verdict on the upstream
+            return "raise", 0.0
+        if error is not None:
+            print(f"⚠️  LLM request to {model} failed: {error!r}")
+            retry_after = None
+        elif resp.status_code == 200:
+            breaker.record_success()
+            return "ok", 0.0
+        else:
+            _log_error(resp)
+            if resp.status_code == 404:
+                breaker.record_failure()
+                return "next", 0.0
+            if resp.status_code not in RETRYABLE_STATUS:
+                # The upstream is up; the request itself is bad
+                breaker.record_success()
+                return "raise", 0.0
+            retry_after = parse_retry_after(resp.headers.get("retry-after"))
+
+        breaker.record_failure()
+        if attempt >= self.max_retries:
+            return "next", 0.0
+        if retry_after is not None:
+            if retry_after > self.retry_max_delay:
+                print(f"⏭️  {model} asks to wait {retry_after:.0f}s; trying the next model")
+                return "next", 0.0
+            return "retry", retry_after
+        return "retry", backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay, self.rng)
+
+    def _attempts(self):
+        """
+        Yield (model, attempt) until the caller gets an answer; the caller
+        sends back the action from _outcome.
+        """
+        for model in self.models:
+            attempt = 0
+            while self.breakers[model].allow():
+                action = yield model, attempt
+                if action != "retry":
+                    break
+                attempt += 1
+
+    def _failed(self, resp, error):
+        self._count("failures")
+        if resp is not None:
+            resp.raise_for_status()
+        if error is not None:
+            raise error
+        raise CircuitOpenError(f"All LLM models unavailable (circuits open): {', '.join(self.models)}")
+
+    def _succeeded(self, model, resp):
+        if model != self.models[0]:
+            self._count("fallback_replies")
+        return _groq_content(resp)
+
+    def _timeout(self, deadline):
+        if deadline is None:
+            return self.timeout
+        return min(self.timeout, deadline.remaining())
+
+    def _timed_out(self, timeout, deadline, error):
+        """
+        Blame a timeout on the reply deadline only when the deadline set the
+        limit; otherwise it is the upstream's (retried, counts for the breaker).
+        """
+        if deadline is not None and (deadline.expired() or timeout < self.timeout):
+            return DeadlineExceeded("LLM request cut off by the reply deadline")
+        return error
+
+    async def _apost(self, headers, data, deadline=None):
+        client = get_async_client(self.url)
+        timeout = self._timeout(deadline)
+
+        async def post():
+            self._count("requests")
+            return await client.post(self.url, headers=headers, json=data, timeout=timeout)
+
+        start = time.perf_counter()
+        try:
+            call = self._hedged(post) if self.hedge else post()
+            # httpx timeouts are per operation; the deadline bounds the whole request
+            resp = await (asyncio.wait_for(call, timeout) if deadline is not None else call)
+        except asyncio.TimeoutError:
+            error = httpx.TimeoutException(f"LLM request timed out after {timeout:.1f}s")
+            return None, self._timed_out(timeout, deadline, error)
+        except httpx.TimeoutException as e:
+            return None, self._timed_out(timeout, deadline, e)
+        except httpx.TransportError as e:  # refused/reset connections
+            return None, e
+        if resp.status_code == 200:
+            self.latency.record(time.perf_counter() - start)
+        return resp, None
+
+    async def _hedged(self, post):
+        delay = self.latency.percentile(95) or self.hedge_initial_delay
+        first = asyncio.ensure_future(post())
+        pending = {first}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return first.result()
+            self._count("hedges")
+            second = asyncio.ensure_future(post())
+            pending = {first, second}
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Both may finish in the same wait: a success beats a failure
+                for task in done:
+                    if task.exception() is None and task.result().status_code == 200:
+                        if task is second:
+                            self._count("hedge_wins")
+                        return task.result()
+                if not pending:
+                    return done.pop().result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _post(self, headers, data, deadline=None):
+        self._count("requests")
+        timeout = self._timeout(deadline)
+        start = time.perf_counter()
+        try:
+            resp = get_sync_client(self.url).post(self.url, headers=headers, json=data,
+                                                  timeout=timeout)
+        except httpx.TimeoutException as e:
+            return None, self._timed_out(timeout, deadline, e)
+        except httpx.TransportError as e:
+            return None, e
+        if resp.status_code == 200:
+            self.latency.record(time.perf_counter() - start)
+        return resp, None
+
+    def _out_of_time(self, model, deadline):
+        if deadline is not None and deadline.expired():
+            self.breakers[model].cancel()
+            return DeadlineExceeded("Reply deadline passed during LLM retries")
+        return None
+
+    def _skip_retry(self, delay, deadline):
+        # Sleeping past the deadline would only end in a DeadlineExceeded
+        return deadline is not None and delay >= deadline.remaining()
+
+    async def acomplete(self, system_prompt, user_prompt, temperature=0.2, max_tokens=512,
+                        deadline=None):
+        """
+        Return the model's reply text.
+
+        Args:
+            deadline: Optional Deadline bounding all attempts together
+
+        Raises:
+            httpx.HTTPStatusError: Non-retryable error, or the last error once
+                every model and retry is exhausted
+            httpx.TransportError: Last network error once everything is exhausted
+            CircuitOpenError: Every model's circuit is open
+            DeadlineExceeded: The deadline passed first
+        """
+        self._count("calls")
+        resp = error = None
+        attempts = self._attempts()
+        step = next(attempts, None)
+        while step is not None:
+            model, attempt = step
+            late = self._out_of_time(model, deadline)
+            if late is not None:
+                resp, error = None, late
+                break
+            headers, data = _groq_request(model, system_prompt, user_prompt, temperature, max_tokens)
+            resp, error = await self._apost(headers, data, deadline)
+            action, delay = self._outcome(model, attempt, resp, error)
+            if action == "ok":
+                return self._succeeded(model, resp)
+            if action == "raise":
+                break
+            if action == "retry":
+                if self._skip_retry(delay, deadline):
+                    action = "next"
+                else:
+                    self._count("retries")
+                    await asyncio.sleep(delay)
+            step = _advance(attempts, action)
+        return self._failed(resp, error)
+
+    def complete(self, system_prompt, user_prompt, temperature=0.2, max_tokens=512,
+                 deadline=None):
+        """Blocking variant of acomplete for scripts (no hedging)."""
+        self._count("calls")
+        resp = error = None
+        attempts = self._attempts()
+        step = next(attempts, None)
+        while step is not None:
+            model, attempt = step
+            late = self._out_of_time(model, deadline)
+            if late is not None:
+                resp, error = None, late
+                break
+            headers, data = _groq_request(model, system_prompt, user_prompt, temperature, max_tokens)
+            resp, error = self._post(headers, data, deadline)
+            action, delay = self._outcome(model, attempt, resp, error)
+            if action == "ok":
+                return self._succeeded(model, resp)
+            if action == "raise":
+                break
+            if action == "retry":
+                if self._skip_retry(delay, deadline):
+                    action = "next"
+                else:
+                    self._count("retries")
+                    time.sleep(delay)
+            step = _advance(attempts, action)
+        return self._failed(resp, error)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        p95 = self.latency.percentile(95)
+        return {
+            **counters,
+            "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "circuits": {model: breaker.stats() for model, breaker in self.breakers.items()},
+        }
+
+
+def _advance(attempts, action):
+    try:
+        return attempts.send(action)
+    except StopIteration:
+        return None
+
+
+# Shared client used by the responder
+llm_client = LLMClient()
+
+
+async def acall_groq(system_prompt, user_prompt, temperature=0.2, max_tokens=512, deadline=None):
+    """Call Groq chat completions over the shared pooled async client."""
+    return await llm_client.acomplete(system_prompt, user_prompt, temperature, max_tokens, deadline)
+
+
+def call_groq(system_prompt, user_prompt, temperature=0.2, max_tokens=512, deadline=None):
+    """Blocking variant of acall_groq for scripts."""
+    return llm_client.complete(system_prompt, user_prompt, temperature, max_tokens, deadline)
+
+
 call_openai = call_groq
+acall_openai = acall_groq
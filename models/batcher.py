@@ -0,0 +1,113 @@
+# models/batcher.py
+"""
+Dynamic micro-batching for query embeddings.
+
+Concurrent callers each submit one text; a background thread collects
+whatever arrives within `max_wait_ms` (or until `max_batch_size` texts are
+waiting), runs a single batched encode and resolves every caller's future.
+Under load this turns many batch-of-1 forward passes into a few larger ones;
+while the encoder is busy, new requests queue up and form the next batch.
+"""
+
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+_STOP = object()
+
+
+class QueryBatcher:
+    """
+    Collects single-text requests into batches for `encode_batch`.
+
+    Args:
+        encode_batch: Callable taking a list of texts and returning one
+            vector per text, in order
+        max_batch_size: Largest batch handed to encode_batch
+        max_wait_ms: How long the first request of a batch waits for company
+    """
+
+    def __init__(self, encode_batch, max_batch_size=32, max_wait_ms=2.0):
+        self.encode_batch = encode_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.items = 0
+        self._sizes = Counter()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+                    self._thread.start()
+
+    def submit(self, text):
+        """Queue one text; returns a Future resolving to its vector."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text, timeout=None):
+        """Blocking helper: submit and wait for the vector."""
+        return self.submit(text).result(timeout)
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)  # handled after this batch
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = self._collect(first)
+            texts = [text for text, _ in batch]
+            try:
+                vectors = self.encode_batch(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+                self._sizes[len(batch)] += 1
+
+    def close(self):
+        """Stop the background thread after pending requests are served."""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        """Batch-size metrics: totals, mean and the distribution of sizes."""
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "queries": self.items,
+                "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "max_batch_size": max(self._sizes) if self._sizes else 0,
+                "batch_sizes": dict(sorted(self._sizes.items())),
+                "queued": self._queue.qsize(),
+            }
@@ -1,14 +1,83 @@
 # models/embedder.py
-from sentence_transformers import SentenceTransformer
+# sentence_transformers (and torch behind it) is imported lazily: importing
+# this module must stay cheap so the web app starts before the model loads.
 from config.settings import settings
+from models.batcher import QueryBatcher
+import os
+import threading
+
+_shared = None
+_shared_lock = threading.Lock()
+
+EMBED_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+def _onnx_export_dir():
+    return os.path.join(settings.CHROMA_DIR, "onnx", settings.EMBED_MODEL.replace("/", "__"))
+
+def _load_onnx_model(quantized):
+    """
+    Load EMBED_MODEL through ONNX Runtime, exporting (and optionally
+    int8-quantizing) the graph once into CHROMA_DIR/onnx.
+    """
+    from sentence_transformers import SentenceTransformer
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError as e:
+        raise ImportError(
+            "EMBED_BACKEND=onnx needs ONNX Runtime: pip install \"sentence-transformers[onnx]\""
+        ) from e
+
+    export_dir = _onnx_export_dir()
+    if not os.path.exists(os.path.join(export_dir, "onnx", "model.onnx")):
+        print(f"Exporting {settings.EMBED_MODEL} to ONNX in {export_dir}...")
+        SentenceTransformer(settings.EMBED_MODEL, backend="onnx").save_pretrained(export_dir)
+    if not quantized:
+        return SentenceTransformer(export_dir, backend="onnx")
+
+    config = settings.EMBED_ONNX_QUANTIZATION
+    file_name = f"onnx/model_qint8_{config}.onnx"
+    if not os.path.exists(os.path.join(export_dir, file_name)):
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+        print(f"Quantizing ONNX model to int8 ({config})...")
+        export_dynamic_quantized_onnx_model(
+            SentenceTransformer(export_dir, backend="onnx"), config, export_dir
+        )
+    return SentenceTransformer(export_dir, backend="onnx", model_kwargs={"file_name": file_name})
 
 class Embedder:
     """
     Handles text embedding using SentenceTransformer models.
+
+    Args:
+        backend: "torch", "onnx" or "onnx-int8" (default EMBED_BACKEND)
     """
-    def __init__(self):
-        print(f"Loading embedding model: {settings.EMBED_MODEL}")
-        self.model = SentenceTransformer(settings.EMBED_MODEL)
+    def __init__(self, backend=None):
+        self.backend = backend or settings.EMBED_BACKEND
+        if self.backend not in EMBED_BACKENDS:
+            raise ValueError(f"Unknown EMBED_BACKEND: {self.backend!r} "
+                             f"(expected one of {', '.join(EMBED_BACKENDS)})")
+        print(f"Loading embedding model: {settings.EMBED_MODEL} ({self.backend})")
+        if self.backend == "torch":
+            from sentence_transformers import SentenceTransformer
+            self.model = SentenceTransformer(settings.EMBED_MODEL)
+        else:
+            self.model = _load_onnx_model(quantized=self.backend == "onnx-int8")
+        # Concurrent embed_query calls share one forward pass
+        self.batcher = QueryBatcher(
+            self.embed_queries,
+            max_batch_size=settings.EMBED_BATCH_MAX_SIZE,
+            max_wait_ms=settings.EMBED_BATCH_MAX_WAIT_MS,
+        ) if settings.EMBED_BATCHING_ENABLED else None
+
+    @property
+    def tokenizer(self):
+        """The model's HuggingFace tokenizer (used for token-accurate chunking)."""
+        return self.model.tokenizer
+
+    @property
+    def max_tokens(self):
+        """Longest input the model encodes without truncation, excluding [CLS]/[SEP]."""
+        return self.model.max_seq_length - 2
 
     def embed_texts(self, texts):
         """
@@ -26,9 +95,25 @@ class Embedder:
             normalize_embeddings=True
         ).tolist()
 
+    def embed_queries(self, texts):
+        """
+        Embed a batch of query texts in one forward pass (no progress bar).
+        
+        Args:
+            texts: List of query strings
+        
+        Returns:
+            List of embedding vectors
+        """
+        return self.model.encode(
+            texts, 
+            batch_size=max(len(texts), 1),
+            normalize_embeddings=True
+        ).tolist()
+
     def embed_query(self, text):
         """
-        Embed a single query text.
+        Embed a single query text, micro-batched with concurrent callers.
         
         Args:
             text: Query string
@@ -36,7 +121,21 @@ class Embedder:
         Returns:
             Single embedding vector
         """
-        return self.model.encode(
-            [text], 
-            normalize_embeddings=True
-        ).tolist()[0]
+        if self.batcher is not None:
+            return self.batcher.embed(text)
+        return self.embed_queries([text])[0]
+
+def get_embedder(load=True):
+    """
+    Return the process-wide Embedder, loading the model on first use.
+
+    Args:
+        load: If False, return None instead of loading a model that has not
+            been loaded yet (for health checks)
+    """
+    global _shared
+    if _shared is None and load:
+        with _shared_lock:
+            if _shared is None:
+                _shared = Embedder()
+    return _shared
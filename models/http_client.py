@@ -0,0 +1,121 @@
+# models/http_client.py
+"""
+Shared, pooled HTTP clients for outbound API calls.
+
+One httpx client is kept per origin (scheme://host:port) so every call to
+Groq or the WhatsApp Graph API reuses warm keep-alive connections instead of
+paying a TCP+TLS handshake each time. Connection limits are therefore
+per host. HTTP/2 is negotiated when the optional `h2` package is installed.
+
+Async clients serve the FastAPI app; sync clients back the scraper scripts.
+"""
+
+import threading
+from urllib.parse import urlsplit
+
+import httpx
+
+from config.settings import settings
+
+_async_clients = {}
+_sync_clients = {}
+_lock = threading.Lock()
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _client_options():
+    return {
+        "http2": settings.HTTP2_ENABLED and _http2_available(),
+        "limits": httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS_PER_HOST,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_PER_HOST,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+        ),
+        "timeout": httpx.Timeout(
+            settings.HTTP_TIMEOUT,
+            connect=settings.HTTP_CONNECT_TIMEOUT,
+        ),
+        "follow_redirects": True,
+    }
+
+
+def _origin(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_async_client(url):
+    """
+    Return the shared AsyncClient for the origin of `url`, creating it on first use.
+
+    Args:
+        url: Any URL on the target host
+
+    Returns:
+        httpx.AsyncClient
+    """
+    origin = _origin(url)
+    client = _async_clients.get(origin)
+    if client is None or client.is_closed:
+        with _lock:
+            client = _async_clients.get(origin)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(**_client_options())
+                _async_clients[origin] = client
+    return client
+
+
+def get_sync_client(url):
+    """
+    Return the shared blocking Client for the origin of `url` (for scripts).
+
+    Args:
+        url: Any URL on the target host
+
+    Returns:
+        httpx.Client
+    """
+    origin = _origin(url)
+    client = _sync_clients.get(origin)
+    if client is None or client.is_closed:
+        with _lock:
+            client = _sync_clients.get(origin)
+            if client is None or client.is_closed:
+                client = httpx.Client(**_client_options())
+                _sync_clients[origin] = client
+    return client
+
+
+def create_async_client(**overrides):
+    """
+    Build a dedicated AsyncClient with the shared defaults, for callers that
+    manage their own client lifecycle (e.g. a crawl run).
+    """
+    options = _client_options()
+    options.update(overrides)
+    return httpx.AsyncClient(**options)
+
+
+async def aclose_clients():
+    """Close all pooled async clients (call on app shutdown)."""
+    with _lock:
+        clients = list(_async_clients.values())
+        _async_clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
+def close_sync_clients():
+    """Close all pooled sync clients."""
+    with _lock:
+        clients = list(_sync_clients.values())
+        _sync_clients.clear()
+    for client in clients:
+        client.close()
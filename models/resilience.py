@@ -0,0 +1,217 @@
+# models/resilience.py
+"""
+Building blocks for calling a flaky upstream API.
+
+- backoff_delay: capped exponential backoff with full jitter
+- parse_retry_after: the Retry-After header as seconds
+- LatencyTracker: rolling latency percentiles (drives the hedging delay)
+- CircuitBreaker: fails fast after repeated failures, probes again later
+- Deadline: a total time budget shared by every stage of one reply
+"""
+
+import email.utils
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+def backoff_delay(attempt, base, cap, rng=random):
+    """
+    Delay before retry number `attempt` (0-based): uniform in
+    [0, min(cap, base * 2**attempt)] ("full jitter"), so clients that
+    failed together don't retry together.
+    """
+    return rng.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header (delta-seconds or HTTP-date).
+
+    Returns:
+        Seconds to wait (>= 0), or None if missing or unparseable
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(when.timestamp() - time.time(), 0.0)
+
+
+class LatencyTracker:
+    """
+    Rolling window of successful request latencies.
+
+    Args:
+        window: Number of recent samples kept
+        min_samples: Samples needed before percentile() reports a value
+    """
+
+    def __init__(self, window=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q):
+        """The q-th percentile (0-100) in seconds, or None with too few samples."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(int(len(ordered) * q / 100.0), len(ordered) - 1)]
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures; open ->
+    half-open after `reset_timeout` seconds, when a single trial call is
+    let through. Its success closes the circuit, its failure reopens it.
+
+    Args:
+        failure_threshold: Consecutive failures that open the circuit
+        reset_timeout: Seconds to stay open before a trial call
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go out now (claims the trial slot when half-open)."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    self.rejected += 1
+                    return False
+                self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def cancel(self):
+        """Give up a call without a verdict (frees the half-open trial slot)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"🔌 Circuit opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a stage has no budget left."""
+
+
+class Deadline:
+    """
+    Absolute time budget for one unit of work, passed through each stage.
+
+    Stages read remaining() to size their own timeouts. Time spent per stage
+    and the stage that used up the budget (exhausted_by) are recorded on the
+    root deadline, also when the work was done against a reserve() copy.
+
+    Args:
+        seconds: Budget from now
+    """
+
+    def __init__(self, seconds, _root=None):
+        now = time.monotonic()
+        self.started_at = now
+        self.expires_at = now + seconds
+        self.root = _root or self
+        self.timings = {}
+        self.exhausted_by = None
+        self.last_stage = None
+
+    def remaining(self):
+        """Seconds left (0 once expired)."""
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def elapsed(self):
+        return time.monotonic() - self.root.started_at
+
+    def expired(self):
+        return time.monotonic() >= self.expires_at
+
+    def reserve(self, seconds):
+        """
+        A deadline `seconds` earlier than this one, keeping that much time
+        back for the stages after the one it is given to.
+        """
+        return Deadline(self.remaining() - seconds, _root=self.root)
+
+    def exhaust(self, stage=None):
+        """Record the stage that used up the budget (first one wins; default: the last stage)."""
+        root = self.root
+        if root.exhausted_by is None:
+            root.exhausted_by = stage or root.last_stage or "unknown"
+
+    def record(self, stage, seconds):
+        """Add time spent in a stage; mark it as the culprit if this deadline has passed."""
+        root = self.root
+        root.timings[stage] = root.timings.get(stage, 0.0) + seconds
+        root.last_stage = stage
+        if self.expired():
+            self.exhaust(stage)
+
+    @contextmanager
+    def stage(self, name):
+        """Time a stage: `with deadline.stage("llm"): ...`."""
+        start = time.monotonic()
+        try:
+            yield self
+        finally:
+            self.record(name, time.monotonic() - start)
+
+    def report(self):
+        root = self.root
+        spent = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in root.timings.items())
+        if root.exhausted_by:
+            return f"{spent}; budget exhausted by {root.exhausted_by}"
+        return f"{spent}; {root.remaining():.2f}s to spare"
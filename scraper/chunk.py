@@ -1,5 +1,9 @@
 # scraper/chunk.py
+import copy
 import re
+import threading
+
+from config.settings import settings
 
 def chunk_text_by_tokens(text: str, max_tokens: int = 450):
     """
@@ -33,3 +37,140 @@ def chunk_text_by_tokens(text: str, max_tokens: int = 450):
         chunks.append(current)
     
     return chunks
+
+# Sentence boundary: terminal punctuation followed by whitespace
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+def _token_counts(tokenizer, texts):
+    """Token counts for many strings in one batched tokenizer call."""
+    if not texts:
+        return []
+    return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+def _hard_split(tokenizer, text, max_tokens):
+    """Split a single over-long sentence at token boundaries."""
+    enc = tokenizer([text], add_special_tokens=False, return_offsets_mapping=True)
+    offsets = enc["offset_mapping"][0]
+    pieces = []
+    for start in range(0, len(offsets), max_tokens):
+        window = offsets[start:start + max_tokens]
+        piece = text[window[0][0]:window[-1][1]].strip()
+        if piece:
+            pieces.append((piece, len(window)))
+    return pieces
+
+def chunk_text_by_model_tokens(text: str, tokenizer, max_tokens: int = 254, overlap_tokens: int = 0):
+    """
+    Chunk text by the embedding model's own token count.
+
+    Paragraphs are packed greedily while keeping a running token total, so
+    the cost is linear in the text length. Paragraphs longer than
+    max_tokens are split on sentence boundaries (and, as a last resort, at
+    token boundaries). Consecutive chunks share up to overlap_tokens tokens
+    of trailing sentences/paragraphs.
+
+    Args:
+        text: Text to chunk
+        tokenizer: HuggingFace-style tokenizer (e.g. Embedder().tokenizer)
+        max_tokens: Maximum tokens per chunk, excluding special tokens
+        overlap_tokens: Tokens of context repeated at the start of the next chunk
+
+    Returns:
+        List of text chunks
+    """
+    paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
+    if not paragraphs:
+        return []
+    overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+
+    # Pieces are (text, token_count, starts_paragraph)
+    para_counts = _token_counts(tokenizer, paragraphs)
+    oversized = [i for i, n in enumerate(para_counts) if n > max_tokens]
+    sentences = {i: [s for s in _SENTENCE_END.split(paragraphs[i]) if s.strip()] for i in oversized}
+    flat = [s for i in oversized for s in sentences[i]]
+    sentence_counts = iter(_token_counts(tokenizer, flat))
+
+    pieces = []
+    for i, (para, count) in enumerate(zip(paragraphs, para_counts)):
+        if count <= max_tokens:
+            pieces.append((para, count, True))
+            continue
+        first = True
+        for sentence in sentences[i]:
+            n = next(sentence_counts)
+            parts = [(sentence, n)] if n <= max_tokens else _hard_split(tokenizer, sentence, max_tokens)
+            for part, part_count in parts:
+                pieces.append((part, part_count, first))
+                first = False
+
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    def emit():
+        out = []
+        for j, (piece, _, starts_para) in enumerate(current):
+            if j:
+                out.append("\n\n" if starts_para else " ")
+            out.append(piece)
+        chunks.append("".join(out))
+
+    for piece in pieces:
+        n = piece[1]
+        if current and current_tokens + n > max_tokens:
+            emit()
+            # Carry trailing pieces forward as overlap, leaving room for this piece
+            carried = []
+            carried_tokens = 0
+            for prev in reversed(current):
+                if carried_tokens + prev[1] > overlap_tokens or carried_tokens + prev[1] + n > max_tokens:
+                    break
+                carried.append(prev)
+                carried_tokens += prev[1]
+            current = carried[::-1]
+            current_tokens = carried_tokens
+        current.append(piece)
+        current_tokens += n
+
+    if current:
+        emit()
+
+    return chunks
+
+_thread_tokenizers = threading.local()
+
+def _thread_tokenizer(tokenizer):
+    """
+    This thread's own copy of `tokenizer`.
+
+    HuggingFace fast tokenizers are not safe to use from several threads at
+    once, and pages are chunked on worker threads while the writer thread
+    encodes with the model's tokenizer. Copies are made once per thread
+    (worker pools reuse their threads).
+    """
+    cached = getattr(_thread_tokenizers, "pair", None)
+    if cached is None or cached[0] is not tokenizer:
+        cached = (tokenizer, copy.deepcopy(tokenizer))
+        _thread_tokenizers.pair = cached
+    return cached[1]
+
+def chunk_text(text: str):
+    """
+    Chunk cleaned page text with the configured strategy (settings.CHUNKER).
+
+    "model" counts tokens with the embedding model's tokenizer and caps
+    chunks at what the model can actually encode; "words" is the original
+    word-count heuristic.
+    """
+    if settings.CHUNKER == "words":
+        return chunk_text_by_tokens(text, max_tokens=settings.MAX_CHUNK_TOKENS)
+    if settings.CHUNKER != "model":
+        raise ValueError(f"Unknown CHUNKER: {settings.CHUNKER!r} (expected 'model' or 'words')")
+
+    # Imported here so the "words" strategy doesn't load the model
+    from models.embedder import get_embedder
+
+    embedder = get_embedder()
+    max_tokens = min(settings.MAX_CHUNK_TOKENS, embedder.max_tokens)
+    return chunk_text_by_model_tokens(text, _thread_tokenizer(embedder.tokenizer), max_tokens=max_tokens,
+                                      overlap_tokens=settings.CHUNK_OVERLAP_TOKENS)
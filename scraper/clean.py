@@ -1,26 +1,112 @@
 # scraper/clean.py
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, CData
+from lxml import etree
 import re
 
-def clean_html(html: str) -> str:
+from config.settings import settings
+
+# Elements whose whole subtree is navigation, scripts, styles, ads or forms,
+# plus never-rendered content (<template>) and ruby annotations, whose text
+# get_text() skips anyway
+NOISE_TAGS = frozenset(["nav", "footer", "script", "style", "noscript", "form", "header",
+                        "iframe", "svg", "ads", "aside", "template", "rt", "rp"])
+
+# Attribute substrings marking common noise (customize for your site)
+NOISE_ATTRS = (("class", "cookie"), ("id", "cookie"), ("class", "subscribe"), ("class", "banner"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+def clean_html(html: str, engine: str = None) -> str:
     """
     Clean HTML by removing navigation, scripts, styles, and other noise.
     Returns cleaned text with proper spacing.
+
+    Args:
+        html: Raw HTML
+        engine: "lxml" (single-pass, fast) or "bs4" (BeautifulSoup html.parser);
+            defaults to settings.CLEAN_ENGINE
     """
+    engine = engine or settings.CLEAN_ENGINE
+    if engine == "lxml":
+        return clean_html_lxml(html)
+    if engine == "bs4":
+        return clean_html_bs4(html)
+    raise ValueError(f"Unknown CLEAN_ENGINE: {engine!r} (expected 'lxml' or 'bs4')")
+
+def _collapse_lines(text: str) -> str:
+    # Collapse whitespace and short lines
+    lines = [_WHITESPACE.sub(" ", ln).strip() for ln in text.splitlines()]
+    lines = [ln for ln in lines if len(ln) > 30]  # drop very short lines
+    return "\n\n".join(lines)
+
+def clean_html_bs4(html: str) -> str:
+    """Reference engine: BeautifulSoup with the pure-Python html.parser."""
     soup = BeautifulSoup(html, "html.parser")
 
     # remove nav, footer, script, style, ads, forms
-    for sel in ["nav", "footer", "script", "style", "noscript", "form", "header", "iframe", "svg", "ads", "aside"]:
+    for sel in NOISE_TAGS:
         for tag in soup.select(sel):
             tag.decompose()
 
-    # remove common noise classes/ids (customize for your site)
-    for noise in soup.select("[class*='cookie'], [id*='cookie'], [class*='subscribe'], [class*='banner']"):
+    # remove common noise classes/ids
+    for noise in soup.select(", ".join(f"[{attr}*='{sub}']" for attr, sub in NOISE_ATTRS)):
         noise.decompose()
 
+    # <![CDATA[...]]> in HTML is a bogus comment: browsers (and libxml2) drop it
+    for cdata in soup.find_all(string=lambda s: isinstance(s, CData)):
+        cdata.extract()
+
     text = soup.get_text(separator="\n")
-    # Collapse whitespace and short lines
-    lines = [re.sub(r"\s+", " ", ln).strip() for ln in text.splitlines()]
-    lines = [ln for ln in lines if len(ln) > 30]  # drop very short lines
-    cleaned = "\n\n".join(lines)
-    return cleaned
+    return _collapse_lines(text)
+
+def _is_noise(el) -> bool:
+    if el.tag in NOISE_TAGS:
+        return True
+    for attr, sub in NOISE_ATTRS:
+        value = el.get(attr)
+        if value and sub in value:
+            return True
+    return False
+
+def clean_html_lxml(html: str) -> str:
+    """
+    Fast engine: libxml2 parser plus one iterative walk of the tree that
+    skips noise subtrees and collects text in document order.
+
+    Produces the same text as clean_html_bs4: every text node on its own
+    line, noise elements dropped but the text that follows them kept.
+    """
+    if not html or not html.strip():
+        return ""
+    try:
+        root = etree.fromstring(html, etree.HTMLParser())
+    except ValueError:
+        # XHTML with an <?xml encoding=...?> prolog can't be parsed from str
+        root = etree.fromstring(html.encode("utf-8"), etree.HTMLParser(encoding="utf-8"))
+    if root is None:
+        return ""
+
+    parts = []
+    append = parts.append
+    # (element, closing): closing entries emit the tail after the subtree
+    stack = [(root, False)]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        el, closing = pop()
+        if closing:
+            if el.tail:
+                append(el.tail)
+            continue
+        # Comments and processing instructions have a non-string tag
+        if not isinstance(el.tag, str) or _is_noise(el):
+            if el.tail:
+                append(el.tail)
+            continue
+        if el.text:
+            append(el.text)
+        push((el, True))
+        for child in reversed(el):
+            push((child, False))
+
+    return _collapse_lines("\n".join(parts))
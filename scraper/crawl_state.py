@@ -0,0 +1,118 @@
+# scraper/crawl_state.py
+"""
+Persistent per-URL crawl state used for incremental crawls.
+
+For every page we remember the validators needed for conditional requests
+(ETag / Last-Modified), the outgoing links, so a 304 Not Modified page can
+still be expanded without downloading it, and the sitemap <lastmod> it was
+indexed at.
+"""
+
+import json
+import os
+
+from config.settings import settings
+
+STATE_PATH = os.path.join(settings.CHROMA_DIR, "crawl_state.json")
+
+
+class CrawlProgress:
+    """
+    Frontier of a crawl in progress: URLs scheduled (`seen`) and finished
+    (`done`). Saved with each index checkpoint so a crawl can resume.
+    """
+
+    def __init__(self, seen=(), done=()):
+        self.seen = set(seen)
+        self.done = set(done)
+
+    def pending(self):
+        """URLs scheduled but not yet finished."""
+        return sorted(self.seen - self.done)
+
+
+class CrawlState:
+    """
+    JSON-backed map of url -> {"etag", "last_modified", "links", "lastmod"}.
+
+    Args:
+        path: JSON file path
+    """
+
+    def __init__(self, path=STATE_PATH, pages=None, progress=None):
+        self.path = path
+        self.pages = pages if pages is not None else {}
+        self._progress = progress
+
+    @classmethod
+    def load(cls, path=STATE_PATH):
+        """Load state from disk, or start empty if there is none."""
+        if not os.path.exists(path):
+            return cls(path)
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(path, data.get("pages", {}), data.get("progress"))
+
+    def save(self):
+        """Write state atomically."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"pages": self.pages, "progress": self._progress}, f)
+        os.replace(tmp, self.path)
+
+    def reset(self):
+        """Forget everything (e.g. when the index was rebuilt from scratch)."""
+        self.pages = {}
+        self._progress = None
+
+    def progress(self, start_url):
+        """CrawlProgress of an interrupted crawl from start_url, or None."""
+        saved = self._progress
+        if not saved or saved.get("start_url") != start_url:
+            return None
+        return CrawlProgress(saved.get("seen", ()), saved.get("done", ()))
+
+    def set_progress(self, start_url, progress):
+        self._progress = {
+            "start_url": start_url,
+            "seen": sorted(progress.seen),
+            "done": sorted(progress.done),
+        }
+
+    def clear_progress(self):
+        self._progress = None
+
+    def conditional_headers(self, url):
+        """If-None-Match / If-Modified-Since headers for a previously fetched url."""
+        page = self.pages.get(url) or {}
+        headers = {}
+        if page.get("etag"):
+            headers["If-None-Match"] = page["etag"]
+        if page.get("last_modified"):
+            headers["If-Modified-Since"] = page["last_modified"]
+        return headers
+
+    def links(self, url):
+        return set((self.pages.get(url) or {}).get("links", ()))
+
+    def record(self, url, etag=None, last_modified=None, links=()):
+        """Remember the validators and outgoing links of a freshly fetched page."""
+        page = self.pages.setdefault(url, {})
+        page["etag"] = etag
+        page["last_modified"] = last_modified
+        page["links"] = sorted(links)
+
+    def lastmod(self, url):
+        """Sitemap lastmod the page was last indexed at (None if unknown)."""
+        return (self.pages.get(url) or {}).get("lastmod")
+
+    def set_lastmod(self, url, lastmod):
+        self.pages.setdefault(url, {})["lastmod"] = lastmod
+
+    def sitemap_urls(self):
+        """URLs that were discovered through the sitemap on an earlier run."""
+        return {url for url, page in self.pages.items() if "lastmod" in page}
+
+    def forget(self, url):
+        self.pages.pop(url, None)
@@ -0,0 +1,113 @@
+# scraper/politeness.py
+"""
+Crawl politeness helpers: per-host token-bucket rate limiting and robots.txt.
+"""
+
+import asyncio
+import time
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+
+class TokenBucket:
+    """
+    Async token bucket: allows `rate` requests per second with bursts of up
+    to `capacity` requests.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class HostRateLimiter:
+    """
+    One TokenBucket per host.
+
+    Args:
+        rate: Default requests per second for each host
+        burst: Default bucket capacity
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+
+    def set_crawl_delay(self, host, delay):
+        """Slow a host down to one request every `delay` seconds (robots.txt)."""
+        if delay and 1.0 / delay < self.rate:
+            self._buckets[host] = TokenBucket(1.0 / delay, capacity=1)
+
+    async def wait(self, url):
+        host = urlparse(url).netloc
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = TokenBucket(self.rate, capacity=self.burst)
+        await bucket.acquire()
+
+
+class RobotsCache:
+    """
+    Fetches and caches robots.txt per host using the crawler's async client.
+
+    Args:
+        client: httpx.AsyncClient
+        user_agent: User agent to match rules against
+        limiter: Optional HostRateLimiter to apply Crawl-delay to
+    """
+
+    def __init__(self, client, user_agent, limiter=None):
+        self.client = client
+        self.user_agent = user_agent
+        self.limiter = limiter
+        self._parsers = {}
+        self._locks = {}
+
+    async def _parser(self, url):
+        parts = urlparse(url)
+        host = parts.netloc
+        if host in self._parsers:
+            return self._parsers[host]
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            if host in self._parsers:
+                return self._parsers[host]
+            parser = RobotFileParser()
+            try:
+                resp = await self.client.get(f"{parts.scheme}://{host}/robots.txt")
+                if resp.status_code == 200:
+                    parser.parse(resp.text.splitlines())
+                else:
+                    # Missing robots.txt means everything is allowed
+                    parser.parse([])
+            except Exception as e:
+                print(f"  ⚠️  Could not fetch robots.txt for {host}: {e}")
+                parser.parse([])
+            self._parsers[host] = parser
+            if self.limiter is not None:
+                self.limiter.set_crawl_delay(host, parser.crawl_delay(self.user_agent))
+            return parser
+
+    async def allowed(self, url):
+        """True if robots.txt lets our user agent fetch url."""
+        parser = await self._parser(url)
+        return parser.can_fetch(self.user_agent, url)
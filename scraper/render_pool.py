@@ -0,0 +1,210 @@
+# scraper/render_pool.py
+"""
+Concurrent headless-browser rendering for JavaScript sites.
+
+A RenderPool keeps N browser contexts (one page each) and renders N URLs at
+a time. Images, media, fonts and analytics requests are aborted at the route
+level, and a page counts as ready once the DOM is loaded, the ready selector
+is present and the network has been idle briefly (bounded), instead of
+waiting for full networkidle plus a fixed sleep.
+"""
+
+import asyncio
+import time
+from urllib.parse import urlparse
+
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from playwright.async_api import async_playwright
+
+from config.settings import settings
+from scraper.crawl_state import CrawlProgress
+
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+
+# Third-party trackers that never contribute text content
+BLOCKED_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "facebook.net",
+    "connect.facebook.com",
+    "hotjar.com",
+    "segment.io",
+    "clarity.ms",
+    "mixpanel.com",
+)
+
+
+def _is_blocked(request):
+    if request.resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    host = urlparse(request.url).netloc
+    return any(host == h or host.endswith("." + h) for h in BLOCKED_HOSTS)
+
+
+async def _block_route(route):
+    if _is_blocked(route.request):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+class RenderPool:
+    """
+    Pool of browser pages rendering URLs concurrently.
+
+    Use as an async context manager:
+
+        async with RenderPool(size=4) as pool:
+            html, links = await pool.render(url)
+
+    Args:
+        size: Number of concurrent pages (default RENDER_CONCURRENCY)
+        block_resources: Abort image/media/font/analytics requests
+        ready_selector: CSS selector that must be attached before reading the DOM
+        idle_ms: Upper bound on waiting for network idle after the DOM is ready
+        timeout_ms: Navigation timeout
+    """
+
+    def __init__(self, size=None, block_resources=None, ready_selector=None,
+                 idle_ms=None, timeout_ms=None):
+        self.size = size or settings.RENDER_CONCURRENCY
+        self.block_resources = (settings.RENDER_BLOCK_RESOURCES
+                                if block_resources is None else block_resources)
+        self.ready_selector = (settings.RENDER_READY_SELECTOR
+                               if ready_selector is None else ready_selector)
+        self.idle_ms = settings.RENDER_IDLE_MS if idle_ms is None else idle_ms
+        self.timeout_ms = timeout_ms or settings.RENDER_TIMEOUT_MS
+        self.rendered = 0
+        self.failed = 0
+        self._started = None
+        self._playwright = None
+        self._browser = None
+        self._pages = None
+
+    async def __aenter__(self):
+        self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(headless=True)
+        self._pages = asyncio.Queue()
+        for _ in range(self.size):
+            context = await self._browser.new_context(
+                user_agent=settings.SCRAPE_USER_AGENT,
+                viewport={'width': 1920, 'height': 1080}
+            )
+            if self.block_resources:
+                await context.route("**/*", _block_route)
+            self._pages.put_nowait(await context.new_page())
+        self._started = time.monotonic()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._browser.close()
+        await self._playwright.stop()
+        self.report()
+
+    async def _wait_ready(self, page):
+        if self.ready_selector:
+            await page.wait_for_selector(self.ready_selector, state="attached",
+                                         timeout=self.timeout_ms)
+        if self.idle_ms:
+            try:
+                await page.wait_for_load_state("networkidle", timeout=self.idle_ms)
+            except PlaywrightTimeoutError:
+                pass  # Long-polling/analytics traffic: the DOM is good enough
+
+    async def render(self, url):
+        """
+        Render one URL on a free page from the pool.
+
+        Returns:
+            (html, links) where links are the absolute hrefs on the rendered page
+        """
+        page = await self._pages.get()
+        try:
+            await page.goto(url, wait_until="domcontentloaded", timeout=self.timeout_ms)
+            await self._wait_ready(page)
+            html = await page.content()
+            links = await page.eval_on_selector_all(
+                'a[href]',
+                '(elements) => elements.map(e => e.href)'
+            )
+            self.rendered += 1
+            return html, links
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._pages.put_nowait(page)
+
+    def throughput(self):
+        """Rendered pages per second since the pool started."""
+        if self._started is None:
+            return 0.0
+        elapsed = time.monotonic() - self._started
+        return self.rendered / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        if self._started is None:
+            return
+        elapsed = time.monotonic() - self._started
+        print(f"⏱  Rendered {self.rendered} pages ({self.failed} failed) in {elapsed:.1f}s "
+              f"with {self.size} pages → {self.throughput():.2f} pages/s")
+
+
+async def crawl_rendered(start_url, handle_page, writer, max_pages=None, concurrency=None,
+                         progress=None):
+    """
+    Breadth-first crawl rendering up to `concurrency` pages at once and
+    streaming each page's chunks into `writer`.
+
+    Args:
+        start_url: First URL to render
+        handle_page: Callable (url, html, links) -> (page_docs, urls_to_follow).
+            Runs in a worker thread since cleaning/chunking is CPU-bound.
+        writer: IndexWriter receiving page chunks
+        max_pages: Stop scheduling new URLs after this many (None = no limit)
+        concurrency: Pool size (default RENDER_CONCURRENCY)
+        progress: Optional CrawlProgress to resume from and keep updated
+
+    Returns:
+        Set of URLs visited
+    """
+    progress = progress if progress is not None else CrawlProgress()
+    seeds = progress.pending() if progress.seen else [start_url]
+    seen = progress.seen
+    seen.update(seeds)
+    queue = asyncio.Queue()
+    for url in seeds:
+        queue.put_nowait(url)
+
+    async with RenderPool(size=concurrency) as pool:
+
+        async def worker():
+            while True:
+                url = await queue.get()
+                try:
+                    print(f"Rendering: {url}")
+                    html, links = await pool.render(url)
+                    page_docs, follow = await asyncio.to_thread(handle_page, url, html, links)
+                    # Embeds on the writer thread; its checkpoint hook still runs
+                    # on this loop, so it sees a consistent `progress`
+                    await writer.aadd_page(url, page_docs)
+                    for link in follow or ():
+                        if max_pages is not None and len(seen) >= max_pages:
+                            break
+                        if link not in seen:
+                            seen.add(link)
+                            queue.put_nowait(link)
+                except Exception as e:
+                    print(f"  ✗ Error rendering {url}: {e}")
+                finally:
+                    progress.done.add(url)
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(pool.size)]
+        await queue.join()
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    return seen
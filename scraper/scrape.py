@@ -1,14 +1,13 @@
 # scraper/scrape.py
 import asyncio
-from playwright.async_api import async_playwright
 from urllib.parse import urlparse, urljoin
 from bs4 import BeautifulSoup
-import re
-import time
 
 from scraper.clean import clean_html
-from scraper.chunk import chunk_text_by_tokens
-from embeddings.build_vectors import upsert_documents
+from scraper.chunk import chunk_text
+from scraper.render_pool import crawl_rendered
+from scraper.crawl_state import CrawlProgress, CrawlState
+from embeddings.build_vectors import IndexWriter, index_exists
 from config.settings import settings
 
 
@@ -38,67 +37,61 @@ def extract_internal_links(url, html):
 # ----------------------
 # Main scraping logic using Playwright
 # ----------------------
-async def scrape_all_pages(start_url):
+async def scrape_all_pages(start_url, writer, concurrency=None, max_pages=None, progress=None):
     print("Launching Playwright...")
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
-        
-        visited = set()
-        to_visit = set([start_url])
-        documents = []
 
-        while to_visit:
-            url = to_visit.pop()
-            if url in visited:
-                continue
-            visited.add(url)
+    def handle_page(url, html, rendered_links):
+        # extract internal links to expand crawl
+        links = extract_internal_links(start_url, html)
 
-            print(f"Scraping: {url}")
-            try:
-                await page.goto(url, wait_until="networkidle", timeout=60000)
-                await page.wait_for_timeout(1500)  # allow JS to settle
+        # clean text
+        cleaned = clean_html(html)
+        chunks = chunk_text(cleaned)
 
-                html = await page.content()
+        page_docs = [
+            {"id": f"{url}#chunk{i}", "url": url, "text": chunk}
+            for i, chunk in enumerate(chunks)
+        ]
+        return page_docs, links
 
-                # extract internal links to expand crawl
-                links = extract_internal_links(start_url, html)
-                to_visit.update(links - visited)
-
-                # clean text
-                cleaned = clean_html(html)
-                chunks = chunk_text_by_tokens(cleaned, max_tokens=settings.MAX_CHUNK_TOKENS)
-
-                for i, chunk in enumerate(chunks):
-                    documents.append({
-                        "id": f"{url}#chunk{i}",
-                        "url": url,
-                        "text": chunk
-                    })
-
-            except Exception as e:
-                print(f"Error scraping {url}: {e}")
-
-        await browser.close()
-
-    return documents
+    await crawl_rendered(start_url, handle_page, writer, max_pages=max_pages,
+                         concurrency=concurrency, progress=progress)
 
 
 # ----------------------
 # Pipeline runner
 # ----------------------
-def crawl_and_build():
+def crawl_and_build(max_pages=None, resume=True):
     start_url = settings.SITEMAP_URL  # in this case your homepage
-    print("Starting FULL BROWSER SCRAPE on:", start_url)
-
-    documents = asyncio.run(scrape_all_pages(start_url))
-
-    print(f"Total chunks extracted: {len(documents)}")
-    if len(documents) == 0:
+    max_pages = max_pages or settings.SCRAPE_MAX_PAGES
+    print("Starting FULL BROWSER SCRAPE on:", start_url, f"(max {max_pages} pages)")
+
+    state = CrawlState.load()
+    progress = state.progress(start_url) if resume and index_exists() else None
+    if progress is not None:
+        print(f"Resuming interrupted scrape: {len(progress.done)} pages done, "
+              f"{len(progress.pending())} pending")
+    else:
+        progress = CrawlProgress()
+
+    def save_progress():
+        state.set_progress(start_url, progress)
+        state.save()
+
+    # Chunks are embedded and upserted in batches while pages are rendered
+    writer = IndexWriter(on_checkpoint=save_progress)
+    asyncio.run(scrape_all_pages(start_url, writer, max_pages=max_pages, progress=progress))
+
+    print(f"Total chunks extracted: {writer.chunks}")
+    if writer.chunks == 0:
+        writer.close()
         print("WARNING: No chunks found. Something is wrong.")
         return
 
-    print("Upserting into ChromaDB (Overwrite Mode)...")
-    upsert_documents(documents, overwrite=True)
+    # Full rebuild: drop every page this scrape did not reach
+    print("Finalizing FAISS index (removing pages no longer on the site)...")
+    writer.close(prune=True, keep_urls=progress.done)
+    state.clear_progress()
+    state.save()
 
     print("Done. Vector DB updated successfully.")
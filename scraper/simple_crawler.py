@@ -4,13 +4,18 @@ Simple web crawler for sites without sitemaps.
 Crawls a website by following internal links starting from homepage.
 """
 
-import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
 from config.settings import settings
 from scraper.clean import clean_html
-from scraper.chunk import chunk_text_by_tokens
-from embeddings.build_vectors import upsert_documents
+from scraper.chunk import chunk_text
+from scraper.crawl_state import CrawlProgress, CrawlState
+from scraper.politeness import HostRateLimiter, RobotsCache
+from scraper.sitemap import discover_sitemap_url, iter_sitemap
+from embeddings.build_vectors import IndexWriter, index_exists
+from models.http_client import create_async_client, get_sync_client
+import asyncio
+import httpx
 import time
 
 HEADERS = {"User-Agent": settings.SCRAPE_USER_AGENT}
@@ -19,10 +24,18 @@ def is_same_domain(url, base_url):
     """Check if URL is from the same domain."""
     return urlparse(url).netloc == urlparse(base_url).netloc
 
-def fetch_url(url):
-    """Fetch URL content with timeout and headers."""
+def fetch_url(url, gone=None):
+    """
+    Fetch URL content with timeout and headers.
+
+    Args:
+        url: Page URL
+        gone: Optional set collecting URLs that returned 404/410
+    """
     try:
-        resp = requests.get(url, headers=HEADERS, timeout=15)
+        resp = get_sync_client(url).get(url, headers=HEADERS, timeout=15)
+        if resp.status_code in (404, 410) and gone is not None:
+            gone.add(url)
         resp.raise_for_status()
         return resp.text
     except Exception as e:
@@ -47,23 +60,25 @@ def extract_links(html, base_url):
     
     return links
 
-def crawl_website(start_url, max_pages=20):
+def crawl_website(start_url, writer, max_pages=20, progress=None):
     """
-    Crawl website starting from start_url.
+    Crawl website starting from start_url, streaming each page's chunks
+    into `writer` as it is processed.
     
     Args:
         start_url: Homepage URL
+        writer: IndexWriter receiving page chunks and deletions
         max_pages: Maximum number of pages to crawl
-    
-    Returns:
-        List of document chunks
+        progress: Optional CrawlProgress to resume from and keep updated
     """
     print(f"Starting crawl from: {start_url}")
     print(f"Max pages: {max_pages}")
     
-    visited = set()
-    to_visit = {start_url}
-    docs = []
+    progress = progress if progress is not None else CrawlProgress()
+    visited = set(progress.done)
+    to_visit = set(progress.pending()) if progress.seen else {start_url}
+    progress.seen.update(to_visit)
+    gone = set()
     
     while to_visit and len(visited) < max_pages:
         url = to_visit.pop()
@@ -75,56 +90,269 @@ def crawl_website(start_url, max_pages=20):
         print(f"\n[{len(visited)}/{max_pages}] Crawling: {url}")
         
         # Fetch page
-        html = fetch_url(url)
+        html = fetch_url(url, gone)
         if not html:
+            if url in gone:
+                writer.delete_pages([url])
+            progress.done.add(url)
             continue
         
-        # Clean and chunk
-        cleaned = clean_html(html)
-        if len(cleaned) < 100:  # Skip pages with too little content
+        # Clean, chunk and hand off to the index writer
+        page_docs = page_chunks(url, html)
+        if not page_docs:
             print(f"  ⊘ Skipped (too little content)")
+            writer.add_page(url, [])
+            progress.done.add(url)
             continue
         
-        chunks = chunk_text_by_tokens(cleaned, max_tokens=settings.MAX_CHUNK_TOKENS)
-        print(f"  → Extracted {len(chunks)} chunks")
-        
-        # Add to documents
-        for i, chunk in enumerate(chunks):
-            docs.append({
-                "id": f"{url}#chunk{i}",
-                "url": url,
-                "text": chunk
-            })
+        print(f"  → Extracted {len(page_docs)} chunks")
+        writer.add_page(url, page_docs)
         
         # Extract links for further crawling
-        links = extract_links(html, start_url)
-        to_visit.update(links - visited)
+        links = extract_links(html, start_url) - visited
+        to_visit.update(links)
+        progress.seen.update(links)
+        progress.done.add(url)
         
         time.sleep(0.3)  # Be polite
     
     print(f"\n✓ Crawled {len(visited)} pages")
-    print(f"✓ Extracted {len(docs)} chunks total")
+    print(f"✓ Extracted {writer.chunks} chunks total")
+
+def page_chunks(url, html):
+    """Clean and chunk one page into document dicts (empty if too little content)."""
+    cleaned = clean_html(html)
+    if len(cleaned) < 100:  # Skip pages with too little content
+        return []
+    chunks = chunk_text(cleaned)
+    return [{"id": f"{url}#chunk{i}", "url": url, "text": chunk} for i, chunk in enumerate(chunks)]
+
+async def crawl_website_async(start_url, writer, max_pages=20, concurrency=None, state=None,
+                              urls=None, follow_links=True, lastmods=None, progress=None):
+    """
+    Crawl website with concurrent async fetches, streaming each changed
+    page's chunks into `writer`.
+
+    Fetches are bounded by `concurrency`, throttled per host by a token
+    bucket (slowed further by robots.txt Crawl-delay), and made conditional
+    on the ETag/Last-Modified stored in `state`. Pages answering 304 are not
+    cleaned or embedded again; their stored links keep the crawl going.
     
-    return docs
+    Args:
+        start_url: Homepage URL
+        max_pages: Maximum number of pages to crawl
+        concurrency: Maximum in-flight requests (default CRAWL_CONCURRENCY)
+        writer: IndexWriter receiving page chunks and deletions
+        state: CrawlState to read and update (default: loaded from disk).
+            The caller saves it when the writer checkpoints.
+        urls: Seed URLs (default [start_url])
+        follow_links: Expand the crawl through links found on pages
+        lastmods: Optional url -> sitemap lastmod to record on success
+        progress: Optional CrawlProgress to resume from and keep updated
+    """
+    concurrency = concurrency or settings.CRAWL_CONCURRENCY
+    state = state if state is not None else CrawlState.load()
+    limiter = HostRateLimiter(settings.CRAWL_RATE_PER_HOST, burst=settings.CRAWL_BURST_PER_HOST)
+
+    progress = progress if progress is not None else CrawlProgress()
+    if progress.seen:
+        seeds = progress.pending()
+    else:
+        seeds = list(urls) if urls is not None else [start_url]
+        if max_pages is not None:
+            seeds = seeds[:max_pages]
+    lastmods = lastmods or {}
 
-def crawl_and_build(max_pages=20):
+    print(f"Starting async crawl from: {start_url}")
+    print(f"Max pages: {max_pages}, concurrency: {concurrency}")
+
+    seen = progress.seen
+    seen.update(seeds)
+    queue = asyncio.Queue()
+    for url in seeds:
+        queue.put_nowait(url)
+    counts = {"fetched": 0, "unchanged": 0, "failed": 0, "disallowed": 0}
+    started = time.monotonic()
+
+    def enqueue_links(links):
+        if not follow_links:
+            return
+        for link in links:
+            if max_pages is not None and len(seen) >= max_pages:
+                break
+            if link not in seen:
+                seen.add(link)
+                queue.put_nowait(link)
+
+    async def process(client, robots, url):
+        if not await robots.allowed(url):
+            counts["disallowed"] += 1
+            return
+        await limiter.wait(url)
+
+        resp = await client.get(url, headers=state.conditional_headers(url))
+        if resp.status_code == 304:
+            counts["unchanged"] += 1
+            if url in lastmods:
+                state.set_lastmod(url, lastmods[url])
+            enqueue_links(state.links(url))
+            return
+        if resp.status_code in (404, 410):
+            await writer.adelete_pages([url])
+            state.forget(url)
+        resp.raise_for_status()
+
+        html = resp.text
+        counts["fetched"] += 1
+        # Parsing is CPU-bound; keep it off the event loop
+        page_docs, links = await asyncio.to_thread(
+            lambda: (page_chunks(url, html), extract_links(html, start_url))
+        )
+        # May embed a batch and checkpoint the index together with `state`;
+        # off the event loop so other fetches keep going meanwhile
+        await writer.aadd_page(url, page_docs)
+        # Only now: a checkpoint saving these validators before the page's
+        # chunks are queued would turn it into a 304 that is never indexed
+        state.record(url, resp.headers.get("etag"), resp.headers.get("last-modified"), links)
+        if url in lastmods:
+            state.set_lastmod(url, lastmods[url])
+        print(f"  [{counts['fetched']}] {url} → {len(page_docs)} chunks")
+        enqueue_links(links)
+
+    async def worker(client, robots):
+        while True:
+            url = await queue.get()
+            try:
+                await process(client, robots, url)
+            except Exception as e:
+                counts["failed"] += 1
+                print(f"  ✗ Error fetching {url}: {e}")
+            finally:
+                progress.done.add(url)
+                queue.task_done()
+
+    async with create_async_client(
+        headers=HEADERS,
+        timeout=httpx.Timeout(15.0),
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+    ) as client:
+        robots = RobotsCache(client, settings.SCRAPE_USER_AGENT, limiter)
+        workers = [asyncio.create_task(worker(client, robots)) for _ in range(concurrency)]
+        await queue.join()
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    elapsed = time.monotonic() - started
+    print(f"\n✓ Visited {len(seen)} pages in {elapsed:.1f}s "
+          f"({counts['fetched']} changed, {counts['unchanged']} unchanged, "
+          f"{counts['failed']} failed, {counts['disallowed']} disallowed by robots.txt)")
+    print(f"✓ Extracted {writer.chunks} chunks total")
+
+def select_sitemap_changes(site_url, state, max_pages=None):
+    """
+    Stream the site's sitemap and pick the URLs that need (re)fetching.
+
+    A URL is selected when it is new, has no <lastmod>, or its lastmod
+    differs from the one recorded when it was last indexed.
+
+    Returns:
+        (changed_urls, lastmods, removed_urls) where removed_urls were in the
+        sitemap on an earlier run but are no longer listed. removed_urls is
+        empty when a child sitemap could not be read: its pages are missing
+        from the listing without having been removed from the site.
+    """
+    sitemap_url = discover_sitemap_url(site_url)
+    print(f"Reading sitemap: {sitemap_url}")
+
+    listed = set()
+    changed = []
+    lastmods = {}
+    errors = []
+    for loc, lastmod in iter_sitemap(sitemap_url, errors):
+        if loc in listed:
+            continue
+        listed.add(loc)
+        if lastmod is not None and state.lastmod(loc) == lastmod:
+            continue
+        if max_pages is None or len(changed) < max_pages:
+            changed.append(loc)
+            lastmods[loc] = lastmod
+
+    if errors:
+        print(f"  ⚠️  {len(errors)} child sitemap(s) failed - not removing unlisted pages this run")
+        removed = set()
+    else:
+        removed = state.sitemap_urls() - listed
+    print(f"✓ Sitemap lists {len(listed)} URLs: {len(changed)} new/changed, "
+          f"{len(listed) - len(changed)} unchanged, {len(removed)} removed")
+    return changed, lastmods, removed
+
+def crawl_and_build(max_pages=20, use_async=True, use_sitemap=False, resume=True):
     """
-    Main crawling pipeline:
+    Main crawling pipeline, streamed page by page:
     1. Crawl website from homepage
     2. Extract and clean content
     3. Chunk text
-    4. Build embeddings and store in FAISS
+    4. Build embeddings and store in FAISS in fixed-size batches,
+       checkpointing the index and crawl progress periodically
     
     Args:
         max_pages: Maximum number of pages to crawl
+        use_async: Use the concurrent incremental crawler (crawl_website_async)
+        use_sitemap: Fetch only URLs whose sitemap <lastmod> changed instead
+            of following links (implies use_async); max_pages caps the
+            number of changed URLs fetched per run
+        resume: Continue an interrupted crawl from its last checkpoint
     """
     print("=" * 60)
     print("Starting Web Crawl → Clean → Chunk → Embed pipeline")
     print("=" * 60)
     
-    docs = crawl_website(settings.SITEMAP_URL, max_pages=max_pages)
+    start_url = settings.SITEMAP_URL
+    use_async = use_async or use_sitemap
+    state = CrawlState.load()
+    if not index_exists():
+        # Nothing indexed yet: unconditional fetches so every page gets embedded
+        state.reset()
+
+    # Sitemap runs resume implicitly: lastmod is only recorded for indexed pages
+    progress = state.progress(start_url) if resume and not use_sitemap else None
+    if progress is not None:
+        print(f"Resuming interrupted crawl: {len(progress.done)} pages done, "
+              f"{len(progress.pending())} pending")
+    else:
+        progress = CrawlProgress()
+
+    def save_progress():
+        state.set_progress(start_url, progress)
+        state.save()
+
+    writer = IndexWriter(on_checkpoint=save_progress)
+    
+    if use_sitemap:
+        changed, lastmods, removed = select_sitemap_changes(start_url, state, max_pages)
+        for url in removed:
+            state.forget(url)
+        writer.delete_pages(removed)
+        if changed:
+            asyncio.run(crawl_website_async(start_url, writer, max_pages=None, state=state,
+                                            urls=changed, follow_links=False, lastmods=lastmods,
+                                            progress=progress))
+    elif use_async:
+        asyncio.run(crawl_website_async(start_url, writer, max_pages=max_pages, state=state,
+                                        progress=progress))
+    else:
+        crawl_website(start_url, writer, max_pages=max_pages, progress=progress)
+    
+    writer.close()
+    state.clear_progress()
+    state.save()
     
-    if not docs:
+    if not writer.added and not writer.removed:
+        if use_async and state.pages:
+            print("\n✓ No new or changed pages - index is up to date")
+            return
         print("\n❌ No documents extracted!")
         print("   Possible issues:")
         print("   - Website requires JavaScript (try enabling Playwright)")
@@ -132,8 +360,6 @@ def crawl_and_build(max_pages=20):
         print("   - URL is incorrect")
         return
     
-    print(f"\nUpserting {len(docs)} chunks to FAISS...")
-    upsert_documents(docs)
     print("\n✅ Done!")
 
 if __name__ == "__main__":
@@ -0,0 +1,142 @@
+# scraper/sitemap.py
+"""
+Streaming sitemap reader.
+
+Handles <urlset> sitemaps, <sitemapindex> files pointing at further
+sitemaps, and gzip-compressed sitemaps. Responses are decompressed and
+parsed incrementally, and parsed elements are cleared as we go, so memory
+stays flat even for 50,000-URL sitemaps.
+"""
+
+import zlib
+from urllib.parse import urljoin, urlparse
+from xml.etree.ElementTree import XMLPullParser
+
+from config.settings import settings
+from models.http_client import get_sync_client
+
+HEADERS = {"User-Agent": settings.SCRAPE_USER_AGENT}
+
+# Guard against sitemap indexes that (directly or indirectly) include themselves
+MAX_DEPTH = 3
+
+
+def _local(tag):
+    """Strip the XML namespace from a tag name."""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _child_text(elem, name):
+    for child in elem:
+        if _local(child.tag) == name:
+            return (child.text or "").strip() or None
+    return None
+
+
+def _drain(parser):
+    for _, elem in parser.read_events():
+        kind = _local(elem.tag)
+        if kind in ("url", "sitemap"):
+            loc = _child_text(elem, "loc")
+            if loc:
+                yield kind, loc, _child_text(elem, "lastmod")
+            elem.clear()
+
+
+def _iter_entries(chunks):
+    """
+    Incrementally parse sitemap XML from byte chunks.
+
+    Yields:
+        ("url", loc, lastmod) for page entries and ("sitemap", loc, lastmod)
+        for sitemap-index entries
+    """
+    parser = XMLPullParser(events=("end",))
+    decompressor = None
+    first = True
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if first:
+            # .xml.gz files usually arrive without Content-Encoding, so sniff the gzip magic
+            if chunk[:2] == b"\x1f\x8b":
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            first = False
+        if decompressor is not None:
+            chunk = decompressor.decompress(chunk)
+        parser.feed(chunk)
+        yield from _drain(parser)
+    if decompressor is not None:
+        parser.feed(decompressor.flush())
+    parser.close()
+    yield from _drain(parser)
+
+
+def iter_sitemap(url, errors=None, _depth=0, _seen=None):
+    """
+    Stream every page URL listed in a sitemap or sitemap index.
+
+    A child sitemap that cannot be read is skipped so the rest still
+    streams; pass `errors` to find out whether the listing was complete.
+
+    Args:
+        url: Sitemap URL (.xml or .xml.gz)
+        errors: Optional list that receives (sitemap_url, exception) for
+            every child sitemap that failed or was nested beyond MAX_DEPTH
+
+    Yields:
+        (page_url, lastmod) tuples; lastmod is the raw string or None
+    """
+    seen = _seen if _seen is not None else set()
+    if url in seen:
+        return
+    if _depth > MAX_DEPTH:
+        # Its pages go unlisted: the listing is incomplete, not shorter
+        print(f"  ⚠️  Not following sitemap {url}: nested deeper than {MAX_DEPTH} levels")
+        if errors is not None:
+            errors.append((url, RecursionError(f"sitemap nested deeper than {MAX_DEPTH} levels")))
+        return
+    seen.add(url)
+
+    children = []
+    client = get_sync_client(url)
+    with client.stream("GET", url, headers=HEADERS, timeout=30) as resp:
+        resp.raise_for_status()
+        # iter_bytes() undoes Content-Encoding; gzip file bodies are sniffed in _iter_entries
+        for kind, loc, lastmod in _iter_entries(resp.iter_bytes()):
+            if kind == "url":
+                yield loc, lastmod
+            else:
+                children.append(loc)
+
+    for child in children:
+        try:
+            yield from iter_sitemap(child, errors, _depth + 1, seen)
+        except Exception as e:
+            print(f"  ✗ Error reading sitemap {child}: {e}")
+            if errors is not None:
+                errors.append((child, e))
+
+
+def discover_sitemap_url(site_url):
+    """
+    Find the sitemap for a site.
+
+    Uses site_url directly if it already points at a sitemap, else the first
+    `Sitemap:` line in robots.txt, else /sitemap.xml.
+    """
+    path = urlparse(site_url).path
+    if path.endswith((".xml", ".xml.gz")):
+        return site_url
+
+    robots_url = urljoin(site_url, "/robots.txt")
+    try:
+        resp = get_sync_client(robots_url).get(robots_url, headers=HEADERS, timeout=15)
+        if resp.status_code == 200:
+            for line in resp.text.splitlines():
+                if line.lower().startswith("sitemap:"):
+                    return line.split(":", 1)[1].strip()
+    except Exception as e:
+        print(f"  ⚠️  Could not read robots.txt: {e}")
+
+    return urljoin(site_url, "/sitemap.xml")
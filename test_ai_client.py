@@ -0,0 +1,249 @@
+# test_ai_client.py
+"""
+Resilience test for the LLM client against a local stub of the chat
+completions API: retries with Retry-After, model fallback, the circuit
+breaker, hedged requests and the reply deadline.
+"""
+
+import asyncio
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+
+import httpx
+
+from models.ai_client import LLMClient
+from models.resilience import CircuitOpenError, Deadline, DeadlineExceeded
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        model = body["model"]
+        with self.server.lock:
+            self.server.requests.append(model)
+            plan = self.server.plans.get(model, [])
+            status, delay, headers = plan.pop(0) if plan else (200, 0.0, {})
+        time.sleep(delay)
+        payload = ({"choices": [{"message": {"content": f"reply from {model}"}}]}
+                   if status == 200 else {"error": {"message": f"stub status {status}"}})
+        data = json.dumps(payload).encode()
+        try:
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client cancelled a hedged request
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = []
+    server.plans = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def reset(plans):
+    with server.lock:
+        server.requests = []
+        server.plans = plans
+
+
+def make_client(**overrides):
+    options = dict(
+        url=f"http://127.0.0.1:{server.server_address[1]}/openai/v1/chat/completions",
+        models=["primary", "fallback"], timeout=5.0, max_retries=2,
+        retry_base_delay=0.05, retry_max_delay=2.0, hedge=False,
+        breaker_failures=5, breaker_reset=30.0, rng=random.Random(0),
+    )
+    options.update(overrides)
+    return LLMClient(**options)
+
+
+# One stub for the whole module, like the TestClient in test_dedup
+server = start_stub()
+
+
+def test_retry_after():
+    print("\n[1] 429 with Retry-After, then success...")
+    reset({"primary": [(429, 0.0, {"Retry-After": "1"})]})
+    client = make_client()
+    start = time.perf_counter()
+    reply = asyncio.run(client.acomplete("system", "hello"))
+    elapsed = time.perf_counter() - start
+    assert reply == "reply from primary", reply
+    assert 1.0 <= elapsed < 2.0, f"did not wait for Retry-After: {elapsed:.2f}s"
+    assert client.counters["retries"] == 1, client.counters
+
+
+def test_backoff_then_fallback():
+    print("\n[2] Primary keeps failing, fallback model answers...")
+    reset({"primary": [(503, 0.0, {})] * 3})
+    client = make_client()
+    reply = asyncio.run(client.acomplete("system", "hello"))
+    assert reply == "reply from fallback", reply
+    # Primary tried 1 + max_retries times
+    assert server.requests == ["primary"] * 3 + ["fallback"], server.requests
+    assert client.counters["fallback_replies"] == 1, client.counters
+
+
+def test_long_retry_after_skips():
+    print("\n[3] Retry-After longer than the cap skips to the fallback...")
+    reset({"primary": [(429, 0.0, {"Retry-After": "60"})]})
+    client = make_client()
+    start = time.perf_counter()
+    reply = asyncio.run(client.acomplete("system", "hello"))
+    assert reply == "reply from fallback", reply
+    assert time.perf_counter() - start < 1.0, "waited for a Retry-After beyond the cap"
+
+
+def test_client_error():
+    print("\n[4] 401 is raised without retries...")
+    reset({"primary": [(401, 0.0, {})]})
+    client = make_client()
+    try:
+        asyncio.run(client.acomplete("system", "hello"))
+        raised = None
+    except httpx.HTTPStatusError as e:
+        raised = e.response.status_code
+    assert raised == 401, raised
+    assert server.requests == ["primary"], server.requests
+
+
+def test_circuit_breaker():
+    print("\n[5] Outage opens the circuit and later calls fail fast...")
+    reset({"primary": [(500, 0.0, {})] * 100})
+    client = make_client(models=["primary"], max_retries=1, breaker_failures=4,
+                         breaker_reset=0.5)
+
+    async def scenario():
+        for _ in range(2):
+            try:
+                await client.acomplete("system", "hello")
+            except httpx.HTTPStatusError:
+                pass
+        assert client.breakers["primary"].state == "open", client.breakers["primary"].state
+
+        sent = len(server.requests)
+        start = time.perf_counter()
+        try:
+            await client.acomplete("system", "hello")
+            fast_failed = False
+        except CircuitOpenError:
+            fast_failed = True
+        elapsed = time.perf_counter() - start
+        assert fast_failed and len(server.requests) == sent and elapsed < 0.05, \
+            f"open circuit did not fail fast: {elapsed * 1000:.1f}ms, {len(server.requests) - sent} requests"
+
+        reset({})
+        await asyncio.sleep(0.6)
+        reply = await client.acomplete("system", "hello")
+        assert reply == "reply from primary" and client.breakers["primary"].state == "closed", \
+            "trial call after reset did not close the circuit"
+
+    asyncio.run(scenario())
+
+
+def test_hedging():
+    print("\n[6] Slow request is hedged...")
+    reset({"primary": [(200, 2.0, {}), (200, 0.0, {})]})
+    client = make_client(hedge=True, hedge_initial_delay=0.2)
+    start = time.perf_counter()
+    reply = asyncio.run(client.acomplete("system", "hello"))
+    elapsed = time.perf_counter() - start
+    assert reply == "reply from primary" and elapsed < 1.0, f"hedge did not answer first: {elapsed:.2f}s"
+    assert client.counters["hedges"] == 1 and client.counters["hedge_wins"] == 1, client.counters
+
+    reset({"primary": [(200, 0.0, {})]})
+    asyncio.run(client.acomplete("system", "hello"))
+    assert len(server.requests) == 1, f"fast request hedged: {server.requests}"
+
+
+def test_hedge_prefers_success():
+    print("\n[7] Hedged requests finishing together: the success wins...")
+
+    async def race(first_status, hedge_status):
+        release = asyncio.Event()
+        calls = []
+
+        async def post():
+            calls.append(None)
+            if len(calls) == 1:
+                # The slow first request finishes right as the hedge does,
+                # so both are done by the same wait()
+                await release.wait()
+                return httpx.Response(first_status)
+            release.set()
+            return httpx.Response(hedge_status)
+
+        return await client._hedged(post)
+
+    for first_status, hedge_status in ((503, 200), (200, 503)):
+        client = make_client(hedge=True, hedge_initial_delay=0.05)
+        resp = asyncio.run(race(first_status, hedge_status))
+        assert resp.status_code == 200, f"{first_status}/{hedge_status} race returned {resp.status_code}"
+
+
+def test_deadline():
+    print("\n[8] Deadline cuts off a slow request and skips retries...")
+    reset({"primary": [(200, 3.0, {})]})
+    client = make_client()
+    start = time.perf_counter()
+    try:
+        asyncio.run(client.acomplete("system", "hello", deadline=Deadline(0.5)))
+        raised = False
+    except DeadlineExceeded:
+        raised = True
+    elapsed = time.perf_counter() - start
+    assert raised and elapsed < 0.8, f"no DeadlineExceeded within the budget: {elapsed:.2f}s"
+    assert server.requests == ["primary"], f"retried after the cut-off: {server.requests}"
+    assert client.breakers["primary"].failures == 0, "circuit blamed for our deadline"
+
+    reset({"primary": [(503, 0.0, {"Retry-After": "1"})]})
+    client = make_client(models=["primary"])
+    try:
+        asyncio.run(client.acomplete("system", "hello", deadline=Deadline(0.5)))
+    except httpx.HTTPStatusError:
+        pass
+    assert server.requests == ["primary"], f"retry would overrun the deadline: {server.requests}"
+
+    # LLM_TIMEOUT shorter than the deadline: an upstream timeout, retried and counted
+    reset({"primary": [(200, 1.0, {})] * 3})
+    client = make_client(timeout=0.3, max_retries=1)
+    reply = asyncio.run(client.acomplete("system", "hello", deadline=Deadline(10)))
+    assert reply == "reply from fallback", reply
+    assert client.breakers["primary"].failures == 2, client.breakers["primary"].stats()
+
+
+def test_sync():
+    print("\n[9] Blocking client retries too...")
+    reset({"primary": [(502, 0.0, {})]})
+    client = make_client()
+    reply = client.complete("system", "hello")
+    assert reply == "reply from primary", reply
+    assert server.requests == ["primary", "primary"], server.requests
+
+
+if __name__ == "__main__":
+    print("🧪 LLM CLIENT RESILIENCE TEST")
+    print("=" * 60)
+    for test in (test_retry_after, test_backoff_then_fallback, test_long_retry_after_skips,
+                 test_client_error, test_circuit_breaker, test_hedging, test_hedge_prefers_success,
+                 test_deadline, test_sync):
+        test()
+        print("✅ PASS")
+    server.shutdown()
+    print("\n" + "=" * 60)
+    print("ALL PASSED")
@@ -0,0 +1,61 @@
+# test_clean.py
+"""
+The lxml cleaner (CLEAN_ENGINE default) must produce the same text as the
+BeautifulSoup reference engine, including for elements browsers never render.
+"""
+
+from scraper.clean import clean_html_bs4, clean_html_lxml
+
+PAD = " with enough words to pass the short line filter"
+
+FIXTURE = f"""<!DOCTYPE html>
+<html><head>
+<title>Store title{PAD}</title>
+<style>body {{ color: red; }} /* style text{PAD} */</style>
+<script>var scriptText = "script text{PAD}";</script>
+</head>
+<body>
+<header>Header text{PAD}</header>
+<nav><a href="/">Nav text{PAD}</a></nav>
+<p>Opening hours &amp; prices: caf&eacute; &lt;open&gt; &#169; 2024{PAD}</p>
+<!-- comment text{PAD} -->
+<p>Text after the comment{PAD}
+<p>Unclosed paragraph{PAD}<li>Unclosed item{PAD}
+<template><p>Template text{PAD}</p></template>
+<p>Text after the template{PAD}</p>
+<p>Ruby<ruby>漢<rp>(</rp><rt>ruby annotation{PAD}</rt><rp>)</rp></ruby> tail text{PAD}</p>
+<p>Before CDATA{PAD}<![CDATA[cdata text{PAD}]]></p>
+<div class="cookie-banner">Cookie text{PAD}</div>
+<noscript>Noscript text{PAD}</noscript>
+<footer>Footer text{PAD}</footer>
+</body></html>"""
+
+
+def test_engines_match():
+    print("\n[1] bs4 and lxml engines produce the same text...")
+    reference = clean_html_bs4(FIXTURE)
+    fast = clean_html_lxml(FIXTURE)
+    assert fast == reference, f"\nbs4:  {reference!r}\nlxml: {fast!r}"
+
+
+def test_noise_dropped_text_kept():
+    print("\n[2] Noise and never-rendered text dropped, page text kept...")
+    text = clean_html_lxml(FIXTURE)
+    for dropped in ("style text", "script text", "Header text", "Nav text", "comment text",
+                    "Template text", "ruby annotation", "cdata text", "Cookie text",
+                    "Noscript text", "Footer text"):
+        assert dropped not in text, f"{dropped!r} kept"
+    for kept in ("Store title", "Opening hours & prices: café <open> © 2024",
+                 "Text after the comment", "Unclosed paragraph", "Unclosed item",
+                 "Text after the template", "tail text", "Before CDATA"):
+        assert kept in text, f"{kept!r} dropped"
+
+
+if __name__ == "__main__":
+    print("🧪 HTML CLEANER ENGINE TEST")
+    print("=" * 60)
+    for test in (test_engines_match, test_noise_dropped_text_kept):
+        test()
+        print("✅ PASS")
+    print("\n" + "=" * 60)
+    print("ALL PASSED")
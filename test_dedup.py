@@ -0,0 +1,136 @@
+# test_dedup.py
+"""
+Burst test for webhook idempotency: Meta retries the same deliveries many
+times, concurrently and out of order, and every message must be queued once.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import hmac
+import json
+import os
+import random
+import tempfile
+import threading
+
+from fastapi.testclient import TestClient
+
+import bot.webhook as webhook
+from bot.dedup import InMemoryDedupStore, SQLiteDedupStore
+from config.settings import settings
+
+client = TestClient(webhook.app)
+
+
+def get_payload(msg_id, text):
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "111111",
+            "changes": [{
+                "value": {
+                    "messages": [{
+                        "from": "1234567890",
+                        "id": msg_id,
+                        "type": "text",
+                        "text": {"body": text}
+                    }]
+                }
+            }]
+        }]
+    }
+
+
+def post_signed(payload):
+    # Sign the exact bytes that are sent
+    body = json.dumps(payload).encode()
+    signature = hmac.new(settings.WHATSAPP_APP_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return client.post("/webhook", content=body, headers={
+        "X-Hub-Signature-256": f"sha256={signature}",
+        "Content-Type": "application/json",
+    })
+
+
+def test_webhook_burst():
+    print("\n[1] Burst of retried webhooks (20 messages x 5 deliveries, 8 threads)...")
+    webhook.processed_ids = InMemoryDedupStore()
+    queued = []
+    lock = threading.Lock()
+    original_submit = webhook.coalescer.submit
+
+    def counting_submit(phone, text, deadline=None):
+        with lock:
+            queued.append(text)
+        return True
+
+    webhook.coalescer.submit = counting_submit
+    try:
+        deliveries = [f"wamid.burst{i}" for i in range(20) for _ in range(5)]
+        random.Random(0).shuffle(deliveries)
+        with ThreadPoolExecutor(8) as ex:
+            statuses = list(ex.map(lambda mid: post_signed(get_payload(mid, mid)).status_code, deliveries))
+    finally:
+        webhook.coalescer.submit = original_submit
+
+    assert all(s == 200 for s in statuses), f"not all deliveries acknowledged: {set(statuses)}"
+    assert sorted(queued) == sorted(set(deliveries)), \
+        f"{len(queued)} queued for {len(set(deliveries))} messages"
+
+
+def test_busy_retry():
+    print("\n[2] Queue full, then Meta retries...")
+    webhook.processed_ids = InMemoryDedupStore()
+    original_submit = webhook.coalescer.submit
+    results = iter([False, True])
+    webhook.coalescer.submit = lambda phone, text, deadline=None: next(results)
+    try:
+        first = post_signed(get_payload("wamid.busy", "hello")).status_code
+        retry = post_signed(get_payload("wamid.busy", "hello")).status_code
+    finally:
+        webhook.coalescer.submit = original_submit
+    assert first == 503, f"expected 503 while the queue is full, got {first}"
+    assert retry == 200 and "wamid.busy" in webhook.processed_ids, "retry not accepted after 503"
+
+
+def test_eviction_order():
+    print("\n[3] Eviction drops the oldest IDs, never the newest...")
+    store = InMemoryDedupStore(max_entries=3)
+    for i in range(5):
+        store.claim(f"id{i}")
+    assert all(f"id{i}" in store for i in (2, 3, 4)), "newest IDs not kept"
+    assert "id0" not in store and "id1" not in store, "oldest IDs not evicted"
+    assert not store.claim("id4"), "retry of a recent ID accepted"
+
+
+def test_sqlite_shared():
+    print("\n[4] SQLite store shared by several workers...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "processed_ids.sqlite")
+        # Separate connections stand in for separate uvicorn workers
+        workers = [SQLiteDedupStore(path) for _ in range(4)]
+        ids = [f"wamid.shared{i}" for i in range(50)] * 4
+        random.Random(1).shuffle(ids)
+        with ThreadPoolExecutor(8) as ex:
+            claims = list(ex.map(lambda p: (p[1], workers[p[0] % 4].claim(p[1])), enumerate(ids)))
+        winners = [msg_id for msg_id, claimed in claims if claimed]
+        expired = SQLiteDedupStore(path, ttl=0)
+        try:
+            assert sorted(winners) == sorted(set(ids)), \
+                f"{len(winners)} claims for {len(set(ids))} IDs"
+            workers[0].release("wamid.shared0")
+            assert workers[1].claim("wamid.shared0"), "released ID cannot be claimed again"
+            assert expired.claim("wamid.expiring") and expired.claim("wamid.expiring"), \
+                "expired ID cannot be claimed again"
+        finally:
+            for store in workers + [expired]:
+                store.close()
+
+
+if __name__ == "__main__":
+    print("🧪 WEBHOOK DEDUP BURST TEST")
+    print("=" * 60)
+    for test in (test_webhook_burst, test_busy_retry, test_eviction_order, test_sqlite_shared):
+        test()
+        print("✅ PASS")
+    print("\n" + "=" * 60)
+    print("ALL PASSED")
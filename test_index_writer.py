@@ -0,0 +1,133 @@
+# test_index_writer.py
+"""
+IndexWriter flushing off the event loop: batches are embedded (through the
+SQLite embedding cache) on worker threads, checkpoints land in the journal
+and the checkpoint hook runs on the event loop. Also covers resuming from
+the journal and publishing generations.
+"""
+
+import asyncio
+from contextlib import contextmanager
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+import embeddings.build_vectors as build_vectors
+from config.settings import settings
+from embeddings.embedding_cache import EmbeddingCache
+from embeddings.index_holder import IndexHolder
+
+
+class StubEmbedder:
+    def embed_texts(self, texts):
+        return [np.full(8, (len(t) % 7) + 1, dtype='float32') / np.sqrt(8) for t in texts]
+
+
+PATHS = ("CURRENT_PATH", "INDEX_PATH", "STORE_INDEX_PATH", "METADATA_PATH",
+         "LEGACY_METADATA_PATH", "JOURNAL_PATH")
+
+
+@contextmanager
+def isolated_writer(**options):
+    """IndexWriter whose index, checkpoint and cache files live in a temp dir."""
+    saved = {name: getattr(build_vectors, name) for name in PATHS + ("get_embedder", "EmbeddingCache")}
+    cache_enabled = settings.EMBED_CACHE_ENABLED
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            for name in PATHS:
+                setattr(build_vectors, name, os.path.join(tmp, os.path.basename(saved[name])))
+            build_vectors.get_embedder = StubEmbedder
+            build_vectors.EmbeddingCache = lambda: EmbeddingCache(os.path.join(tmp, "cache.sqlite"), "stub")
+            settings.EMBED_CACHE_ENABLED = True
+            yield build_vectors.IndexWriter(**options)
+        finally:
+            for name, value in saved.items():
+                setattr(build_vectors, name, value)
+            settings.EMBED_CACHE_ENABLED = cache_enabled
+
+
+def pages(n):
+    return [(f"https://site/p{i}", [{"id": f"https://site/p{i}#chunk0", "url": f"https://site/p{i}",
+                                      "text": f"page {i} " * (i + 1)}]) for i in range(n)]
+
+
+def test_flush_through_to_thread():
+    print("\n[1] Batches flushed from asyncio.to_thread workers...")
+    with isolated_writer(batch_size=2, checkpoint_every=1) as writer:
+
+        async def crawl():
+            await asyncio.gather(*(asyncio.to_thread(writer.add_page, url, docs)
+                                   for url, docs in pages(6)))
+
+        asyncio.run(crawl())
+        assert writer.batches >= 3, f"only {writer.batches} batches flushed"
+        assert writer.added == 6, writer.added
+        assert os.path.exists(build_vectors.JOURNAL_PATH), "no checkpoint written"
+        assert build_vectors.published_paths() is None, "checkpoint published the index"
+        writer.close()
+        assert build_vectors.published_paths() is not None, "close() did not publish"
+        assert not os.path.exists(build_vectors.JOURNAL_PATH), "journal left after publishing"
+
+
+def test_writer_thread_runs_hook_on_loop():
+    print("\n[2] aadd_page embeds on the writer thread, hook runs on the loop...")
+    hook_threads = []
+    with isolated_writer(batch_size=2, checkpoint_every=1,
+                         on_checkpoint=lambda: hook_threads.append(threading.get_ident())) as writer:
+
+        async def crawl():
+            await asyncio.gather(*(writer.aadd_page(url, docs) for url, docs in pages(6)))
+            await writer.adelete_pages(["https://site/p0"])
+
+        asyncio.run(crawl())
+        assert writer.added == 6, writer.added
+        assert hook_threads and all(t == threading.get_ident() for t in hook_threads), \
+            "checkpoint hook ran off the event loop"
+        writer.close()
+        assert writer.removed == 1, writer.removed
+
+
+def test_resume_from_journal_and_publish():
+    print("\n[3] Interrupted crawl resumes from the journal, publish swaps generations...")
+    with isolated_writer(batch_size=1, checkpoint_every=1) as first:
+        for url, docs in pages(3):
+            first.add_page(url, docs)
+        first.close()
+        base = build_vectors.current_generation()
+
+        # Second crawl on top of the published index, interrupted after 2 checkpoints
+        interrupted = build_vectors.IndexWriter(batch_size=1, checkpoint_every=1)
+        for url, docs in pages(5)[3:]:
+            interrupted.add_page(url, docs)
+        interrupted.delete_pages(["https://site/p0"])
+        interrupted.flush()
+        # The journal holds only this crawl's changes, not a copy of the store
+        header, ops = build_vectors._read_journal()
+        assert header["base"] == base, header
+        assert [op[0] for op in ops] == ["add", "add", "del"], [op[0] for op in ops]
+        assert build_vectors.current_generation() == base, "checkpoint published the index"
+
+        resumed = build_vectors.IndexWriter()
+        resumed.close()
+        assert resumed._store.size == 4, resumed._store.size
+        assert build_vectors.current_generation() != base, "close() did not publish"
+        assert not os.path.exists(build_vectors.INDEX_PATH)
+
+        snapshot = IndexHolder(check_interval=0).reload()
+        assert snapshot.index.ntotal == len(snapshot.metadata) == 4
+        assert snapshot.metadata.get(build_vectors.chunk_faiss_id("https://site/p0#chunk0")) is None
+        assert snapshot.metadata.get(build_vectors.chunk_faiss_id("https://site/p4#chunk0"))["text"] \
+            == "page 4 " * 5
+
+
+if __name__ == "__main__":
+    print("🧪 INDEX WRITER THREADING TEST")
+    print("=" * 60)
+    for test in (test_flush_through_to_thread, test_writer_thread_runs_hook_on_loop,
+                 test_resume_from_journal_and_publish):
+        test()
+        print("✅ PASS")
+    print("\n" + "=" * 60)
+    print("ALL PASSED")
@@ -0,0 +1,82 @@
+# test_responder.py
+"""
+Conversation history around the reply deadline: a question that ends in the
+fallback reply must not leave an unanswered user turn behind, and history
+writes stay off the event loop.
+"""
+
+import asyncio
+import threading
+
+import bot.responder as responder
+from bot import memory
+from models.resilience import Deadline, DeadlineExceeded
+
+QUESTION = "What are your delivery options on weekends?"
+
+
+def run(deadline=None, llm=None, store=None):
+    """agenerate_reply against a fresh in-memory store and a stubbed LLM."""
+    saved = memory.store, responder.acall_openai
+    memory.store = store if store is not None else memory.InMemoryConversationStore()
+
+    async def acall_openai(system, prompt, **kwargs):
+        return llm()
+
+    responder.acall_openai = acall_openai
+    try:
+        reply = asyncio.run(responder.agenerate_reply(QUESTION, "15550001", deadline))
+        return reply, memory.get_messages("15550001")
+    finally:
+        memory.store, responder.acall_openai = saved
+
+
+def test_deadline_before_llm():
+    print("\n[1] No time left for the LLM: fallback reply, history untouched...")
+    reply, messages = run(deadline=Deadline(0.0), llm=lambda: "unused")
+    assert reply == responder.FALLBACK_REPLY, reply
+    assert messages == [], messages
+
+
+def test_deadline_during_llm():
+    print("\n[2] Deadline runs out during the LLM call: history untouched...")
+
+    def slow():
+        raise DeadlineExceeded("budget spent")
+
+    reply, messages = run(llm=slow)
+    assert reply == responder.FALLBACK_REPLY, reply
+    assert messages == [], messages
+
+
+def test_answered_question_recorded():
+    print("\n[3] Answered question recorded with its reply...")
+    reply, messages = run(llm=lambda: "We deliver on Saturdays.")
+    assert reply == "We deliver on Saturdays.", reply
+    assert messages == [{"role": "user", "content": QUESTION},
+                        {"role": "assistant", "content": reply}], messages
+
+
+def test_history_written_off_loop():
+    print("\n[4] History written on a worker thread, not the event loop...")
+    writers = []
+
+    class RecordingStore(memory.InMemoryConversationStore):
+        def add_message(self, phone, role, message):
+            writers.append(threading.get_ident())
+            super().add_message(phone, role, message)
+
+    run(llm=lambda: "We deliver on Saturdays.", store=RecordingStore())
+    # asyncio.run drives the loop on this thread
+    assert len(writers) == 2 and threading.get_ident() not in writers, writers
+
+
+if __name__ == "__main__":
+    print("🧪 RESPONDER HISTORY TEST")
+    print("=" * 60)
+    for test in (test_deadline_before_llm, test_deadline_during_llm, test_answered_question_recorded,
+                 test_history_written_off_loop):
+        test()
+        print("✅ PASS")
+    print("\n" + "=" * 60)
+    print("ALL PASSED")